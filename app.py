@@ -1,27 +1,205 @@
+import os
 import sys
-import uuid
 from pathlib import Path
+from typing import Optional, Tuple
 import streamlit as st
 
 ROOT = Path(__file__).resolve().parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from core.songs import get_template_by_key
-from core.storyboard import build_storyboard_for_template
-from core.render import render_video_ffmpeg_drawtext
+from core.songs import get_template_by_key, list_templates
+from core.storyboard import build_storyboard_with_report, coverage_report
+from core.backends import backend_missing_filters, get_renderer
+from core.resources import clear_resource_caches
+from core.cache import RenderCache, render_cache_key
+from core.jobs import CANCELLED, DONE, FAILED, QUEUED, RenderJobManager
+from core.serve import MediaServer, start_media_server
+from core.profiles import EncoderProfile, get_profile
+from core.audio_prep import prepare_audio
+from core.assets import with_card_icons
+from core.ingest import IngestedAudio, ingest_upload
+from core.render import RenderCancelled
+from core.metrics import Trace, maybe_profile, span
 
 OUTPUTS_DIR = ROOT / "outputs"
 OUTPUTS_DIR.mkdir(exist_ok=True, parents=True)
 
 DURATION_SEC = 60  # client wants 1 minute
 
+# quick low-res encode first so timing can be checked, then the delivery encode
+PREVIEW_PROFILE = get_profile("preview")
+FINAL_PROFILE = get_profile("final")
+PREVIEW_FIRST = os.environ.get("RENDER_PREVIEW", "1") == "1"
+
+RENDER_BACKEND = os.environ.get("RENDER_BACKEND", "drawtext")
+
+# disk quota for prepared audio + renders (LRU-evicted beyond this)
+RENDER_CACHE_MAX_MB = int(os.environ.get("RENDER_CACHE_MAX_MB", "2048"))
+
+# fragmented MP4 starts playing before the file is fully downloaded
+FRAGMENTED_MP4 = os.environ.get("RENDER_FRAGMENTED_MP4", "0") == "1"
+
+# concurrent ffmpeg renders across all sessions (default: CPU count)
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "0")) or None
+
 st.set_page_config(page_title="ABC Visual POC", layout="centered")
 
+
+@st.cache_resource
+def get_render_cache() -> RenderCache:
+    # one instance per process so concurrent sessions share in-flight renders
+    return RenderCache(OUTPUTS_DIR / "renders", max_bytes=RENDER_CACHE_MAX_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def get_backend_problems() -> Tuple[str, ...]:
+    # probes ffmpeg once per process instead of on every rerun
+    return backend_missing_filters(RENDER_BACKEND)
+
+
+@st.cache_resource
+def get_job_manager() -> RenderJobManager:
+    return RenderJobManager(max_workers=RENDER_WORKERS)
+
+
+@st.cache_resource
+def get_media_server() -> Optional[MediaServer]:
+    # serves finished renders with range requests so videos never pass through session memory
+    try:
+        return start_media_server(get_render_cache().cache_dir)
+    except (OSError, ValueError):
+        return None
+
+
+@st.fragment(run_every=1.0)
+def show_job_status(job_id: str, title: str = "Rendering (ffmpeg)..."):
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        st.warning("Render job expired. Please generate again.")
+        return
+    if job.finished:
+        # full rerun so the result renders outside this polling fragment
+        st.rerun()
+
+    if job.status == QUEUED:
+        st.info(f"Queued (position {manager.queue_position(job_id)}, {manager.active_count()} rendering)...")
+    else:
+        detail = " · ".join(x for x in (job.speed, f"{job.fps:.0f} fps" if job.fps else None) if x)
+        st.progress(job.progress, text=f"{title} {job.progress:.0%}" + (f" · {detail}" if detail else ""))
+
+    if st.button("Cancel render", key=f"cancel_{job_id}"):
+        manager.cancel(job_id)
+
+
+def show_job_result(job, message: str = "Generated ABC video ✅"):
+    if job.status == CANCELLED:
+        st.warning("Render cancelled.")
+        return
+    if job.status == FAILED:
+        st.error(job.error)
+        return
+
+    final_path, hit = job.result
+    st.success(message + (" (cached)" if hit else ""))
+
+    server = get_media_server()
+    if server is not None and server.reachable_from(st.context.headers.get("Host", "")):
+        st.video(server.url_for(final_path))
+        st.link_button("Download ABC video", server.url_for(final_path, download=True))
+    else:
+        # fallback: Streamlit's media manager (loads the file into memory)
+        st.video(str(final_path))
+        with open(final_path, "rb") as f:
+            st.download_button("Download ABC video", data=f, file_name=Path(final_path).name, mime="video/mp4")
+
+
+def make_render_job(cache: RenderCache, source: IngestedAudio, events, profile: EncoderProfile):
+    # the closure keeps `source` (and its memfd/spill file) alive until the job is done
+    events = with_card_icons(events, profile.resolution)
+    params = {
+        "backend": RENDER_BACKEND,
+        "duration_sec": DURATION_SEC,
+        "resolution": profile.resolution,
+        "fps": profile.fps,
+        "fragmented": FRAGMENTED_MP4,
+        **profile.cache_params(),
+    }
+    key = render_cache_key(source.sha256, events, params)
+
+    def render_job():
+        trace = Trace("render", profile=profile.name, backend=RENDER_BACKEND, events=len(events), key=key)
+        rendered = []
+
+        def render(tmp_path):
+            rendered.append(True)
+            with span("audio.prepare"):
+                audio_track = prepare_audio(source.path, DURATION_SEC, profile, cache=cache, audio_sha=source.sha256)
+            with span("render.backend", backend=RENDER_BACKEND):
+                return get_renderer(RENDER_BACKEND)(
+                    audio_path=str(audio_track),
+                    audio_prepared=True,
+                    events=events,
+                    output_path=str(tmp_path),
+                    duration_sec=DURATION_SEC,
+                    resolution=profile.resolution,
+                    fps=profile.fps,
+                    fragmented=FRAGMENTED_MP4,
+                    profile=profile,
+                )
+
+        status = "failed"
+        try:
+            with trace.activate(), maybe_profile(f"render_{profile.name}"):
+                result = cache.get_or_render(key, render)
+            status = "done" if rendered else "cache_hit"
+            return result
+        except RenderCancelled:
+            status = "cancelled"
+            raise
+        finally:
+            trace.finish(status)
+
+    return render_job
+
+
 def main():
     st.title("ABC Visual POC (Timestamp-aligned)")
     st.write("Upload the ABC song audio. We render visuals aligned to your `prompts/abc_song.txt` timestamps.")
 
+    templates = {t.key: t.title for t in list_templates()}
+    template_key = st.selectbox(
+        "Song template",
+        list(templates),
+        index=list(templates).index("abc") if "abc" in templates else 0,
+        format_func=lambda k: templates[k],
+    )
+
+    auto_time = st.checkbox(
+        "Auto-time to the uploaded audio",
+        help="Ignore the template's timestamps and place each card on a detected onset.",
+    )
+
+    if st.sidebar.button("Reload templates & assets"):
+        clear_resource_caches()
+        get_backend_problems.clear()
+
+    missing = get_backend_problems()
+    if missing:
+        st.warning(f"ffmpeg lacks {', '.join(missing)} needed by the {RENDER_BACKEND!r} backend; renders will fail.")
+
+    if st.button("Preview storyboard"):
+        # Pillow is only imported once a preview is asked for
+        from core.preview import render_contact_sheet
+
+        events, report = build_storyboard_with_report(get_template_by_key(template_key).units, duration_sec=DURATION_SEC)
+        note = report.summary()
+        st.image(
+            str(render_contact_sheet(events, resolution=FINAL_PROFILE.resolution)),
+            caption="Storyboard (no encode)" + (f": {note}" if note else ""),
+        )
+
     audio_file = st.file_uploader("Upload audio (WAV/MP3/M4A).", type=["wav", "mp3", "m4a"])
 
     if st.button("Generate ABC video"):
@@ -29,36 +207,58 @@ def main():
             st.error("Please upload an audio file first.")
             return
 
-        suffix = Path(audio_file.name).suffix
-        audio_path = OUTPUTS_DIR / f"audio_{uuid.uuid4().hex}{suffix}"
-        audio_path.write_bytes(audio_file.getbuffer())
+        trace = Trace("generate", template=template_key)
+        with trace.activate():
+            cache = get_render_cache()
+            with span("upload.ingest"):
+                # memory-backed unless very large; no copy of the upload is kept on disk
+                source = ingest_upload(audio_file)
 
-        template = get_template_by_key("abc")
+            with span("template.load"):
+                template = get_template_by_key(template_key)
 
-        with st.spinner("Building storyboard from timestamps..."):
-            events = build_storyboard_for_template(template.units, duration_sec=DURATION_SEC)
+            if auto_time:
+                with st.spinner("Aligning the template to the audio..."):
+                    # NumPy/librosa load here, only when auto timing is used
+                    from core.align import align_units_to_audio
 
-        with st.spinner("Rendering (ffmpeg)..."):
-            out_name = f"abc_demo_{uuid.uuid4().hex[:8]}.mp4"
-            out_path = OUTPUTS_DIR / out_name
+                    events = align_units_to_audio(template.units, source.path, DURATION_SEC, audio_sha=source.sha256)
+                report = coverage_report(events, DURATION_SEC)
+            else:
+                with st.spinner("Building storyboard from timestamps..."):
+                    events, report = build_storyboard_with_report(template.units, duration_sec=DURATION_SEC)
+        trace.finish("submitted")
+        st.session_state["storyboard_note"] = report.summary()
 
-            try:
-                final_path = render_video_ffmpeg_drawtext(
-                    audio_path=str(audio_path),
-                    events=events,
-                    output_path=str(out_path),
-                    duration_sec=DURATION_SEC,
-                    resolution=(854, 480),
-                    fps=24,
-                )
-            except Exception as e:
-                st.error(str(e))
-                return
-
-        st.success("Generated ABC video ✅")
-        video_bytes = Path(final_path).read_bytes()
-        st.video(video_bytes)
-        st.download_button("Download ABC video", data=video_bytes, file_name=out_name, mime="video/mp4")
+        manager = get_job_manager()
+        profiles = ([PREVIEW_PROFILE] if PREVIEW_FIRST else []) + [FINAL_PROFILE]
+        st.session_state["jobs"] = {
+            profile.name: manager.submit(
+                make_render_job(cache, source, events, profile),
+                DURATION_SEC,
+                label=f"{template.key}_{profile.name}",
+                priority=0 if profile is PREVIEW_PROFILE else 1,
+            )
+            for profile in profiles
+        }
+
+    jobs = st.session_state.get("jobs") or {}
+    manager = get_job_manager()
+    note = st.session_state.get("storyboard_note") if jobs else None
+    if note:
+        st.info(f"Storyboard: {note}")
+    final = manager.get(jobs["final"]) if "final" in jobs else None
+    preview = manager.get(jobs["preview"]) if "preview" in jobs else None
+
+    if final is not None and final.finished:
+        show_job_result(final)
+    elif preview is not None and preview.status == DONE:
+        show_job_result(preview, "Preview ready ✅ (final quality is encoding, it will replace this when done)")
+        show_job_status(jobs["final"], "Final quality...")
+    elif preview is not None and not preview.finished:
+        show_job_status(jobs["preview"], "Rendering preview...")
+    elif "final" in jobs:
+        show_job_status(jobs["final"])
 
     st.caption("abc_song.txt format: 00:00.01|A|Apple|a.png (icons in assets/icons/)")
 
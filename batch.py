@@ -0,0 +1,210 @@
+"""
+Headless batch renderer.
+
+    python batch.py jobs.jsonl --out-dir outputs/batch --results outputs/batch/results.jsonl
+
+One JSON job per line:
+    {"audio": "songs/abc.mp3", "template": "abc", "duration": 60,
+     "resolution": "854x480", "fps": 24, "output": "abc_480p.mp4"}
+
+"profile" ("preview"/"final") picks encoder settings; its resolution/fps apply
+unless the job sets them. "timing": "auto" places the template's cards on onsets
+detected in the audio instead of using its timestamps. "ladder": true (or a list of
+"WxH" rungs) renders every rung of the resolution ladder in one ffmpeg run into the
+directory named by "output"; add "hls": true for fMP4 HLS variants and a master playlist.
+
+Jobs whose output already matches their inputs (audio bytes, storyboard, params,
+icons) are skipped. A results manifest with per-job timings, errors and storyboard
+warnings (gaps, overlaps, dropped lines) is written.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.songs import get_template_by_key
+from core.storyboard import build_storyboard_with_report, coverage_report
+from core.backends import get_renderer
+from core.cache import render_cache_key, sha256_file
+from core.profiles import get_profile
+from core.assets import with_card_icons
+from core.audio_prep import prepare_audio
+from core.align import align_units_to_audio
+from core.ladder import LADDER, render_ladder
+
+DEFAULTS = {
+    "template": "abc", "duration": 60, "backend": "drawtext", "profile": None, "timing": "template",
+    "ladder": False, "hls": False,
+}
+DEFAULT_RESOLUTION = (854, 480)
+DEFAULT_FPS = 24
+
+
+def parse_resolution(value) -> Tuple[int, int]:
+    if isinstance(value, (list, tuple)):
+        return int(value[0]), int(value[1])
+    w, h = str(value).lower().split("x")
+    return int(w), int(h)
+
+
+def load_jobs(path: Path) -> List[Dict]:
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            job = {**DEFAULTS, **json.loads(line)}
+            job.setdefault("id", job.get("output") or f"job{n}")
+            jobs.append(job)
+    return jobs
+
+
+def run_job(job: Dict, out_dir: str, force: bool = False) -> Dict:
+    """
+    Runs one job (in a worker process). Never raises: failures go into the result.
+    """
+    t0 = time.perf_counter()
+    result = {"id": job["id"], "status": "failed", "output": None, "timings": {}, "error": None, "storyboard": ""}
+    timings = result["timings"]
+    try:
+        audio = Path(job["audio"])
+        if not audio.exists() and not audio.is_absolute():
+            audio = ROOT / audio
+        profile = get_profile(job["profile"]) if job["profile"] else None
+        resolution = parse_resolution(job.get("resolution") or (profile.resolution if profile else DEFAULT_RESOLUTION))
+        fps = int(job.get("fps") or (profile.fps if profile else DEFAULT_FPS))
+        duration = int(job["duration"])
+        backend = job["backend"]
+        render = get_renderer(backend)
+        rungs = None
+        if job["ladder"]:
+            rungs = list(LADDER) if job["ladder"] is True else [parse_resolution(r) for r in job["ladder"]]
+
+        out_name = job.get("output") or (job["id"] if rungs else f"{job['id']}.mp4")
+        out_path = Path(out_dir) / out_name
+        stamp_path = out_path.with_name(out_path.name + ".json")
+        result["output"] = str(out_path)
+
+        t = time.perf_counter()
+        audio_sha = sha256_file(audio)
+        timings["fingerprint_sec"] = round(time.perf_counter() - t, 4)
+
+        t = time.perf_counter()
+        template = get_template_by_key(job["template"])
+        if job["timing"] == "auto":
+            events = align_units_to_audio(template.units, str(audio), duration, audio_sha=audio_sha)
+            report = coverage_report(events, duration)
+        else:
+            events, report = build_storyboard_with_report(template.units, duration_sec=duration)
+        result["storyboard"] = report.summary()
+        # a ladder draws at its largest rung and scales down
+        events = with_card_icons(events, max(rungs, key=lambda r: r[0] * r[1]) if rungs else resolution)
+        timings["storyboard_sec"] = round(time.perf_counter() - t, 4)
+
+        t = time.perf_counter()
+        if rungs:
+            params = {"ladder": rungs, "hls": bool(job["hls"]), "duration_sec": duration, "fps": fps}
+        else:
+            params = {"backend": backend, "duration_sec": duration, "resolution": resolution, "fps": fps}
+        if profile is not None:
+            params.update(profile.cache_params())
+        key = render_cache_key(audio_sha, events, params)
+        timings["fingerprint_sec"] = round(timings["fingerprint_sec"] + time.perf_counter() - t, 4)
+
+        if not force and out_path.exists() and stamp_path.exists():
+            try:
+                if json.loads(stamp_path.read_text(encoding="utf-8")).get("key") == key:
+                    result["status"] = "skipped"
+                    return result
+            except ValueError:
+                pass
+
+        t = time.perf_counter()
+        audio_track = prepare_audio(audio, duration, profile, audio_sha=audio_sha)
+        timings["audio_sec"] = round(time.perf_counter() - t, 4)
+
+        t = time.perf_counter()
+        if rungs:
+            # a directory of renditions; the stamp written last marks it complete
+            stamp_path.unlink(missing_ok=True)
+            render_ladder(
+                audio_path=str(audio_track),
+                audio_prepared=True,
+                events=events,
+                output_dir=str(out_path),
+                duration_sec=duration,
+                resolutions=rungs,
+                fps=fps,
+                profile=profile,
+                hls=bool(job["hls"]),
+            )
+        else:
+            tmp = out_path.with_name(f".{out_path.stem}.{os.getpid()}.tmp{out_path.suffix}")
+            try:
+                render(
+                    audio_path=str(audio_track),
+                    audio_prepared=True,
+                    events=events,
+                    output_path=str(tmp),
+                    duration_sec=duration,
+                    resolution=resolution,
+                    fps=fps,
+                    profile=profile,
+                )
+                os.replace(tmp, out_path)
+            finally:
+                tmp.unlink(missing_ok=True)
+        timings["render_sec"] = round(time.perf_counter() - t, 4)
+
+        stamp_path.write_text(json.dumps({"key": key, "job": job}, indent=2), encoding="utf-8")
+        result["status"] = "ok"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        timings["total_sec"] = round(time.perf_counter() - t0, 4)
+    return result
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Render a JSONL manifest of videos without the UI.")
+    ap.add_argument("jobs", type=Path, help="JSONL job manifest")
+    ap.add_argument("--out-dir", type=Path, default=ROOT / "outputs" / "batch")
+    ap.add_argument("--results", type=Path, default=None, help="results manifest (default: <out-dir>/results.jsonl)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--force", action="store_true", help="re-render even if outputs are up to date")
+    args = ap.parse_args(argv)
+
+    jobs = load_jobs(args.jobs)
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    results_path = args.results or args.out_dir / "results.jsonl"
+
+    t0 = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool, open(results_path, "w", encoding="utf-8") as out:
+        futures = [pool.submit(run_job, job, str(args.out_dir), args.force) for job in jobs]
+        for f in as_completed(futures):
+            r = f.result()
+            failed += r["status"] == "failed"
+            out.write(json.dumps(r) + "\n")
+            out.flush()
+            print(
+                f"[{r['status']:>7}] {r['id']} ({r['timings'].get('total_sec', 0):.1f}s)"
+                + (f" {r['error']}" if r["error"] else "")
+                + (f" storyboard: {r['storyboard']}" if r["storyboard"] else "")
+            )
+
+    print(f"{len(jobs)} jobs, {failed} failed in {time.perf_counter() - t0:.1f}s -> {results_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Render benchmark.
+
+    python bench.py --quick -o bench.json                 # 26 events, 60 s, 480p
+    python bench.py --events 5,26,500,5000 --durations 60,1800 --resolutions 480p,720p,1080p
+    python bench.py --quick --compare bench_baseline.json  # exit 1 on regressions
+    python bench.py --imports                              # app startup import budget
+    python bench.py --onsets                               # streamed onset envelope == whole-file
+
+Every case runs in a fresh worker process so peak RSS (Python and ffmpeg children)
+is per case. Stages: parse_prompt_lines, build_storyboard_for_template,
+filter graph build, ffmpeg render (wall time, encode fps).
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.backends import RENDERERS, get_renderer
+from core.harness import RESOLUTIONS, environment, make_audio
+from core.prompt_parser import parse_prompt_lines
+from core.render import build_filter_complex, unique_icon_paths
+from core.storyboard import build_storyboard_for_template
+
+ICONS = [f"{chr(ord('a') + i)}.png" for i in range(26)]
+WORDS = ["Apple", "Ball", "Cat", "Dog", "Elephant", "Fish", "Goat", "Hat", "Ice", "Jump", "Kite", "Lion", "Monkey"]
+
+# what app.py imports on every cold start; heavy deps must stay out of this path
+STARTUP_MODULES = (
+    "core.songs", "core.storyboard", "core.backends", "core.resources", "core.cache", "core.jobs",
+    "core.serve", "core.profiles", "core.audio_prep", "core.ingest", "core.render", "core.metrics",
+)
+HEAVY_MODULES = ("numpy", "PIL", "librosa")
+
+# metrics compared against a baseline (lower is better)
+COMPARED = ("parse_sec", "storyboard_sec", "graph_sec", "render_sec", "py_maxrss_mb", "ffmpeg_maxrss_mb")
+
+
+def synthetic_prompt_lines(n_events: int, duration_sec: float) -> List[str]:
+    """
+    abc_song.txt-style timestamped lines, evenly spaced over the duration.
+    """
+    step = duration_sec / float(n_events)
+    lines = []
+    for i in range(n_events):
+        m, s = divmod(i * step, 60)
+        letter = chr(ord("A") + i % 26)
+        lines.append(f"{int(m):02d}:{s:05.2f}|{letter}|{WORDS[i % len(WORDS)]}|{ICONS[i % 26]}")
+    return lines
+
+
+def _maxrss_mb(who: int) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    v = resource.getrusage(who).ru_maxrss
+    return round(v / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(case: Dict, audio_path: str, work_dir: str, render: bool) -> Dict:
+    """
+    Runs one case in the current (fresh) process and returns its metrics.
+    """
+    n, duration, res_name, backend = case["events"], case["duration"], case["resolution"], case["backend"]
+    resolution = RESOLUTIONS[res_name]
+    fps = case["fps"]
+    out = dict(case)
+
+    lines = synthetic_prompt_lines(n, duration)
+    t = time.perf_counter()
+    units = parse_prompt_lines(lines)
+    out["parse_sec"] = round(time.perf_counter() - t, 6)
+
+    t = time.perf_counter()
+    events = build_storyboard_for_template(units, duration_sec=duration)
+    out["storyboard_sec"] = round(time.perf_counter() - t, 6)
+
+    t = time.perf_counter()
+    icon_idx = {str(p): i + 1 for i, p in enumerate(unique_icon_paths(events))}
+    graph, _ = build_filter_complex(events, duration, resolution, fps, icon_idx)
+    out["graph_sec"] = round(time.perf_counter() - t, 6)
+    out["graph_chars"] = len(graph)
+
+    if render:
+        dst = Path(work_dir) / f"bench_{backend}_{n}_{duration}_{res_name}_{os.getpid()}.mp4"
+        t = time.perf_counter()
+        try:
+            get_renderer(backend)(
+                audio_path=audio_path,
+                events=events,
+                output_path=str(dst),
+                duration_sec=duration,
+                resolution=resolution,
+                fps=fps,
+            )
+            wall = time.perf_counter() - t
+            out["render_sec"] = round(wall, 3)
+            out["encode_fps"] = round(duration * fps / wall, 1) if wall > 0 else None
+            out["output_bytes"] = dst.stat().st_size
+        except Exception as e:
+            out["error"] = str(e)[-2000:]
+        finally:
+            dst.unlink(missing_ok=True)
+
+    out["py_maxrss_mb"] = _maxrss_mb(resource.RUSAGE_SELF)
+    out["ffmpeg_maxrss_mb"] = _maxrss_mb(resource.RUSAGE_CHILDREN)
+    return out
+
+
+def measure_imports(modules=STARTUP_MODULES, repeat: int = 3) -> Dict:
+    """
+    Import time of `modules` in fresh interpreters (best of `repeat`), and which heavy
+    modules got pulled in.
+    """
+    code = (
+        "import json, sys, time\n"
+        "t = time.perf_counter()\n"
+        f"import {', '.join(modules)}\n"
+        "ms = (time.perf_counter() - t) * 1000\n"
+        f"print(json.dumps({{'ms': ms, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    runs = [
+        json.loads(subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout)
+        for _ in range(repeat)
+    ]
+    return {
+        "import_ms": round(min(r["ms"] for r in runs), 1),
+        "heavy_imported": sorted({m for r in runs for m in r["heavy"]}),
+    }
+
+
+def check_onsets(work_dir: str, duration_sec: int = 150, quiet_sec: int = 70) -> Dict:
+    """
+    core.audio's chunked onset envelope vs librosa's onset_strength on the whole file,
+    for a gated tone that stays near silence for `quiet_sec` and spans several chunks.
+    """
+    import librosa
+    import numpy as np
+
+    from core.audio import ANALYSIS_SR, HOP_LENGTH, onset_envelope_streaming
+
+    sr = ANALYSIS_SR
+    t = np.arange(duration_sec * sr) / sr
+    y = np.sin(2 * np.pi * 440 * t) * (np.sin(2 * np.pi * 2.1 * t) > 0)
+    y += 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    y[: quiet_sec * sr] *= 0.002
+    pcm = (y * 0.5 * 32767).astype("<i2")
+    path = Path(work_dir) / "onsets.wav"
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(pcm.tobytes())
+
+    streamed, _ = onset_envelope_streaming(str(path))
+    whole = librosa.onset.onset_strength(y=pcm.astype(np.float32) / 32768.0, sr=sr, hop_length=HOP_LENGTH)
+    onsets = [
+        len(librosa.onset.onset_detect(onset_envelope=env, sr=sr, hop_length=HOP_LENGTH, backtrack=True))
+        for env in (streamed, whole)
+    ]
+    same_shape = streamed.shape == whole.shape
+    return {
+        "frames": [len(streamed), len(whole)],
+        "max_abs_diff": float(np.abs(streamed - whole).max()) if same_shape else None,
+        "onsets": onsets,
+    }
+
+
+def _case_id(r: Dict) -> Tuple:
+    return r["backend"], r["events"], r["duration"], r["resolution"], r["fps"]
+
+
+def compare(results: List[Dict], baseline: Dict, threshold: float) -> List[str]:
+    """
+    Metrics that got worse than baseline by more than `threshold` (fraction).
+    Tiny absolute values (< 1 ms / < 1 MB) are ignored as noise.
+    """
+    base = {_case_id(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        b = base.get(_case_id(r))
+        if b is None:
+            continue
+        for m in COMPARED:
+            new, old = r.get(m), b.get(m)
+            if new is None or old is None or max(new, old) < (1.0 if m.endswith("_mb") else 0.001):
+                continue
+            if old > 0 and (new - old) / old > threshold:
+                regressions.append(f"{_case_id(r)} {m}: {old} -> {new} (+{(new - old) / old:.0%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark storyboard and render stages.")
+    ap.add_argument("--events", default="5,26,500,5000")
+    ap.add_argument("--durations", default="60,1800", help="seconds")
+    ap.add_argument("--resolutions", default="480p,720p,1080p", help=",".join(RESOLUTIONS))
+    ap.add_argument("--backends", default="drawtext", help=",".join(RENDERERS))
+    ap.add_argument("--fps", type=int, default=24)
+    ap.add_argument("--quick", action="store_true", help="26 events, 60 s, 480p")
+    ap.add_argument("--no-render", action="store_true", help="only time the Python stages")
+    ap.add_argument("-o", "--output", type=Path, default=None, help="write results JSON here")
+    ap.add_argument("--compare", type=Path, default=None, help="baseline JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown fraction")
+    ap.add_argument("--imports", action="store_true", help="only check app startup imports against the budget")
+    ap.add_argument("--import-budget-ms", type=float, default=250.0)
+    ap.add_argument("--onsets", action="store_true", help="only check the streamed onset envelope against librosa")
+    args = ap.parse_args(argv)
+
+    if args.imports:
+        r = measure_imports()
+        print(json.dumps(r))
+        ok = r["import_ms"] <= args.import_budget_ms and not r["heavy_imported"]
+        if not ok:
+            print(f"STARTUP OVER BUDGET: {r['import_ms']} ms (budget {args.import_budget_ms} ms), heavy: {r['heavy_imported']}")
+        return 0 if ok else 1
+
+    if args.onsets:
+        with tempfile.TemporaryDirectory() as work:
+            r = check_onsets(work)
+        print(json.dumps(r))
+        ok = r["max_abs_diff"] is not None and r["max_abs_diff"] <= 1e-4 and r["onsets"][0] == r["onsets"][1]
+        if not ok:
+            print("STREAMED ONSET ENVELOPE DIFFERS FROM WHOLE-FILE onset_strength")
+        return 0 if ok else 1
+
+    if args.quick:
+        args.events, args.durations, args.resolutions = "26", "60", "480p"
+
+    cases = [
+        {"backend": b, "events": int(n), "duration": int(d), "resolution": r, "fps": args.fps}
+        for b in args.backends.split(",")
+        for n in args.events.split(",")
+        for d in args.durations.split(",")
+        for r in args.resolutions.split(",")
+    ]
+
+    results = []
+    with tempfile.TemporaryDirectory() as work:
+        audio = Path(work) / "bench_audio.wav"
+        if not args.no_render:
+            make_audio(audio, 30)
+        for case in cases:
+            # fresh process per case so maxrss figures are not cumulative
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                r = pool.submit(run_case, case, str(audio), work, not args.no_render).result()
+            results.append(r)
+            print(json.dumps(r))
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text(encoding="utf-8")), args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.threshold:.0%} vs {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.audio import ANALYSIS_DIR, ANALYSIS_SR, HOP_LENGTH, analyze_onsets
+from core.metrics import span
+from core.storyboard import StoryboardReport, StoryEvent, Unit, unit_fields
+
+# shortest time a card is allowed to stay up
+MIN_GAP_SEC = 0.25
+# how far (in even-grid steps) a unit may drift from its evenly spaced position
+BAND_STEPS = 1.0
+# penalty (in normalised onset strength) for drifting a full band away from the grid
+PRIOR_WEIGHT = 0.5
+
+
+def active_region(strength: np.ndarray, rel: float = 0.4) -> Tuple[int, int]:
+    """
+    [first, last] frames of the first and last strong onsets (above the noise floor by
+    `rel` of the peak), so leading and trailing silence or hiss don't stretch the grid.
+    """
+    if not len(strength):
+        return 0, 0
+    floor = float(np.median(strength))
+    strong = np.flatnonzero(strength >= floor + rel * (float(strength.max()) - floor))
+    if not len(strong):
+        return 0, len(strength) - 1
+    return int(strong[0]), int(strong[-1])
+
+
+def align_start_frames(
+    strength: np.ndarray,
+    n: int,
+    min_gap: int = 1,
+    band: float = BAND_STEPS,
+    prior_weight: float = PRIOR_WEIGHT,
+    first: int = 0,
+    last: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Banded DP (DTW-style, monotonic): picks n increasing frames at least `min_gap` apart
+    that maximise summed onset strength minus a penalty for straying from an even grid
+    from `first` to `last` (inclusive). Unit i only looks at frames within `band` grid steps of its grid
+    position, so time and memory are O(n * band width) = O(frames * band), not O(n * frames).
+    A span too short for n units is widened around its centre to exactly min_gap
+    spacing; if the whole envelope is too short, the (coincident) grid is returned.
+    """
+    n_frames = len(strength)
+    last = n_frames - 1 if last is None else min(last, n_frames - 1)
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    need = (n - 1) * min_gap
+    if last - first < need <= n_frames - 1:
+        first = int(np.clip(round((first + last - need) / 2.0), 0, n_frames - 1 - need))
+        last = first + need
+    step = (last - first) / float(max(1, n - 1))
+    grid = first + step * np.arange(n)
+    if n == 1 or step < min_gap or n_frames < 2:
+        return np.clip(np.round(grid), 0, max(0, n_frames - 1)).astype(np.int64)
+
+    half = max(min_gap, int(np.ceil(band * step)))
+    width = min(2 * half + 1, n_frames)
+    lo = np.clip(np.round(grid).astype(np.int64) - half, 0, n_frames - width)
+    cols = np.arange(width)
+    frames = lo[:, None] + cols[None, :]  # (n, width) candidate frames per unit
+
+    # per-unit local scores for every candidate at once
+    local = strength[frames] - prior_weight * np.abs(frames - grid[:, None]) / half
+    back = np.empty((n, width), dtype=np.int32)
+    score = local[0]
+    for i in range(1, n):
+        # best predecessor ending at or before column k: running max (+ its argmax)
+        run = np.maximum.accumulate(score)
+        arg = np.maximum.accumulate(np.where(score == run, cols, 0))
+        k = frames[i] - min_gap - lo[i - 1]
+        kc = np.clip(k, 0, width - 1)
+        back[i] = arg[kc]
+        score = local[i] + np.where(k >= 0, run[kc], -np.inf)
+
+    if not np.isfinite(score.max()):
+        return np.clip(np.round(grid), 0, n_frames - 1).astype(np.int64)
+
+    picked = np.empty(n, dtype=np.int64)
+    picked[-1] = int(np.argmax(score))
+    for i in range(n - 1, 0, -1):
+        picked[i - 1] = back[i, picked[i]]
+    return lo + picked
+
+
+def align_units(
+    units: Iterable[Unit],
+    envelope: np.ndarray,
+    duration_sec: float,
+    sr: int = ANALYSIS_SR,
+    hop_length: int = HOP_LENGTH,
+    min_gap_sec: float = MIN_GAP_SEC,
+    band: float = BAND_STEPS,
+    prior_weight: float = PRIOR_WEIGHT,
+    report: Optional[StoryboardReport] = None,
+) -> List[StoryEvent]:
+    """
+    Template units (in order, timestamps ignored) -> StoryEvents starting on onsets.
+    Each event lasts until the next one starts; the last runs to `duration_sec`.
+    Units that don't fit min_gap apart in the audio are spaced evenly over the whole
+    duration instead, so every non-empty unit gets a card; `report.dropped` counts
+    empty units (and any left with no time on screen).
+    """
+    fields = [unit_fields(u) for u in units]
+    rows = [r for r in fields if r[1] or r[2]]
+    if report is not None:
+        report.dropped += len(fields) - len(rows)
+    if not rows:
+        return []
+    fps = sr / float(hop_length)
+    n_frames = min(len(envelope), int(np.ceil(float(duration_sec) * fps)))
+    strength = np.asarray(envelope[:n_frames], dtype=np.float32)
+    peak = float(strength.max()) if strength.size else 0.0
+    if peak > 0:
+        strength = strength / peak
+
+    with span("storyboard.align", units=len(rows), frames=n_frames):
+        first, last = active_region(strength)
+        starts = align_start_frames(
+            strength, len(rows), max(1, int(round(min_gap_sec * fps))), band, prior_weight, first, last
+        ) / fps
+
+    duration = float(duration_sec)
+    if len(starts) > 1 and np.any(np.diff(starts) <= 0):
+        # more units than the audio has room for at min_gap: keep them all, evenly spaced
+        starts = duration * np.arange(len(rows)) / len(rows)
+    ends = np.append(starts[1:], duration)
+    events = [
+        StoryEvent(float(s), float(min(e, duration)), letter, word, icon)
+        for s, e, (_, letter, word, icon) in zip(starts, ends, rows)
+        if min(e, duration) > s
+    ]
+    if report is not None:
+        report.dropped += len(rows) - len(events)
+    return events
+
+
+def align_units_to_audio(
+    units: Iterable[Unit],
+    audio_path: str,
+    duration_sec: float,
+    audio_sha: Optional[str] = None,
+    cache_dir: Path = ANALYSIS_DIR,
+    **kwargs,
+) -> List[StoryEvent]:
+    """
+    Auto-timed storyboard: aligns the template to the file's (cached) onset envelope.
+    """
+    a = analyze_onsets(audio_path, cache_dir=cache_dir, audio_sha=audio_sha)
+    return align_units(units, a.envelope, duration_sec, sr=a.sr, hop_length=a.hop_length, **kwargs)
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from core.cache import RENDER_VERSION, RenderCache, icon_sha256
+from core.metrics import span
+from core.profiles import EncoderProfile, audio_codec_args, video_codec_args
+from core.render import FONT_LINUX, audio_input_args, card_layout, mp4_movflags, run_ffmpeg
+from core.segments import Segment, ffconcat_stills, plan_segments
+from core.sprites import scaled_icon
+from core.storyboard import StoryEvent
+
+ROOT = Path(__file__).resolve().parents[1]
+ASS_DIR = ROOT / "outputs" / "ass"
+
+FONT_NAME = "DejaVu Sans"
+# libass sizes fonts by ascent+descent, drawtext/Pillow by em; DejaVu's ratio is ~1.16
+ASS_FONT_SCALE = 1.164
+# \an8 puts the line box top (with libass' extra ascent) at y; lift by this many em
+# so glyphs land where Pillow's "mt" anchor / the other backends put them
+ASS_TOP_SHIFT = 0.195
+
+# ASS colours are &HAABBGGRR with alpha 00 = opaque
+TEXT_COLOUR = "&H00FFFFFF"
+BOX_COLOUR = "&HB3000000"  # black @ 0.30 like the drawtext box
+
+
+def ass_timestamp(cs: int) -> str:
+    h, cs = divmod(max(0, int(cs)), 360000)
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+
+
+def frame_timestamp(frame: int, fps: int) -> str:
+    """
+    ASS time for a frame boundary: the last centisecond strictly before frame/fps
+    (exact integer maths). The ass filter passes libass pts * time_base in ms,
+    truncated, and exact times such as 6/24 s can land a hair under 250 ms, so the
+    boundary must sit below the frame time, yet after the previous frame (fps < 100).
+    libass shows an event while start <= t < end, so text switches on the same frame
+    as the icon strip.
+    """
+    return ass_timestamp((frame * 100 - 1) // fps)
+
+
+def _escape_ass(s: str) -> str:
+    # braces open override blocks, so they get libass' \{ \} escapes. A backslash
+    # followed by n, N or h is a tag; a word joiner (zero width) after each literal
+    # backslash keeps it from pairing with the next character
+    return (s or "").replace("\\", "\\\u2060").replace("{", "\\{").replace("}", "\\}").replace("\n", " ")
+
+
+def _escape_filter_path(p: Path) -> str:
+    # filter option value inside single quotes
+    return str(p).replace("\\", "/").replace("'", "\\'").replace(":", "\\:")
+
+
+def build_ass_script(segments: List[Segment], resolution: Tuple[int, int], fps: int) -> str:
+    """
+    Whole timeline as one ASS script: a Box style drawn with \\p1, Letter and Word
+    styles positioned by card_layout. Times come from the frame-aligned segments.
+    """
+    w, h = resolution
+    lay = card_layout(resolution)
+    big_fs = int(round(lay.big_fs * ASS_FONT_SCALE))
+    word_fs = int(round(lay.word_fs * ASS_FONT_SCALE))
+    big_y = lay.big_y - int(round(lay.big_fs * ASS_TOP_SHIFT))
+    word_y = lay.word_y - int(round(lay.word_fs * ASS_TOP_SHIFT))
+    style = "{name},{font},{size},{colour},&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,0,0,1,0,0,{align},0,0,0,1"
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {w}",
+        f"PlayResY: {h}",
+        "WrapStyle: 2",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding",
+        "Style: " + style.format(name="Box", font=FONT_NAME, size=10, colour=BOX_COLOUR, align=7),
+        "Style: " + style.format(name="Letter", font=FONT_NAME, size=big_fs, colour=TEXT_COLOUR, align=8),
+        "Style: " + style.format(name="Word", font=FONT_NAME, size=word_fs, colour=TEXT_COLOUR, align=8),
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+
+    x0, y0 = lay.card_x, lay.card_y
+    x1, y1 = lay.card_x + lay.card_w, lay.card_y + lay.card_h
+    box = f"{{\\an7\\pos(0,0)\\p1}}m {x0} {y0} l {x1} {y0} {x1} {y1} {x0} {y1}{{\\p0}}"
+    for seg in segments:
+        e = seg.event
+        if e is None:
+            continue
+        start = frame_timestamp(seg.start_frame, fps)
+        end = frame_timestamp(seg.start_frame + seg.n_frames, fps)
+        lines.append(f"Dialogue: 0,{start},{end},Box,,0,0,0,,{box}")
+        if e.letter:
+            lines.append(f"Dialogue: 1,{start},{end},Letter,,0,0,0,,{{\\pos({w // 2},{big_y})}}{_escape_ass(e.letter)}")
+        if e.word:
+            lines.append(f"Dialogue: 1,{start},{end},Word,,0,0,0,,{{\\pos({w // 2},{word_y})}}{_escape_ass(e.word)}")
+    return "\n".join(lines) + "\n"
+
+
+def ensure_icon_strip(icon: Optional[str], resolution: Tuple[int, int], cache: RenderCache) -> Path:
+    """
+    Full-width RGBA strip, icon_h tall, with the icon centred (fully transparent for
+    gaps/no icon). Constant frame size keeps the single overlay input simple.
+    """
+    w, _ = resolution
+    lay = card_layout(resolution)
+    payload = {"v": RENDER_VERSION, "res": list(resolution), "icon": icon or "", "sha": icon_sha256(icon)}
+    key = "strip_" + hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+    hit = cache.get(key, ".png")
+    if hit is not None:
+        return hit
+
+    strip = Image.new("RGBA", (w, lay.icon_h), (0, 0, 0, 0))
+    img = scaled_icon(icon, lay.icon_h)
+    if img is not None:
+        strip.alpha_composite(img, ((w - img.width) // 2, 0))
+    path = cache.path_for(key, ".png")
+    tmp = path.with_name(f".{key}.{uuid.uuid4().hex}.tmp.png")
+    strip.save(tmp, "PNG", compress_level=1)
+    os.replace(tmp, path)
+    return path
+
+
+def render_video_ass(
+    audio_path: str,
+    events: List[StoryEvent],
+    output_path: str,
+    duration_sec: int = 60,
+    resolution: Tuple[int, int] = (854, 480),
+    fps: int = 24,
+    cache_dir: Path = ASS_DIR,
+    cache_max_bytes: int = 256 * 1024 ** 2,
+    fragmented: bool = False,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+) -> str:
+    """
+    Text and boxes are burned in by libass from one generated .ass file; icons come
+    from one concat-demuxer timeline of pre-scaled strips through a single overlay.
+    The filter graph is the same handful of filters for 5 cues or 5,000.
+    """
+    out = Path(output_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    cache = RenderCache(cache_dir, max_bytes=cache_max_bytes)
+    w, h = resolution
+    lay = card_layout(resolution)
+
+    segments = plan_segments(events, duration_sec, fps)
+    token = uuid.uuid4().hex
+    ass_path = cache.cache_dir / f".timeline_{token}.ass"
+    list_path = cache.cache_dir / f".icons_{token}.txt"
+
+    with span("render.subtitles", events=len(events)):
+        ass_path.write_text(build_ass_script(segments, resolution, fps), encoding="utf-8")
+        has_icons = any(s.event is not None and s.event.icon and scaled_icon(s.event.icon, lay.icon_h) for s in segments)
+        strips: List[Path] = []
+        if has_icons:
+            strips = [ensure_icon_strip(s.event.icon if s.event else None, resolution, cache) for s in segments]
+            list_path.write_text(
+                ffconcat_stills([(p, s.n_frames) for s, p in zip(segments, strips)], fps), encoding="utf-8"
+            )
+
+    fontsdir = Path(FONT_LINUX).parent
+    subs = f"ass=filename='{_escape_filter_path(ass_path)}'"
+    if fontsdir.is_dir():
+        subs += f":fontsdir='{_escape_filter_path(fontsdir)}'"
+    graph = f"color=c=#E6F5FF:s={w}x{h}:r={fps}:d={duration_sec},{subs}"
+
+    try:
+        cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", *audio_input_args(audio_path, audio_prepared)]
+        if has_icons:
+            cmd += ["-f", "concat", "-safe", "0", "-i", str(list_path)]
+            graph += (
+                f"[base];[1:v]fps={fps},format=rgba[icons];"
+                f"[base][icons]overlay=x=0:y={(h - lay.icon_h) // 2}:eof_action=pass,format=yuv420p"
+            )
+        cmd += [
+            "-filter_complex", graph + "[v]",
+            "-map", "[v]",
+            "-map", "0:a",
+            "-t", str(duration_sec),
+            "-r", str(fps),
+            *video_codec_args(profile, fps),
+            *audio_codec_args(profile, audio_prepared),
+            "-shortest",
+            *mp4_movflags(fragmented),
+            str(out),
+        ]
+        run_ffmpeg(cmd)
+    finally:
+        ass_path.unlink(missing_ok=True)
+        list_path.unlink(missing_ok=True)
+
+    cache.evict(keep=strips)
+    return str(out)
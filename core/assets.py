@@ -1,77 +1,277 @@
 from __future__ import annotations
 
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from PIL import Image, ImageDraw, ImageFont
+from core.render import card_layout, resolve_icon
+from core.storyboard import StoryEvent
 
+# Pillow (and core.sprites, which needs it) is imported where cards are drawn, so
+# checking for existing content-addressed files never pays for it.
+if TYPE_CHECKING:
+    from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+PACK_DIR = ROOT / "outputs" / "asset_pack"
+
+# Bump when drawing code changes so content-addressed files are regenerated.
+ASSET_VERSION = "1"
+DEFAULT_SIZE = 1024
 
 ALPHABET_ANIMALS: Dict[str, str] = {
     "A": "Alligator",
     "B": "Bear",
     "C": "Cat",
+    "D": "Dog",
+    "E": "Elephant",
+    "F": "Fox",
+    "G": "Giraffe",
+    "H": "Horse",
+    "I": "Iguana",
+    "J": "Jellyfish",
+    "K": "Koala",
+    "L": "Lion",
+    "M": "Monkey",
+    "N": "Newt",
+    "O": "Owl",
+    "P": "Panda",
+    "Q": "Quail",
+    "R": "Rabbit",
+    "S": "Seal",
+    "T": "Tiger",
+    "U": "Urchin",
+    "V": "Vulture",
+    "W": "Whale",
+    "X": "X-ray Fish",
+    "Y": "Yak",
+    "Z": "Zebra",
 }
 
+Color = Tuple[int, int, int, int]
 
-def ensure_alphabet_assets(assets_dir: Path) -> Dict[str, str]:
+
+@dataclass(frozen=True)
+class CardStyle:
     """
-    Ensures A/B/C placeholder PNGs exist. Returns a mapping of label->absolute filepath.
-    Generates simple kid-safe images (letter + animal word) so we don't depend on repo PNGs.
+    Look of a letter+word card. Geometry is relative to a 1024 px square and scaled
+    to the requested size, so every size variant is the same drawing.
     """
-    assets_dir.mkdir(parents=True, exist_ok=True)
 
-    out: Dict[str, str] = {}
-    for letter, animal in ALPHABET_ANIMALS.items():
-        filename = f"{letter}_{animal.lower()}.png"
-        path = assets_dir / filename
-        if not path.exists():
-            _generate_placeholder_letter_animal_image(letter, animal, path)
-        out[letter] = str(path.resolve())
+    name: str
+    background: Color = (245, 245, 245, 255)
+    border: Color = (20, 20, 20, 255)
+    letter: Color = (15, 60, 170, 255)
+    word: Color = (20, 20, 20, 255)
+    shadow: Optional[Color] = (0, 0, 0, 80)
+    pill: Optional[Color] = (255, 230, 120, 255)
+    letter_y: int = 170
+    word_y: int = 760
 
-    return out
 
+STYLES: Dict[str, CardStyle] = {
+    # core.assets placeholder look: shadowed letter, word on a yellow pill
+    "placeholder": CardStyle(name="placeholder"),
+    # former ImageMagick cards from core.visuals: flat letter, plain word near the bottom
+    "visual": CardStyle(name="visual", shadow=None, pill=None, letter_y=120, word_y=800),
+}
+
+
+@dataclass(frozen=True)
+class AssetSpec:
+    letter: str
+    word: str
+    style: CardStyle
+    size: int
+
+    def key(self) -> str:
+        payload = {"v": ASSET_VERSION, "letter": self.letter, "word": self.word, "style": asdict(self.style), "size": self.size}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def path_in(self, out_dir: Path) -> Path:
+        return out_dir / f"{self.letter}_{self.slug()}_{self.size}_{self.key()[:16]}.png"
+
+    def slug(self) -> str:
+        return "".join(c for c in self.word.lower() if c.isalnum()) or "card"
 
-def _generate_placeholder_letter_animal_image(letter: str, animal: str, out_path: Path) -> None:
-    # 1024x1024 square image, high-contrast, kid-friendly
-    size = (1024, 1024)
-    img = Image.new("RGBA", size, (245, 245, 245, 255))
+
+def draw_letter_card(letter: str, word: str, style: CardStyle, size: int) -> "Image.Image":
+    from PIL import Image, ImageDraw
+
+    from core.sprites import load_font
+
+    s = size / 1024.0
+
+    def px(v: float) -> int:
+        return max(1, int(round(v * s)))
+
+    img = Image.new("RGBA", (size, size), style.background)
     d = ImageDraw.Draw(img)
 
-    # Border
-    d.rounded_rectangle([30, 30, size[0] - 30, size[1] - 30], radius=60, outline=(20, 20, 20, 255), width=10)
+    d.rounded_rectangle([px(30), px(30), size - px(30), size - px(30)], radius=px(60), outline=style.border, width=px(10))
+
+    big_font = load_font(px(520))
+    small_font = load_font(px(90))
 
-    # Try to load a default font (works on Streamlit Cloud). If not, use PIL built-in.
+    if letter:
+        if style.shadow:
+            d.text((size // 2 + px(10), px(style.letter_y) + px(10)), letter, font=big_font, fill=style.shadow, anchor="mt")
+        d.text((size // 2, px(style.letter_y)), letter, font=big_font, fill=style.letter, anchor="mt")
+
+    if word:
+        x0, y0, x1, y1 = d.textbbox((size // 2, px(style.word_y)), word, font=small_font, anchor="mt")
+        if style.pill:
+            d.rounded_rectangle(
+                [x0 - px(40), y0 - px(20), x1 + px(40), y1 + px(20)],
+                radius=px(40), fill=style.pill, outline=style.border, width=px(6),
+            )
+        d.text((size // 2, px(style.word_y)), word, font=small_font, fill=style.word, anchor="mt")
+
+    return img
+
+
+def _render_asset(spec: AssetSpec, path: str) -> str:
+    # runs in pool workers; load_font's lru_cache makes fonts a per-process, per-size load
+    out = Path(path)
+    tmp = out.with_name(f".{out.stem}.{uuid.uuid4().hex}.tmp.png")
     try:
-        big_font = ImageFont.truetype("DejaVuSans-Bold.ttf", 520)
-        small_font = ImageFont.truetype("DejaVuSans-Bold.ttf", 90)
-    except Exception:
-        big_font = ImageFont.load_default()
-        small_font = ImageFont.load_default()
+        draw_letter_card(spec.letter, spec.word, spec.style, spec.size).save(tmp, "PNG", compress_level=1)
+        os.replace(tmp, out)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def generate_assets(specs: Iterable[AssetSpec], out_dir: Path, workers: Optional[int] = None) -> Dict[AssetSpec, Path]:
+    """
+    Content-addressed card PNGs: existing files are reused, missing ones are drawn in a
+    process pool (inline when there are only a few). Concurrent callers may draw the
+    same card twice, but each write is an atomic replace of identical bytes.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {spec: spec.path_in(out_dir) for spec in specs}
+    missing = [(spec, p) for spec, p in paths.items() if not p.exists()]
+    if not missing:
+        return paths
 
-    # Big letter
-    letter_bbox = d.textbbox((0, 0), letter, font=big_font)
-    lw = letter_bbox[2] - letter_bbox[0]
-    lh = letter_bbox[3] - letter_bbox[1]
-    letter_pos = ((size[0] - lw) // 2, 170)
+    workers = workers or os.cpu_count() or 1
+    if len(missing) < 4 or workers == 1:
+        for spec, p in missing:
+            _render_asset(spec, str(p))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+            for f in [pool.submit(_render_asset, spec, str(p)) for spec, p in missing]:
+                f.result()
+    return paths
 
-    # Slight “shadow” for pop
-    d.text((letter_pos[0] + 10, letter_pos[1] + 10), letter, font=big_font, fill=(0, 0, 0, 80))
-    d.text(letter_pos, letter, font=big_font, fill=(15, 60, 170, 255))
 
-    # Animal label
-    text = f"{animal}"
-    t_bbox = d.textbbox((0, 0), text, font=small_font)
-    tw = t_bbox[2] - t_bbox[0]
-    th = t_bbox[3] - t_bbox[1]
-    t_pos = ((size[0] - tw) // 2, 760)
+def template_vocabulary(units: Iterable) -> List[Tuple[str, str]]:
+    """
+    (letter, word) pairs from template units, events or PromptRecords, in first-seen order.
+    """
+    seen: Dict[Tuple[str, str], None] = {}
+    for u in units:
+        letter = u.get("letter") if isinstance(u, dict) else getattr(u, "letter", "")
+        word = u.get("word") if isinstance(u, dict) else getattr(u, "word", "")
+        if letter or word:
+            seen.setdefault(((letter or "").strip(), (word or "").strip()), None)
+    return list(seen)
 
-    # Highlight pill behind animal
-    pill = [t_pos[0] - 40, t_pos[1] - 20, t_pos[0] + tw + 40, t_pos[1] + th + 20]
-    d.rounded_rectangle(pill, radius=40, fill=(255, 230, 120, 255), outline=(20, 20, 20, 255), width=6)
 
-    d.text(t_pos, text, font=small_font, fill=(20, 20, 20, 255))
+def icon_size_for(resolution: Tuple[int, int]) -> int:
+    # square cards drawn at exactly the renderer's icon height, so no scaling at render time
+    return card_layout(resolution).icon_h
 
-    img.save(out_path, "PNG")
+
+def ensure_asset_pack(
+    out_dir: Path = PACK_DIR,
+    resolutions: Sequence[Tuple[int, int]] = ((854, 480),),
+    vocabulary: Iterable[Tuple[str, str]] = (),
+    style: str = "placeholder",
+    workers: Optional[int] = None,
+    alphabet: bool = True,
+) -> Dict[Tuple[str, str, Tuple[int, int]], str]:
+    """
+    A–Z cards (unless alphabet=False) plus template vocabulary, one variant per output
+    resolution. Returns (letter, word, resolution) -> absolute filepath.
+    """
+    card_style = STYLES[style]
+    entries = list(dict.fromkeys([*(ALPHABET_ANIMALS.items() if alphabet else ()), *vocabulary]))
+    wanted = {
+        (letter, word, tuple(res)): AssetSpec(letter, word, card_style, icon_size_for(res))
+        for letter, word in entries
+        for res in resolutions
+    }
+    paths = generate_assets(set(wanted.values()), out_dir, workers=workers)
+    return {k: str(paths[spec].resolve()) for k, spec in wanted.items()}
+
+
+def with_card_icons(events: List[StoryEvent], resolution: Tuple[int, int], pack_dir: Path = PACK_DIR) -> List[StoryEvent]:
+    """
+    Events whose icon isn't in assets/icons get the pack card for their letter and word,
+    pre-sized for `resolution`. Events without an icon are left alone.
+    """
+    missing = [e for e in events if e.icon and resolve_icon(e.icon) is None]
+    if not missing:
+        return events
+    res = tuple(resolution)
+    cards = ensure_asset_pack(pack_dir, [res], template_vocabulary(missing), alphabet=False)
+    out: List[StoryEvent] = []
+    for e in events:
+        if e.icon and resolve_icon(e.icon) is None:
+            e = replace(e, icon=cards[(e.letter.strip(), e.word.strip(), res)])
+        out.append(e)
+    return out
+
+
+def _publish(src: Path, dst: Path) -> None:
+    # hardlink (or copy) under a temp name, then atomically take over the documented name
+    try:
+        if os.path.samefile(src, dst) or filecmp.cmp(src, dst, shallow=False):
+            return
+    except OSError:
+        pass
+    tmp = dst.with_name(f".{dst.stem}.{uuid.uuid4().hex}.tmp.png")
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def ensure_alphabet_assets(
+    assets_dir: Path,
+    style: str = "placeholder",
+    size: int = DEFAULT_SIZE,
+    workers: Optional[int] = None,
+    pack_dir: Path = PACK_DIR,
+) -> Dict[str, str]:
+    """
+    Ensures A–Z placeholder PNGs exist. Returns a mapping of label->absolute filepath.
+    Generates simple kid-safe images (letter + animal word) so we don't depend on repo PNGs.
+    Cards are drawn into the content-addressed pack and published under their
+    documented names (A_alligator.png).
+    """
+    specs = {letter: AssetSpec(letter, animal, STYLES[style], size) for letter, animal in ALPHABET_ANIMALS.items()}
+    paths = generate_assets(specs.values(), pack_dir, workers=workers)
+    assets_dir.mkdir(parents=True, exist_ok=True)
+    out: Dict[str, str] = {}
+    for letter, spec in specs.items():
+        suffix = "" if size == DEFAULT_SIZE else f"_{size}"
+        dst = assets_dir / f"{letter}_{spec.slug()}{suffix}.png"
+        _publish(paths[spec], dst)
+        out[letter] = str(dst.resolve())
+    return out
 
 
 def ensure_default_background(bg_path: Path, resolution: Tuple[int, int] = (1280, 720)) -> str:
@@ -82,6 +282,8 @@ def ensure_default_background(bg_path: Path, resolution: Tuple[int, int] = (1280
     bg_path.parent.mkdir(parents=True, exist_ok=True)
 
     if not bg_path.exists():
+        from PIL import Image, ImageDraw
+
         w, h = resolution
         img = Image.new("RGB", (w, h), (230, 245, 255))
         d = ImageDraw.Draw(img)
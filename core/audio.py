@@ -1,27 +1,241 @@
 from __future__ import annotations
 
+import json
+import os
+import subprocess
+import tempfile
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Tuple, List
+from typing import Iterator, List, Optional, Tuple
 
-import librosa
 import numpy as np
 
+from core.cache import sha256_file
+from core.ingest import IngestedAudio, ingest_upload
 
-def load_audio_from_upload(uploaded_file, outputs_dir: Path) -> Tuple[np.ndarray, int, Path]:
+ROOT = Path(__file__).resolve().parents[1]
+ANALYSIS_DIR = ROOT / "outputs" / "analysis"
+
+# Onset detection doesn't need more than this; decoding at native 44.1/48k doubles the work.
+ANALYSIS_SR = 22050
+HOP_LENGTH = 512
+N_FFT = 2048
+CHUNK_SEC = 60.0
+# librosa's power_to_db default: onset_strength clips the mel spectrogram this far
+# below its loudest bin, over the whole input
+TOP_DB = 80.0
+
+# librosa (numba, scipy) takes ~1 s to import; it is imported inside the functions
+# that analyse audio so importing this module stays cheap.
+
+# Bump when the analysis output changes so stale cache entries are not reused.
+ANALYSIS_VERSION = "2"
+
+
+@dataclass(frozen=True)
+class OnsetAnalysis:
+    envelope: np.ndarray  # onset strength per hop (float32)
+    times: np.ndarray  # detected onset times in seconds (float64)
+    sr: int
+    hop_length: int
+    duration: float
+
+
+def load_audio_from_upload(uploaded_file, outputs_dir: Path, sr: Optional[int] = ANALYSIS_SR) -> Tuple[np.ndarray, int, IngestedAudio]:
     """
-    Save uploaded file to disk and load via librosa.
-    Returns (y, sr, temp_audio_path).
+    Decode the upload without writing it to disk (mono, resampled to `sr`; None = native).
+    Returns (y, sr, source); `source.path` can be handed to renderers too. The caller
+    owns `source` (close() or use it as a context manager). `outputs_dir` is only used
+    when the upload is too large to keep in memory.
+
+    With `sr` set, samples are streamed into an unlinked spill file and `y` is a
+    read-only memmap of it, so only the pages in use are resident.
     """
-    outputs_dir.mkdir(exist_ok=True, parents=True)
+    spill_dir = outputs_dir / "spill"
+    source = ingest_upload(uploaded_file, spill_dir=spill_dir)
+    try:
+        if sr is None:
+            import librosa
 
-    tmp_path = outputs_dir / f"tmp_{uploaded_file.name}"
-    with open(tmp_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+            # librosa can decode mp3 if ffmpeg is present; packages.txt installs ffmpeg
+            y, sr = librosa.load(source.path, sr=None, mono=True)
+        else:
+            spill_dir.mkdir(parents=True, exist_ok=True)
+            # the mapping outlives the file object (and the file's name)
+            with tempfile.TemporaryFile(dir=spill_dir) as f:
+                for chunk in iter_pcm_chunks(source.path, sr=sr):
+                    f.write(chunk)
+                n = f.tell() // 4
+                y = np.memmap(f, dtype=np.float32, mode="r", shape=(n,)) if n else np.zeros(0, dtype=np.float32)
+    except BaseException:
+        source.close()
+        raise
+    return y, sr, source
 
-    # librosa can decode mp3 if ffmpeg is present; packages.txt installs ffmpeg
-    y, sr = librosa.load(tmp_path, sr=None, mono=True)
 
-    return y, sr, tmp_path
+def iter_pcm_chunks(path: str, sr: int = ANALYSIS_SR, chunk_sec: float = CHUNK_SEC) -> Iterator[np.ndarray]:
+    """
+    Decodes any ffmpeg-readable file to mono float32 at `sr`, yielding fixed-size chunks
+    (the last one may be shorter). Memory stays at one chunk regardless of file length.
+    """
+    chunk_samples = max(HOP_LENGTH, int(chunk_sec * sr) // HOP_LENGTH * HOP_LENGTH)
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", str(path),
+        "-f", "s16le", "-ac", "1", "-ar", str(sr),
+        "pipe:1",
+    ]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            raw = p.stdout.read(chunk_samples * 2)
+            if not raw:
+                break
+            yield np.frombuffer(raw[: len(raw) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+    finally:
+        p.stdout.close()
+        stderr = p.stderr.read().decode("utf-8", "replace")
+        p.stderr.close()
+        rc = p.wait()
+    if rc != 0:
+        raise RuntimeError(f"FFMPEG FAILED\n\nReturn code: {rc}\n\nSTDERR:\n{stderr}\n")
+
+
+def _mel_db_blocks(
+    path: str,
+    sr: int,
+    hop_length: int,
+    chunk_sec: float,
+) -> Iterator[Tuple[np.ndarray, int]]:
+    """
+    Yields (mel dB frames, samples) per decoded chunk: the frames centred in the chunk,
+    in dB without a top_db floor. Each chunk is analysed with N_FFT samples of context
+    on both sides, so the frames are the ones a whole-file melspectrogram would have.
+    """
+    import librosa
+
+    pad = N_FFT  # multiple of hop_length
+    prev_tail = np.zeros(0, dtype=np.float32)
+    chunks = iter_pcm_chunks(path, sr=sr, chunk_sec=chunk_sec)
+    cur = next(chunks, None)
+    while cur is not None:
+        nxt = next(chunks, None)
+        head = nxt[:pad] if nxt is not None else np.zeros(0, dtype=np.float32)
+        y = np.concatenate([prev_tail, cur, head])
+        S = librosa.feature.melspectrogram(y=y, sr=sr, n_fft=N_FFT, hop_length=hop_length)
+        skip = len(prev_tail) // hop_length
+        # chunks are whole hops; the last one also owns the final centred frame
+        n_keep = len(cur) // hop_length + (1 if nxt is None else 0)
+        yield librosa.power_to_db(S[:, skip: skip + n_keep], top_db=None), len(cur)
+
+        prev_tail = np.concatenate([prev_tail, cur])[-pad:]
+        cur = nxt
+
+
+def onset_envelope_streaming(
+    path: str,
+    sr: int = ANALYSIS_SR,
+    hop_length: int = HOP_LENGTH,
+    chunk_sec: float = CHUNK_SEC,
+) -> Tuple[np.ndarray, float]:
+    """
+    librosa.onset.onset_strength over the whole file, computed chunk by chunk. Its
+    TOP_DB floor is relative to the loudest bin of the whole file, so a first pass
+    finds that and a second clips each chunk's mel dB against it before the lag-1
+    difference. The file is decoded twice; memory stays at one chunk.
+    Returns (envelope, duration_sec).
+    """
+    top = -np.inf
+    for S, _ in _mel_db_blocks(path, sr, hop_length, chunk_sec):
+        if S.size:
+            top = max(top, float(S.max()))
+
+    # onset_strength's zero frames for the lag and for centring (n_fft / 2 samples)
+    pieces: List[np.ndarray] = [np.zeros(1 + N_FFT // (2 * hop_length), dtype=np.float32)]
+    total = 0
+    prev = None
+    for S, n in _mel_db_blocks(path, sr, hop_length, chunk_sec):
+        total += n
+        if not S.size:
+            continue
+        S = np.maximum(S, top - TOP_DB)
+        if prev is not None:
+            S = np.concatenate([prev, S], axis=1)
+        pieces.append(np.maximum(0.0, S[:, 1:] - S[:, :-1]).mean(axis=0).astype(np.float32))
+        prev = S[:, -1:]
+
+    if not total:
+        return np.zeros(0, dtype=np.float32), 0.0
+    # one frame per hop plus the final centred frame, as librosa trims it
+    return np.concatenate(pieces)[: total // hop_length + 1], total / float(sr)
+
+
+def min_gap_filter(times: np.ndarray, min_gap: float) -> np.ndarray:
+    """
+    Greedy min-gap filter (keep an onset only if it is >= min_gap after the last kept one).
+    An onset >= min_gap after its predecessor is always kept, so one np.diff settles
+    those; the greedy choice is inherently sequential only inside clusters of closer
+    onsets, which are walked with searchsorted (one step per onset kept there).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    if times.size == 0 or min_gap <= 0:
+        return times
+    n = times.size
+    heads = np.concatenate(([0], np.flatnonzero(np.diff(times) >= min_gap) + 1))
+    ends = np.append(heads[1:], n)
+    keep = np.zeros(n, dtype=bool)
+    keep[heads] = True
+    clustered = ends - heads > 1
+    for a, b in zip(heads[clustered].tolist(), ends[clustered].tolist()):
+        i = a
+        while True:
+            i = a + int(np.searchsorted(times[a:b], times[i] + min_gap, side="left"))
+            if i >= b:
+                break
+            keep[i] = True
+    return times[keep]
+
+
+def _analysis_cache_path(audio_sha: str, sr: int, hop_length: int, cache_dir: Path) -> Path:
+    return cache_dir / f"onsets_{audio_sha[:32]}_{sr}_{hop_length}_v{ANALYSIS_VERSION}.npz"
+
+
+def analyze_onsets(
+    path: str,
+    sr: int = ANALYSIS_SR,
+    hop_length: int = HOP_LENGTH,
+    cache_dir: Path = ANALYSIS_DIR,
+    audio_sha: Optional[str] = None,
+) -> OnsetAnalysis:
+    """
+    Onset envelope + onset times for a file, cached on disk by audio content hash.
+    """
+    audio_sha = audio_sha or sha256_file(Path(path))
+    cache_path = _analysis_cache_path(audio_sha, sr, hop_length, cache_dir)
+    if cache_path.exists():
+        try:
+            with np.load(cache_path) as z:
+                meta = json.loads(str(z["meta"]))
+                return OnsetAnalysis(z["envelope"], z["times"], sr, hop_length, float(meta["duration"]))
+        except (OSError, ValueError, KeyError):
+            pass
+
+    envelope, duration = onset_envelope_streaming(path, sr=sr, hop_length=hop_length)
+    if envelope.size:
+        import librosa
+
+        frames = librosa.onset.onset_detect(onset_envelope=envelope, sr=sr, hop_length=hop_length, backtrack=True)
+        times = librosa.frames_to_time(frames, sr=sr, hop_length=hop_length).astype(np.float64)
+    else:
+        times = np.zeros(0, dtype=np.float64)
+    times = np.sort(times[times >= 0])
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_name(f".{cache_path.stem}.{uuid.uuid4().hex}.tmp.npz")
+    np.savez(tmp, envelope=envelope, times=times, meta=json.dumps({"duration": duration}))
+    os.replace(tmp, cache_path)
+    return OnsetAnalysis(envelope, times, sr, hop_length, duration)
 
 
 def get_onset_times(y: np.ndarray, sr: int, max_events: int = 3, min_gap: float = 0.5) -> List[float]:
@@ -29,24 +243,31 @@ def get_onset_times(y: np.ndarray, sr: int, max_events: int = 3, min_gap: float
     Detect onset times (moments sound starts). We only need a few events (A,B,C).
     Adds a small min-gap filter to avoid near-duplicate onsets common with TTS.
     """
+    import librosa
+
     onset_frames = librosa.onset.onset_detect(y=y, sr=sr, backtrack=True)
-    onset_times = librosa.frames_to_time(onset_frames, sr=sr)
-    onset_times = sorted(float(t) for t in onset_times if t >= 0)
+    onset_times = np.sort(librosa.frames_to_time(onset_frames, sr=sr))
+    duration = len(y) / float(sr) if sr else 0
+    return _pick_onsets(onset_times[onset_times >= 0], duration, max_events, min_gap)
 
-    # Min-gap filter (prevents B and C almost on top of each other)
-    filtered = []
-    for t in onset_times:
-        if not filtered or (t - filtered[-1]) >= min_gap:
-            filtered.append(t)
 
-    onset_times = filtered
+def get_onset_times_for_file(path: str, max_events: int = 3, min_gap: float = 0.5, **analysis_kwargs) -> List[float]:
+    """
+    Same as get_onset_times, but streams the file and reuses the cached analysis.
+    """
+    a = analyze_onsets(path, **analysis_kwargs)
+    return _pick_onsets(a.times, a.duration, max_events, min_gap)
+
+
+def _pick_onsets(onset_times: np.ndarray, duration: float, max_events: int, min_gap: float) -> List[float]:
+    # Min-gap filter (prevents B and C almost on top of each other)
+    onset_times = [float(t) for t in min_gap_filter(onset_times, min_gap)[:max_events]]
 
     # If enough, take first N
     if len(onset_times) >= max_events:
         return onset_times[:max_events]
 
     # Fallback: evenly space across duration if detection is weak
-    duration = len(y) / float(sr) if sr else 0
     if duration <= 0:
         return []
 
@@ -63,4 +284,3 @@ def get_onset_times(y: np.ndarray, sr: int, max_events: int = 3, min_gap: float
         onset_times.append(last_time + step * (i + 1))
 
     return onset_times[:max_events]
-
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from core.cache import RenderCache, sha256_file
+from core.profiles import EncoderProfile, audio_codec_args
+from core.render import current_ffmpeg_hooks, ffmpeg_progress, run_ffmpeg
+
+ROOT = Path(__file__).resolve().parents[1]
+AUDIO_DIR = ROOT / "outputs" / "audio"
+
+# Bump when the preparation command changes.
+PREP_VERSION = "1"
+
+
+def prepared_audio_key(audio_sha: str, duration_sec: float, profile: Optional[EncoderProfile] = None) -> str:
+    payload = {"v": PREP_VERSION, "audio": audio_sha, "duration": float(duration_sec), "codec": audio_codec_args(profile)}
+    return "aac_" + hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def prepare_audio_command(audio_path: Path, duration_sec: float, out_path: Path, profile: Optional[EncoderProfile] = None) -> List[str]:
+    return [
+        "ffmpeg", "-y",
+        "-hide_banner", "-loglevel", "error",
+        "-stream_loop", "-1", "-i", str(audio_path),
+        "-map", "0:a:0", "-vn",
+        "-t", str(duration_sec),
+        *audio_codec_args(profile),
+        str(out_path),
+    ]
+
+
+def prepare_audio(
+    audio_path: Path,
+    duration_sec: float,
+    profile: Optional[EncoderProfile] = None,
+    cache: Optional[RenderCache] = None,
+    audio_sha: Optional[str] = None,
+    keep: Iterable[Path] = (),
+) -> Path:
+    """
+    Encodes the upload once per (content, duration, audio settings) into an AAC track
+    already looped/trimmed to `duration_sec`. Renderers mux it with `-c:a copy`
+    (audio_prepared=True), so audio is never re-encoded on the render hot path.
+    """
+    cache = cache or RenderCache(AUDIO_DIR, max_bytes=512 * 1024 ** 2)
+    key = prepared_audio_key(audio_sha or sha256_file(Path(audio_path)), duration_sec, profile)
+
+    def encode(tmp_path: Path) -> None:
+        run_ffmpeg(prepare_audio_command(audio_path, duration_sec, tmp_path, profile))
+
+    # keep cancellation, but don't let the audio pass drive the job's progress bar
+    _, cancel = current_ffmpeg_hooks()
+    with ffmpeg_progress(None, cancel):
+        path, _ = cache.get_or_render(key, encode, suffix=".m4a", keep=[Path(audio_path), *keep])
+    return path
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from importlib import import_module
+from typing import Callable, Dict, Tuple
+
+from core.ffmpeg_caps import missing_filters
+
+# name -> (module, function); all share the render_video_ffmpeg_drawtext signature.
+# Imported on first use so NumPy/Pillow only load when a backend that needs them runs.
+RENDERERS: Dict[str, Tuple[str, str]] = {
+    "drawtext": ("core.render", "render_video_ffmpeg_drawtext"),
+    "segmented": ("core.segments", "render_video_segmented"),
+    "sprites": ("core.sprites", "render_video_sprites"),
+    "numpy": ("core.compositor", "render_video_numpy"),
+    "ass": ("core.ass", "render_video_ass"),
+    "library": ("core.library", "render_video_library"),
+    "visualizer": ("core.visualizer", "render_video_visualizer"),
+}
+
+# ffmpeg filters each backend's graph needs
+REQUIRED_FILTERS: Dict[str, Tuple[str, ...]] = {
+    "drawtext": ("drawtext", "drawbox", "overlay"),
+    "segmented": ("drawtext", "drawbox", "overlay"),
+    "sprites": (),
+    "numpy": (),
+    "ass": ("ass", "overlay"),
+    "library": ("drawtext", "drawbox", "overlay"),
+    "visualizer": (),
+}
+
+
+def get_renderer(name: str) -> Callable[..., str]:
+    try:
+        module, attr = RENDERERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown render backend: {name!r} (choose from {', '.join(RENDERERS)})") from None
+    return getattr(import_module(module), attr)
+
+
+def backend_missing_filters(name: str) -> Tuple[str, ...]:
+    """
+    Filters the installed ffmpeg lacks for this backend (empty if it can run).
+    """
+    return missing_filters(REQUIRED_FILTERS.get(name, ()))
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.render import RenderCancelled, current_ffmpeg_hooks
+from core.storyboard import StoryEvent
+
+ROOT = Path(__file__).resolve().parents[1]
+ICONS_DIR = ROOT / "assets" / "icons"
+
+# Bump when the renderer output changes so stale cache entries are not reused.
+RENDER_VERSION = "1"
+
+_CHUNK = 1 << 20
+
+
+def sha256_bytes(data) -> str:
+    return hashlib.sha256(bytes(data)).hexdigest()
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_ICON_HASHES: Dict[str, Tuple[int, int, str]] = {}
+
+
+def icon_sha256(icon: Optional[str], icons_dir: Path = ICONS_DIR) -> str:
+    """
+    Hash of an icon file, memoised on (mtime, size) so repeat lookups don't re-read PNGs.
+    Missing icons hash to "" (the renderer skips them too).
+    """
+    if not icon:
+        return ""
+    p = (icons_dir / icon).resolve()
+    try:
+        st = p.stat()
+    except OSError:
+        return ""
+    cached = _ICON_HASHES.get(str(p))
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    digest = sha256_file(p)
+    _ICON_HASHES[str(p)] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def clear_icon_hashes() -> None:
+    _ICON_HASHES.clear()
+
+
+def events_fingerprint(events: Sequence[StoryEvent], icons_dir: Path = ICONS_DIR) -> List[list]:
+    return [
+        [round(float(e.t_start), 3), round(float(e.t_end), 3), e.letter, e.word, e.icon or "", icon_sha256(e.icon, icons_dir)]
+        for e in events
+    ]
+
+
+def render_cache_key(audio_sha: str, events: Sequence[StoryEvent], params: Dict, icons_dir: Path = ICONS_DIR) -> str:
+    """
+    Content address of a render: audio bytes + storyboard + render params + icon contents.
+    """
+    payload = {
+        "v": RENDER_VERSION,
+        "audio": audio_sha,
+        "events": events_fingerprint(events, icons_dir),
+        "params": params,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=list)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+# how often a waiter on another request's render checks its own cancel event
+WAIT_POLL_SEC = 0.25
+# files used this recently are never evicted: another render (maybe in another process)
+# may have resolved them and not yet read them; renders touch() their pieces before use
+IN_USE_SEC = 600
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.path: Optional[Path] = None
+        self.error: Optional[BaseException] = None
+
+
+class RenderCache:
+    """
+    Content-addressed store for rendered files with single-flight coalescing
+    (concurrent requests for the same key share one render) and LRU eviction
+    under a disk quota. Hits refresh the file mtime, which is what eviction orders by.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Flight] = {}
+
+    def path_for(self, key: str, suffix: str = ".mp4") -> Path:
+        return self.cache_dir / f"{key}{suffix}"
+
+    def get(self, key: str, suffix: str = ".mp4") -> Optional[Path]:
+        p = self.path_for(key, suffix)
+        if not p.exists():
+            return None
+        try:
+            os.utime(p)
+        except OSError:
+            pass
+        return p
+
+    def touch(self, paths: Iterable[Path]) -> List[Path]:
+        """
+        Marks files as in use (refreshes their mtime) right before they are read, so
+        evict() anywhere leaves them alone for IN_USE_SEC. Returns the ones that are gone.
+        """
+        lost = []
+        for p in paths:
+            try:
+                os.utime(p)
+            except OSError:
+                lost.append(Path(p))
+        return lost
+
+    def put_bytes(self, key: str, data, suffix: str = "") -> Path:
+        """
+        Store a blob (e.g. an upload) under its key unless it already exists.
+        """
+        p = self.path_for(key, suffix)
+        if self.get(key, suffix) is None:
+            tmp = p.with_name(f".{p.name}.{uuid.uuid4().hex}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, p)
+        return p
+
+    def get_or_render(
+        self,
+        key: str,
+        render: Callable[[Path], object],
+        suffix: str = ".mp4",
+        keep: Iterable[Path] = (),
+    ) -> Tuple[Path, bool]:
+        """
+        Returns (path, hit). On a miss `render(tmp_path)` must write the file at tmp_path;
+        it is moved into place atomically. Waiters on the same key get the leader's result.
+        Cancellation is not shared: a waiter stops waiting (RenderCancelled) when its own
+        ffmpeg_progress cancel event is set, and if the leader is cancelled the waiters
+        race again and one of them renders instead.
+        """
+        _, cancel = current_ffmpeg_hooks()
+        while True:
+            with self._lock:
+                hit = self.get(key, suffix)
+                if hit is not None:
+                    return hit, True
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _Flight()
+                    self._inflight[key] = flight
+            if leader:
+                break
+
+            while not flight.done.wait(WAIT_POLL_SEC):
+                if cancel is not None and cancel.is_set():
+                    raise RenderCancelled("Render cancelled")
+            if isinstance(flight.error, RenderCancelled):
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.path, True
+
+        final = self.path_for(key, suffix)
+        tmp = final.with_name(f".{key}.{uuid.uuid4().hex}.tmp{suffix}")
+        try:
+            render(tmp)
+            os.replace(tmp, final)
+            flight.path = final
+        except BaseException as e:
+            flight.error = e
+            tmp.unlink(missing_ok=True)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+        self.evict(keep=[final, *keep])
+        return final, False
+
+    def evict(self, keep: Iterable[Path] = ()) -> List[Path]:
+        """
+        Delete least-recently-used files until the directory fits in max_bytes.
+        In-progress temp files, `keep` and files used within IN_USE_SEC are never removed.
+        """
+        keep_set = {str(Path(p).resolve()) for p in keep}
+        in_use_after = time.time() - IN_USE_SEC
+        entries = []
+        total = 0
+        for p in self.cache_dir.iterdir():
+            if not p.is_file() or p.name.startswith("."):
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            total += st.st_size
+            entries.append((st.st_mtime, st.st_size, p))
+
+        removed: List[Path] = []
+        entries.sort(key=lambda x: x[0])
+        for mtime, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            if str(p.resolve()) in keep_set or mtime > in_use_after:
+                continue
+            with self._lock:
+                if p.stem in self._inflight:
+                    continue
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed.append(p)
+        return removed
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from core.metrics import record_ffmpeg_run, span
+from core.render import (
+    RenderCancelled,
+    audio_input_args,
+    card_layout,
+    current_ffmpeg_hooks,
+    ffmpeg_run_stats,
+    mp4_movflags,
+    wait_with_rusage,
+)
+from core.profiles import EncoderProfile, audio_codec_args, video_codec_args
+from core.segments import plan_segments
+from core.sprites import BG_RGB, TEXT_RGBA, load_font, scaled_icon
+from core.storyboard import StoryEvent
+
+BOX_ALPHA = 0.30
+HOLD_HEARTBEAT_SEC = 2
+
+# (frame, frame_index) -> None; draws into the frame in place, so it runs for every frame
+# (the frame is sent whenever the overlay's drawing changed).
+# An overlay with a `region` attribute ((y0, y1, x0, x1)) promises to draw only there;
+# only that region is restored between frames instead of the whole frame.
+FrameOverlay = Callable[[np.ndarray, int], None]
+
+
+class _Layer:
+    """
+    Pre-multiplied RGBA patch placed at (x, y): out = rgb + dst * (255 - a) / 255.
+    """
+
+    def __init__(self, rgba: np.ndarray, x: int, y: int):
+        a = rgba[..., 3:4].astype(np.uint16)
+        self.x = x
+        self.y = y
+        self.h, self.w = rgba.shape[:2]
+        self.rgb = (rgba[..., :3].astype(np.uint16) * a + 127) // 255
+        self.inv_a = 255 - a
+
+    def blend_into(self, frame: np.ndarray, scratch: np.ndarray) -> None:
+        dst = frame[self.y:self.y + self.h, self.x:self.x + self.w]
+        s = scratch[:self.h, :self.w]
+        np.multiply(dst, self.inv_a, out=s)
+        s += 127
+        s //= 255
+        s += self.rgb
+        np.copyto(dst, s, casting="unsafe")
+
+
+class FrameCompositor:
+    """
+    Builds frames into one preallocated RGB buffer from background, card box and
+    card content layers. Layers are built once per unique card and reused.
+    """
+
+    def __init__(self, resolution: Tuple[int, int]):
+        w, h = resolution
+        self.resolution = (w, h)
+        self.layout = card_layout(resolution)
+        self.frame = np.empty((h, w, 3), dtype=np.uint8)
+        self.background = np.empty_like(self.frame)
+        self.background[...] = BG_RGB
+
+        lay = self.layout
+        box = self.background[lay.card_y:lay.card_y + lay.card_h, lay.card_x:lay.card_x + lay.card_w]
+        self.box = np.round(box.astype(np.float32) * (1.0 - BOX_ALPHA)).astype(np.uint8)
+
+        self._scratch = np.empty((h, w, 3), dtype=np.uint16)
+        self._layers: Dict[Tuple[str, str, str], Optional[_Layer]] = {}
+
+    def _content_layer(self, event: StoryEvent) -> Optional[_Layer]:
+        key = (event.letter, event.word, event.icon or "")
+        if key in self._layers:
+            return self._layers[key]
+
+        w, h = self.resolution
+        lay = self.layout
+        img = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+        d = ImageDraw.Draw(img)
+        if event.letter:
+            d.text((w / 2, lay.big_y), event.letter, font=load_font(lay.big_fs), fill=TEXT_RGBA, anchor="mt")
+        if event.word:
+            d.text((w / 2, lay.word_y), event.word, font=load_font(lay.word_fs), fill=TEXT_RGBA, anchor="mt")
+        icon = scaled_icon(event.icon, lay.icon_h)
+        if icon is not None:
+            img.alpha_composite(icon, ((w - icon.width) // 2, (h - icon.height) // 2))
+
+        bbox = img.getbbox()
+        layer = None
+        if bbox:
+            x0, y0, x1, y1 = bbox
+            layer = _Layer(np.asarray(img.crop(bbox)), x0, y0)
+        self._layers[key] = layer
+        return layer
+
+    def compose(self, event: Optional[StoryEvent]) -> np.ndarray:
+        np.copyto(self.frame, self.background)
+        if event is not None:
+            lay = self.layout
+            self.frame[lay.card_y:lay.card_y + lay.card_h, lay.card_x:lay.card_x + lay.card_w] = self.box
+            layer = self._content_layer(event)
+            if layer is not None:
+                layer.blend_into(self.frame, self._scratch)
+        return self.frame
+
+
+def _ebml_size(n: int) -> bytes:
+    # always the 8-byte form, so sizes never need to be measured in advance
+    return b"\x01" + n.to_bytes(7, "big")
+
+
+def _ebml(element_id: bytes, data: bytes) -> bytes:
+    return element_id + _ebml_size(len(data)) + data
+
+
+def _ebml_uint(element_id: bytes, value: int) -> bytes:
+    return _ebml(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def _mkv_header(resolution: Tuple[int, int], fps: int) -> bytes:
+    """
+    Start of a Matroska stream with one uncompressed rgb24 video track, millisecond
+    timestamps and an open-ended segment, so frames can follow as they are made.
+    """
+    w, h = resolution
+    ebml = _ebml(b"\x1a\x45\xdf\xa3", b"".join((
+        _ebml_uint(b"\x42\x86", 1),  # EBMLVersion
+        _ebml_uint(b"\x42\xf7", 1),  # EBMLReadVersion
+        _ebml_uint(b"\x42\xf2", 4),  # EBMLMaxIDLength
+        _ebml_uint(b"\x42\xf3", 8),  # EBMLMaxSizeLength
+        _ebml(b"\x42\x82", b"matroska"),  # DocType
+        _ebml_uint(b"\x42\x87", 4),  # DocTypeVersion
+        _ebml_uint(b"\x42\x85", 2),  # DocTypeReadVersion
+    )))
+    segment = b"\x18\x53\x80\x67" + b"\x01\xff\xff\xff\xff\xff\xff\xff"  # unknown size
+    info = _ebml(b"\x15\x49\xa9\x66", _ebml_uint(b"\x2a\xd7\xb1", 1_000_000))  # TimestampScale: 1 ms
+    video = _ebml(b"\xe0", b"".join((
+        _ebml_uint(b"\xb0", w),  # PixelWidth
+        _ebml_uint(b"\xba", h),  # PixelHeight
+        _ebml(b"\x2e\xb5\x24", b"RGB\x18"),  # ColourSpace: rgb24 FourCC
+    )))
+    track = _ebml(b"\xae", b"".join((
+        _ebml_uint(b"\xd7", 1),  # TrackNumber
+        _ebml_uint(b"\x73\xc5", 1),  # TrackUID
+        _ebml_uint(b"\x83", 1),  # TrackType: video
+        _ebml(b"\x86", b"V_UNCOMPRESSED"),  # CodecID
+        _ebml_uint(b"\x9c", 0),  # FlagLacing
+        _ebml_uint(b"\x23\xe3\x83", round(1e9 / fps)),  # DefaultDuration (ns), for the last frame
+        video,
+    )))
+    return ebml + segment + info + _ebml(b"\x16\x54\xae\x6b", track)
+
+
+def _mkv_frame_header(pts_ms: int, frame_bytes: int) -> bytes:
+    """
+    One cluster holding one keyframe SimpleBlock at pts_ms; the frame's bytes follow.
+    """
+    timestamp = _ebml_uint(b"\xe7", pts_ms)
+    block = b"\x81\x00\x00\x80"  # track 1, relative timestamp 0, keyframe
+    block_size = len(block) + frame_bytes
+    return (
+        b"\x1f\x43\xb6\x75" + _ebml_size(len(timestamp) + 1 + 8 + block_size) + timestamp
+        + b"\xa3" + _ebml_size(block_size) + block
+    )
+
+
+def render_video_numpy(
+    audio_path: str,
+    events: List[StoryEvent],
+    output_path: str,
+    duration_sec: int = 60,
+    resolution: Tuple[int, int] = (854, 480),
+    fps: int = 24,
+    overlay: Optional[FrameOverlay] = None,
+    fragmented: bool = False,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+) -> str:
+    """
+    Python compositor backend: frames are composed with NumPy only when the visible
+    event changes and streamed to ffmpeg straight from the frame buffer, one per
+    change, in a Matroska rawvideo pipe that carries each frame's timestamp. The
+    encoder only sees changes (plus a sparse heartbeat and the last frame) and the
+    output has variable-frame-rate timestamps on the 1/fps grid. With an overlay every
+    frame is drawn, and sent when the overlay's region differs from the last one sent.
+    """
+    out = Path(output_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    w, h = resolution
+
+    cmd = [
+        "ffmpeg", "-y",
+        "-hide_banner", "-loglevel", "error",
+        "-f", "matroska", "-i", "pipe:0",
+        *audio_input_args(audio_path, audio_prepared),
+        "-map", "0:v",
+        "-map", "1:a",
+        "-vf", "format=yuv420p",
+        # keep the pipe's timestamps (no duplicated frames); they sit on the 1/fps grid
+        "-fps_mode", "vfr", "-enc_time_base", f"1/{fps}",
+        "-t", str(duration_sec),
+        *video_codec_args(profile, fps),
+        *audio_codec_args(profile, audio_prepared),
+        *mp4_movflags(fragmented),
+        str(out),
+    ]
+
+    comp = FrameCompositor(resolution)
+    region = (slice(None), slice(None))
+    if overlay is not None and getattr(overlay, "region", None) is not None:
+        y0, y1, x0, x1 = overlay.region
+        region = (slice(y0, y1), slice(x0, x1))
+    segments = plan_segments(events, duration_sec, fps)
+    last_frame = segments[-1].start_frame + segments[-1].n_frames - 1 if segments else -1
+    # a held frame is re-sent this often so the video keeps a frame every few seconds
+    beat = max(1, int(fps * HOLD_HEARTBEAT_SEC))
+    frame_bytes = w * h * 3
+    callback, cancel = current_ffmpeg_hooks()
+    t0 = time.monotonic()
+    frame_index = 0
+    with span("render.compose_encode", events=len(events)), tempfile.TemporaryFile() as err:
+        p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=err)
+
+        def send(buf: memoryview, index: int) -> None:
+            p.stdin.write(_mkv_frame_header(round(index * 1000 / fps), frame_bytes))
+            p.stdin.write(buf)
+
+        try:
+            p.stdin.write(_mkv_header(resolution, fps))
+            for seg in segments:
+                if cancel is not None and cancel.is_set():
+                    raise RenderCancelled("Render cancelled")
+                frame = comp.compose(seg.event)
+                buf = memoryview(frame).cast("B")
+                end = seg.start_frame + seg.n_frames
+                if overlay is None:
+                    picks = list(range(seg.start_frame, end, beat))
+                    if end - 1 == last_frame and picks[-1] != last_frame:
+                        picks.append(last_frame)
+                    for i in picks:
+                        send(buf, i)
+                else:
+                    clean = frame[region].copy()
+                    shown = None
+                    last_sent = seg.start_frame
+                    for i in range(seg.start_frame, end):
+                        np.copyto(frame[region], clean)
+                        overlay(frame, i)
+                        if (
+                            shown is None or i - last_sent >= beat or i == last_frame
+                            or not np.array_equal(frame[region], shown)
+                        ):
+                            send(buf, i)
+                            shown = frame[region].copy()
+                            last_sent = i
+                frame_index = end
+                if callback is not None:
+                    elapsed = max(time.monotonic() - t0, 1e-6)
+                    callback({
+                        "frame": str(frame_index),
+                        "fps": f"{frame_index / elapsed:.1f}",
+                        "out_time_us": str(int(frame_index * 1_000_000 / fps)),
+                        "speed": f"{frame_index / float(fps) / elapsed:.2f}x",
+                        "progress": "continue",
+                    })
+            p.stdin.close()
+        except BrokenPipeError:
+            pass
+        except BaseException:
+            p.kill()
+            raise
+        finally:
+            rc, usage = wait_with_rusage(p)
+            elapsed = time.monotonic() - t0
+            record_ffmpeg_run(ffmpeg_run_stats(
+                {
+                    "frame": str(frame_index),
+                    "fps": f"{frame_index / max(elapsed, 1e-6):.1f}",
+                    "speed": f"{frame_index / float(fps) / max(elapsed, 1e-6):.2f}x",
+                },
+                elapsed, None, rc, usage,
+            ))
+        if rc != 0:
+            err.seek(0)
+            stderr = err.read().decode("utf-8", "replace")
+            raise RuntimeError(f"FFMPEG FAILED\n\nReturn code: {rc}\n\nSTDERR:\n{stderr}\n")
+
+    return str(out)
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import re
+import subprocess
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Optional, Tuple
+
+FFMPEG = "ffmpeg"
+
+_FILTER_LINE = re.compile(r"^\s*[TSC.|]{2,3}\s+(\S+)\s+\S+->\S+")
+_CODEC_LINE = re.compile(r"^\s*[VASFXBD.]{6}\s+(\S+)")
+
+
+def _ffmpeg_output(*args: str) -> str:
+    try:
+        p = subprocess.run([FFMPEG, "-hide_banner", *args], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return p.stdout
+
+
+@lru_cache(maxsize=1)
+def ffmpeg_version() -> Optional[str]:
+    out = _ffmpeg_output("-version").splitlines()
+    return out[0] if out else None
+
+
+@lru_cache(maxsize=1)
+def ffmpeg_filters() -> FrozenSet[str]:
+    return frozenset(m.group(1) for line in _ffmpeg_output("-filters").splitlines() if (m := _FILTER_LINE.match(line)))
+
+
+@lru_cache(maxsize=1)
+def ffmpeg_encoders() -> FrozenSet[str]:
+    return frozenset(m.group(1) for line in _ffmpeg_output("-encoders").splitlines() if (m := _CODEC_LINE.match(line)))
+
+
+def has_filter(name: str) -> bool:
+    return name in ffmpeg_filters()
+
+
+def missing_filters(names: Iterable[str]) -> Tuple[str, ...]:
+    names = tuple(names)
+    if not names:
+        return ()
+    available = ffmpeg_filters()
+    return tuple(n for n in names if n not in available)
+
+
+def clear_ffmpeg_caps() -> None:
+    """
+    Forget probe results (after installing or swapping the ffmpeg binary).
+    """
+    for fn in (ffmpeg_version, ffmpeg_filters, ffmpeg_encoders):
+        fn.cache_clear()
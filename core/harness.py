@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import os
+import platform
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+# Shared by the bench.py and golden.py harnesses.
+
+RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "240p": (426, 240),
+    "480p": (854, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+
+def make_audio(path: Path, duration_sec: float) -> None:
+    """
+    Test tone (440 Hz sine, at most 30 s; renderers loop shorter audio).
+    """
+    subprocess.run(
+        ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+         "-i", f"sine=frequency=440:duration={min(duration_sec, 30)}", str(path)],
+        check=True,
+    )
+
+
+def environment() -> Dict:
+    """
+    Where a run happened, recorded next to timings and goldens.
+    """
+    try:
+        ff = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        ff = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ff,
+    }
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import weakref
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+SPILL_DIR = ROOT / "outputs" / "spill"
+
+# uploads up to this size stay in RAM (memfd); larger ones spill to a temp file
+INGEST_MEMORY_MAX_MB = int(os.environ.get("INGEST_MEMORY_MAX_MB", "256"))
+
+
+def _close(fd: int, spill_path: Optional[str]) -> None:
+    try:
+        os.close(fd)
+    except OSError:
+        pass
+    if spill_path:
+        try:
+            os.unlink(spill_path)
+        except FileNotFoundError:
+            pass
+
+
+class IngestedAudio:
+    """
+    Upload bytes behind a file descriptor. `path` is a filename ffmpeg (or any other
+    process of this user) can open: /proc/<pid>/fd/<n> for memory-backed uploads,
+    a spill file otherwise. Analysis and rendering both read from it.
+
+    Released on close()/context exit, or when the last reference goes away (also at
+    interpreter exit), so spill files are never left behind. Keep a reference for as
+    long as a render job may still read it.
+    """
+
+    def __init__(self, data, suffix: str = "", spill_dir: Path = SPILL_DIR, max_memory_bytes: Optional[int] = None):
+        view = memoryview(data).cast("B")
+        self.size = view.nbytes
+        self.suffix = suffix
+        self.sha256 = hashlib.sha256(view).hexdigest()
+        limit = INGEST_MEMORY_MAX_MB * 1024 * 1024 if max_memory_bytes is None else max_memory_bytes
+
+        spill_path = None
+        if self.size <= limit and hasattr(os, "memfd_create") and Path("/proc/self/fd").is_dir():
+            fd = os.memfd_create(f"upload{suffix}", os.MFD_CLOEXEC)
+            self.path = f"/proc/{os.getpid()}/fd/{fd}"
+        else:
+            spill_dir.mkdir(parents=True, exist_ok=True)
+            fd, spill_path = tempfile.mkstemp(prefix=".upload_", suffix=suffix, dir=spill_dir)
+            self.path = spill_path
+        self.in_memory = spill_path is None
+        self._fd = fd
+        self._finalizer = weakref.finalize(self, _close, fd, spill_path)
+
+        try:
+            written = 0
+            while written < self.size:
+                written += os.write(fd, view[written:])
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def closed(self) -> bool:
+        return not self._finalizer.alive
+
+    def close(self) -> None:
+        self._finalizer()
+
+    def __enter__(self) -> "IngestedAudio":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __fspath__(self) -> str:
+        return self.path
+
+
+def ingest_upload(uploaded_file, spill_dir: Path = SPILL_DIR, max_memory_bytes: Optional[int] = None) -> IngestedAudio:
+    """
+    Streamlit UploadedFile (or anything with getbuffer() and name) -> IngestedAudio.
+    """
+    suffix = Path(getattr(uploaded_file, "name", "") or "").suffix
+    return IngestedAudio(uploaded_file.getbuffer(), suffix=suffix, spill_dir=spill_dir, max_memory_bytes=max_memory_bytes)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.render import RenderCancelled, ffmpeg_progress
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+@dataclass
+class RenderJob:
+    id: str
+    label: str
+    duration_sec: float
+    priority: int = 0
+    status: str = QUEUED
+    progress: float = 0.0  # 0..1
+    fps: Optional[float] = None
+    speed: Optional[str] = None
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+
+def apply_progress(job: RenderJob, block: Dict[str, str]) -> None:
+    """
+    Folds one ffmpeg `-progress` block into the job's progress/fps/speed.
+    """
+    # out_time_ms is microseconds too (long-standing ffmpeg quirk)
+    us = block.get("out_time_us") or block.get("out_time_ms")
+    try:
+        if us and us != "N/A" and job.duration_sec > 0:
+            job.progress = min(1.0, max(job.progress, int(us) / 1e6 / job.duration_sec))
+    except ValueError:
+        pass
+    try:
+        job.fps = float(block["fps"])
+    except (KeyError, ValueError):
+        pass
+    speed = block.get("speed")
+    if speed and speed != "N/A":
+        job.speed = speed
+
+
+class RenderJobManager:
+    """
+    Bounded worker pool for renders. Jobs run off the Streamlit script thread;
+    ffmpeg `-progress` output updates each job's progress/fps/speed as it encodes.
+    Lower `priority` runs first (FIFO within a priority), so quick previews are not
+    stuck behind full-quality encodes.
+    Keep a single instance per process (st.cache_resource) so all sessions share it.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, keep_finished: int = 200):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.keep_finished = keep_finished
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._jobs: Dict[str, RenderJob] = {}
+        self._fns: Dict[str, Callable[[], Any]] = {}
+        self._pending: List[Tuple[int, int, str]] = []  # heap of (priority, seq, job_id)
+        self._seq = itertools.count()
+        for i in range(self.max_workers):
+            threading.Thread(target=self._worker, name=f"render-{i}", daemon=True).start()
+
+    def submit(self, fn: Callable[[], Any], duration_sec: float, label: str = "", priority: int = 0) -> str:
+        job = RenderJob(id=uuid.uuid4().hex[:12], label=label, duration_sec=float(duration_sec), priority=priority)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._fns[job.id] = fn
+            heapq.heappush(self._pending, (priority, next(self._seq), job.id))
+            self._prune()
+            self._wakeup.notify()
+        return job.id
+
+    def get(self, job_id: str) -> Optional[RenderJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job_id: str) -> int:
+        """
+        1-based position among waiting jobs; 0 once the job has started (or is unknown).
+        """
+        with self._lock:
+            for pos, (_, _, jid) in enumerate(sorted(self._pending), 1):
+                if jid == job_id:
+                    return pos
+            return 0
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._pending = [x for x in self._pending if x[2] != job_id]
+                heapq.heapify(self._pending)
+                self._fns.pop(job_id, None)
+                job.status = CANCELLED
+                job.finished_at = time.time()
+        return True
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == RUNNING)
+
+    def _worker(self) -> None:
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                _, _, job_id = heapq.heappop(self._pending)
+                job = self._jobs.get(job_id)
+                fn = self._fns.pop(job_id, None)
+                if job is None or fn is None:
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+            self._run(job, fn)
+
+    def _run(self, job: RenderJob, fn: Callable[[], Any]) -> None:
+        def on_progress(block: Dict[str, str]) -> None:
+            apply_progress(job, block)
+
+        try:
+            with ffmpeg_progress(on_progress, job.cancel_event):
+                result = fn()
+        except RenderCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        else:
+            job.result = result
+            job.progress = 1.0
+            job.status = DONE
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self) -> None:
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at or 0)
+        for j in finished[: max(0, len(finished) - self.keep_finished)]:
+            self._jobs.pop(j.id, None)
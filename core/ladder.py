@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import json
+import mmap
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.audio_prep import prepare_audio
+from core.metrics import span
+from core.profiles import EncoderProfile, video_codec_args
+from core.render import build_filter_complex, mp4_movflags, run_ffmpeg, unique_icon_paths
+from core.storyboard import StoryEvent
+
+# highest first; the first rung is the one composited
+LADDER: Tuple[Tuple[int, int], ...] = ((1920, 1080), (1280, 720), (854, 480))
+
+# every rung's audio is the prepared AAC-LC track
+AUDIO_CODEC = "mp4a.40.2"
+
+
+def rung_name(resolution: Tuple[int, int]) -> str:
+    return f"{resolution[1]}p"
+
+
+def ladder_filter_complex(
+    events: List[StoryEvent],
+    duration_sec: float,
+    resolutions: Sequence[Tuple[int, int]],
+    fps: int,
+    icon_input_idx: Dict[str, int],
+) -> Tuple[str, List[str]]:
+    """
+    Composites once at the largest resolution, then split + scale per rung.
+    Returns (filter_complex, output labels in `resolutions` order).
+    """
+    top = max(resolutions, key=lambda r: r[0] * r[1])
+    graph, current = build_filter_complex(events, duration_sec, top, fps, icon_input_idx)
+    if len(resolutions) == 1:
+        return graph, [current]
+
+    split_labels = [f"[sp{i}]" for i in range(len(resolutions))]
+    parts = [graph.rstrip(";") + ";", f"{current}split={len(resolutions)}{''.join(split_labels)};"]
+    out_labels = []
+    for i, (w, h) in enumerate(resolutions):
+        if (w, h) == tuple(top):
+            out_labels.append(split_labels[i])
+            continue
+        parts.append(f"{split_labels[i]}scale={w}:{h}:flags=bicubic[r{i}];")
+        out_labels.append(f"[r{i}]")
+    return "".join(parts).rstrip(";"), out_labels
+
+
+def render_ladder(
+    audio_path: str,
+    events: List[StoryEvent],
+    output_dir: str,
+    duration_sec: int = 60,
+    resolutions: Sequence[Tuple[int, int]] = LADDER,
+    fps: int = 24,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+    hls: bool = False,
+    segment_sec: float = 4.0,
+    basename: str = "video",
+) -> Dict:
+    """
+    Every rung of the ladder from one ffmpeg process: the timeline graph is evaluated
+    once, video is encoded per rung, and the audio is a single prepared AAC track
+    stream-copied into each output. With hls=True each rung is an fMP4 HLS variant
+    (keyframes aligned across rungs) and a master playlist is written.
+    Returns the manifest (also written to <output_dir>/<basename>.json).
+    """
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    resolutions = [tuple(r) for r in resolutions]
+
+    if not audio_prepared:
+        with span("audio.prepare"):
+            audio_path = str(prepare_audio(Path(audio_path), duration_sec, profile))
+
+    icon_paths_unique = unique_icon_paths(events)
+    cmd = [
+        "ffmpeg", "-y",
+        "-hide_banner", "-loglevel", "error",
+        "-i", audio_path,
+    ]
+    for p in icon_paths_unique:
+        cmd += ["-loop", "1", "-i", str(p)]
+    icon_input_idx = {str(p): i + 1 for i, p in enumerate(icon_paths_unique)}
+
+    with span("render.filter_graph", events=len(events), rungs=len(resolutions)):
+        graph, labels = ladder_filter_complex(events, duration_sec, resolutions, fps, icon_input_idx)
+    cmd += ["-filter_complex", graph]
+
+    renditions = []
+    for res, label in zip(resolutions, labels):
+        name = rung_name(res)
+        cmd += [
+            "-map", label,
+            "-map", "0:a",
+            "-t", str(duration_sec),
+            "-r", str(fps),
+            *video_codec_args(profile, fps),
+            "-c:a", "copy",
+        ]
+        if hls:
+            rung_dir = out_dir / f"{basename}_{name}"
+            rung_dir.mkdir(parents=True, exist_ok=True)
+            path = rung_dir / "index.m3u8"
+            cmd += [
+                # same keyframe times on every rung so players can switch at segment edges
+                "-force_key_frames", f"expr:gte(t,n_forced*{segment_sec})",
+                "-f", "hls",
+                "-hls_time", str(segment_sec),
+                "-hls_playlist_type", "vod",
+                "-hls_segment_type", "fmp4",
+                "-hls_fmp4_init_filename", "init.mp4",
+                "-hls_segment_filename", str(rung_dir / "seg_%05d.m4s"),
+                str(path),
+            ]
+        else:
+            path = out_dir / f"{basename}_{name}.mp4"
+            cmd += [*mp4_movflags(False), str(path)]
+        renditions.append({"name": name, "resolution": list(res), "path": str(path)})
+
+    run_ffmpeg(cmd)
+
+    for r in renditions:
+        path = Path(r["path"])
+        files = [path] if not hls else [f for f in path.parent.iterdir() if f.suffix in (".m4s", ".mp4")]
+        r["bytes"] = sum(f.stat().st_size for f in files)
+        r["bandwidth"] = int(r["bytes"] * 8 / max(float(duration_sec), 1e-6))
+        r["peak_bandwidth"] = hls_peak_bandwidth(path) if hls else r["bandwidth"]
+        r["codecs"] = f"{avc_codec_string(path.parent / 'init.mp4' if hls else path)},{AUDIO_CODEC}"
+
+    manifest = {
+        "duration_sec": duration_sec,
+        "fps": fps,
+        "profile": profile.name if profile else None,
+        "renditions": renditions,
+        "hls": str(write_hls_master(out_dir / f"{basename}.m3u8", renditions)) if hls else None,
+    }
+    (out_dir / f"{basename}.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def hls_peak_bandwidth(playlist: Path) -> int:
+    """
+    Highest segment bit rate (bits/s) in a media playlist: size of each segment over
+    its #EXTINF duration.
+    """
+    peak = 0
+    duration = None
+    for line in playlist.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+        elif line and not line.startswith("#") and duration:
+            size = (playlist.parent / line).stat().st_size
+            peak = max(peak, int(size * 8 / duration))
+            duration = None
+    return peak
+
+
+def avc_codec_string(path: Path) -> str:
+    """
+    RFC 6381 "avc1.PPCCLL" from the first avcC box (profile, constraint flags, level).
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        i = m.find(b"avcC")
+        if i < 0:
+            raise ValueError(f"no H.264 configuration in {path}")
+        _, profile, constraints, level = m[i + 4:i + 8]
+    return f"avc1.{profile:02x}{constraints:02x}{level:02x}"
+
+
+def write_hls_master(path: Path, renditions: List[Dict]) -> Path:
+    # BANDWIDTH is the peak segment bit rate (RFC 8216 4.3.4.2), AVERAGE-BANDWIDTH the mean
+    lines = ["#EXTM3U", "#EXT-X-VERSION:7", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for r in renditions:
+        w, h = r["resolution"]
+        lines.append(
+            f"#EXT-X-STREAM-INF:BANDWIDTH={r['peak_bandwidth']},AVERAGE-BANDWIDTH={r['bandwidth']},"
+            f'CODECS="{r["codecs"]}",RESOLUTION={w}x{h}'
+        )
+        lines.append(Path(r["path"]).relative_to(path.parent).as_posix())
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from core.cache import RENDER_VERSION, RenderCache, events_fingerprint, sha256_file
+from core.metrics import span
+from core.profiles import EncoderProfile, video_codec_args
+from core.render import run_ffmpeg
+from core.segments import Segment, concat_segments, render_span, segment_key
+from core.storyboard import StoryEvent
+
+ROOT = Path(__file__).resolve().parents[1]
+LIBRARY_DIR = ROOT / "outputs" / "library"
+
+# branded clips added around every library render unless overridden per call
+INTRO_PATH = os.environ.get("RENDER_INTRO") or None
+OUTRO_PATH = os.environ.get("RENDER_OUTRO") or None
+
+# idle background is stored in power-of-two frame lengths up to 2**IDLE_MAX_POW
+# (1024 frames ≈ 43 s at 24 fps), so any gap is a handful of cached pieces
+IDLE_MAX_POW = 10
+
+BG_HEX = "#E6F5FF"
+
+
+def idle_piece_lengths(n_frames: int) -> List[int]:
+    """
+    Standard piece lengths (frames) that add up to n_frames, longest first.
+    """
+    top = 1 << IDLE_MAX_POW
+    pieces = [top] * (n_frames // top)
+    rem = n_frames % top
+    pieces += [1 << b for b in range(IDLE_MAX_POW - 1, -1, -1) if rem & (1 << b)]
+    return pieces
+
+
+@lru_cache(maxsize=64)
+def _count_frames(path: str, mtime_ns: int) -> int:
+    # decode to the null muxer; with stream copy ffmpeg does not report frame counts
+    p = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", path, "-map", "0:v:0",
+         "-f", "null", "-progress", "pipe:1", "-nostats", "-"],
+        capture_output=True, text=True,
+    )
+    frames = [line.split("=", 1)[1] for line in p.stdout.splitlines() if line.startswith("frame=")]
+    if p.returncode != 0 or not frames:
+        raise RuntimeError(f"FFMPEG FAILED\n\nReturn code: {p.returncode}\n\nSTDERR:\n{p.stderr}\n")
+    return int(frames[-1])
+
+
+def count_frames(path: Path) -> int:
+    return _count_frames(str(path), path.stat().st_mtime_ns)
+
+
+class SegmentLibrary:
+    """
+    Constant video pieces encoded once per (resolution, fps, profile) and reused by
+    concat stream copy: idle background in standard lengths, normalised intro/outro
+    clips, and event-bearing spans keyed by their content.
+    Every piece is video-only and starts on a keyframe with the profile's codec args.
+    """
+
+    def __init__(self, cache_dir: Path = LIBRARY_DIR, max_bytes: int = 1024 ** 3):
+        self.cache = RenderCache(cache_dir, max_bytes=max_bytes)
+
+    def idle(self, n_frames: int, resolution: Tuple[int, int], fps: int, profile: Optional[EncoderProfile] = None) -> List[Path]:
+        out = []
+        for n in idle_piece_lengths(n_frames):
+            key = segment_key(Segment(0, n, None), resolution, fps, profile)
+            path, _ = self.cache.get_or_render(
+                key, lambda tmp, n=n: render_span([], 0, n, resolution, fps, str(tmp), profile)
+            )
+            out.append(path)
+        return out
+
+    def warm(self, resolutions: Sequence[Tuple[int, int]], fps: int, profile: Optional[EncoderProfile] = None) -> None:
+        """
+        Pre-encodes every standard idle length (e.g. at deploy time).
+        """
+        for res in resolutions:
+            for b in range(IDLE_MAX_POW + 1):
+                self.idle(1 << b, tuple(res), fps, profile)
+
+    def clip(self, source: str, resolution: Tuple[int, int], fps: int, profile: Optional[EncoderProfile] = None) -> Tuple[Path, int]:
+        """
+        Intro/outro normalised to the render's size, fps and codec args (letterboxed on
+        the background colour). Returns (path, n_frames).
+        """
+        w, h = resolution
+        payload = {
+            "v": RENDER_VERSION,
+            "clip": sha256_file(Path(source)),
+            "res": list(resolution),
+            "fps": fps,
+            "codec": video_codec_args(profile, fps),
+        }
+        key = "clip_" + hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+        def encode(tmp: Path) -> None:
+            run_ffmpeg([
+                "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                "-i", str(source),
+                "-vf", (
+                    f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+                    f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:color={BG_HEX},setsar=1,fps={fps},format=yuv420p"
+                ),
+                "-force_key_frames", "expr:eq(n,0)",
+                *video_codec_args(profile, fps),
+                "-an",
+                "-f", "mp4",
+                str(tmp),
+            ])
+
+        path, _ = self.cache.get_or_render(key, encode)
+        return path, count_frames(path)
+
+    def event_span(
+        self,
+        events: List[StoryEvent],
+        start_frame: int,
+        n_frames: int,
+        resolution: Tuple[int, int],
+        fps: int,
+        profile: Optional[EncoderProfile] = None,
+    ) -> Path:
+        payload = {
+            "v": RENDER_VERSION,
+            "start": start_frame,
+            "n": n_frames,
+            "res": list(resolution),
+            "fps": fps,
+            "codec": video_codec_args(profile, fps),
+            "events": events_fingerprint(events),
+        }
+        key = "span_" + hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        path, _ = self.cache.get_or_render(
+            key, lambda tmp: render_span(events, start_frame, n_frames, resolution, fps, str(tmp), profile)
+        )
+        return path
+
+
+def event_frame_range(events: List[StoryEvent], duration_sec: float, fps: int) -> Tuple[int, int]:
+    """
+    [first, last) frame that shows any event; (0, 0) when nothing is visible.
+    """
+    total = int(round(float(duration_sec) * fps))
+    starts = [max(0, int(round(float(e.t_start) * fps))) for e in events]
+    ends = [min(total, int(round(float(e.t_end) * fps))) for e in events]
+    spans = [(a, b) for a, b in zip(starts, ends) if b > a]
+    if not spans:
+        return 0, 0
+    return min(a for a, _ in spans), max(b for _, b in spans)
+
+
+def render_video_library(
+    audio_path: str,
+    events: List[StoryEvent],
+    output_path: str,
+    duration_sec: int = 60,
+    resolution: Tuple[int, int] = (854, 480),
+    fps: int = 24,
+    fragmented: bool = False,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+    intro_path: Optional[str] = INTRO_PATH,
+    outro_path: Optional[str] = OUTRO_PATH,
+    cache_dir: Path = LIBRARY_DIR,
+    cache_max_bytes: int = 1024 ** 3,
+) -> str:
+    """
+    Encodes only the event-bearing span of the timeline; leading/trailing background
+    and the optional intro/outro come from the segment library, and everything is
+    joined by concat stream copy. The song audio starts after the intro.
+    """
+    out = Path(output_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    lib = SegmentLibrary(cache_dir, max_bytes=cache_max_bytes)
+    total = int(round(float(duration_sec) * fps))
+
+    with span("render.library", events=len(events)):
+        while True:
+            pieces: List[Path] = []
+            intro_frames = outro_frames = 0
+            if intro_path:
+                clip, intro_frames = lib.clip(intro_path, resolution, fps, profile)
+                pieces.append(clip)
+
+            a, b = event_frame_range(events, duration_sec, fps)
+            if b > a:
+                pieces += lib.idle(a, resolution, fps, profile)
+                pieces.append(lib.event_span(events, a, b - a, resolution, fps, profile))
+                pieces += lib.idle(total - b, resolution, fps, profile)
+            else:
+                pieces += lib.idle(total, resolution, fps, profile)
+
+            if outro_path:
+                clip, outro_frames = lib.clip(outro_path, resolution, fps, profile)
+                pieces.append(clip)
+
+            # mark every piece in use before the concat; if another render evicted one
+            # since it was resolved, resolve (and re-encode) again
+            if not lib.cache.touch(pieces):
+                break
+
+    concat_segments(
+        pieces, out, audio_path, (intro_frames + total + outro_frames) / float(fps), lib.cache.cache_dir,
+        fragmented=fragmented, profile=profile, audio_prepared=audio_prepared,
+        audio_offset_sec=intro_frames / float(fps),
+        audio_duration_sec=float(duration_sec) if outro_frames else None,
+    )
+    lib.cache.evict(keep=pieces)
+    return str(out)
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+METRICS_DIR = ROOT / "outputs" / "metrics"
+
+TRACE_LOG = Path(os.environ.get("RENDER_TRACE_LOG", METRICS_DIR / "traces.jsonl"))
+METRICS_FILE = Path(os.environ.get("RENDER_METRICS_FILE", METRICS_DIR / "render.prom"))
+PROFILE_DIR = METRICS_DIR / "profiles"
+
+# seconds; covers sub-ms parsing up to long-form encodes
+DEFAULT_BUCKETS = (0.001, 0.005, 0.025, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """
+    Minimal thread-safe counters/gauges/histograms with Prometheus text exposition.
+    write_textfile() suits node_exporter's textfile collector.
+    """
+
+    def __init__(self, prefix: str = "abc_render"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._hist: Dict[Tuple[str, Labels], List[float]] = {}  # bucket counts..., sum, count
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def _declare(self, name: str, kind: str, help_text: str) -> str:
+        full = f"{self.prefix}_{name}"
+        self._help.setdefault(full, (kind, help_text))
+        return full
+
+    def inc(self, name: str, value: float = 1.0, help_text: str = "", **labels) -> None:
+        with self._lock:
+            key = (self._declare(name, "counter", help_text), _labels(labels))
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_max(self, name: str, value: float, help_text: str = "", **labels) -> None:
+        with self._lock:
+            key = (self._declare(name, "gauge", help_text), _labels(labels))
+            self._gauges[key] = max(self._gauges.get(key, value), value)
+
+    def observe(self, name: str, value: float, help_text: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels) -> None:
+        with self._lock:
+            full = self._declare(name, "histogram", help_text)
+            b = self._buckets.setdefault(full, tuple(buckets))
+            key = (full, _labels(labels))
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = [0.0] * (len(b) + 2)
+            h[bisect_left(b, value)] += 1  # non-cumulative; cumulated on export
+            h[-2] += value
+            h[-1] += 1
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for full, (kind, help_text) in sorted(self._help.items()):
+                if help_text:
+                    lines.append(f"# HELP {full} {help_text}")
+                lines.append(f"# TYPE {full} {kind}")
+                if kind == "counter":
+                    for (n, lb), v in sorted(self._counters.items()):
+                        if n == full:
+                            lines.append(f"{full}{_fmt_labels(lb)} {v:g}")
+                elif kind == "gauge":
+                    for (n, lb), v in sorted(self._gauges.items()):
+                        if n == full:
+                            lines.append(f"{full}{_fmt_labels(lb)} {v:g}")
+                else:
+                    b = self._buckets[full]
+                    for (n, lb), h in sorted(self._hist.items()):
+                        if n != full:
+                            continue
+                        cum = 0.0
+                        for le, c in zip(b, h):
+                            cum += c
+                            lines.append(f"{full}_bucket{_fmt_labels(lb, ('le', f'{le:g}'))} {cum:g}")
+                        lines.append(f"{full}_bucket{_fmt_labels(lb, ('le', '+Inf'))} {h[-1]:g}")
+                        lines.append(f"{full}_sum{_fmt_labels(lb)} {h[-2]:g}")
+                        lines.append(f"{full}_count{_fmt_labels(lb)} {h[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path = METRICS_FILE) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(self.to_prometheus(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+METRICS = MetricsRegistry()
+
+
+class Trace:
+    """
+    Timing spans for one render job. Activate it in the thread doing the work;
+    span() calls anywhere below (storyboard, render, ffmpeg) attach to it.
+    """
+
+    def __init__(self, name: str, **attrs):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attrs = attrs
+        self.t0 = time.time()
+        self._m0 = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.ffmpeg: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self) -> Iterator["Trace"]:
+        token = _CURRENT.set(self)
+        try:
+            yield self
+        finally:
+            _CURRENT.reset(token)
+
+    def add_span(self, name: str, start: float, duration: float, **attrs) -> None:
+        with self._lock:
+            self.spans.append({"name": name, "start": round(start - self._m0, 6), "sec": round(duration, 6), **attrs})
+        METRICS.observe("stage_seconds", duration, "Wall time per pipeline stage.", stage=name)
+
+    def add_ffmpeg(self, stats: Dict) -> None:
+        with self._lock:
+            self.ffmpeg.append(stats)
+
+    def finish(self, status: str, log_path: Path = TRACE_LOG) -> Dict:
+        total = time.perf_counter() - self._m0
+        METRICS.inc("traces_total", 1, "Traced requests/jobs by final status.", trace=self.name, status=status)
+        METRICS.observe("trace_seconds", total, "End-to-end wall time per trace.", trace=self.name)
+        record = {
+            "trace_id": self.id,
+            "name": self.name,
+            "ts": self.t0,
+            "status": status,
+            "total_sec": round(total, 6),
+            "attrs": self.attrs,
+            "spans": self.spans,
+            "ffmpeg": self.ffmpeg,
+        }
+        try:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+            METRICS.write_textfile()
+        except OSError:
+            pass
+        return record
+
+
+_CURRENT: ContextVar[Optional[Trace]] = ContextVar("render_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[None]:
+    """
+    Times a block into the active trace (if any) and the stage histogram.
+    """
+    trace = _CURRENT.get()
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add_span(name, t, time.perf_counter() - t, **attrs)
+
+
+def record_ffmpeg_run(stats: Dict) -> None:
+    """
+    stats: wall_sec, first_progress_sec, speed, fps, frames, utime, stime, maxrss_bytes, returncode.
+    """
+    METRICS.inc("ffmpeg_runs_total", 1, "ffmpeg invocations.", ok=str(stats.get("returncode") == 0).lower())
+    if stats.get("wall_sec") is not None:
+        METRICS.observe("ffmpeg_seconds", stats["wall_sec"], "ffmpeg wall time per run.")
+    if stats.get("first_progress_sec") is not None:
+        METRICS.observe("ffmpeg_startup_seconds", stats["first_progress_sec"], "Time until ffmpeg reports progress (startup + graph init).")
+    if stats.get("speed") is not None:
+        METRICS.observe("ffmpeg_speed", stats["speed"], "Encode speed (x realtime).", buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64))
+    cpu = (stats.get("utime") or 0.0) + (stats.get("stime") or 0.0)
+    METRICS.inc("ffmpeg_cpu_seconds_total", cpu, "CPU seconds used by ffmpeg.")
+    if stats.get("maxrss_bytes"):
+        METRICS.set_max("ffmpeg_maxrss_bytes", stats["maxrss_bytes"], "Peak RSS of any ffmpeg run.")
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.add_ffmpeg(stats)
+
+
+@contextmanager
+def maybe_profile(name: str) -> Iterator[None]:
+    """
+    cProfile the block when RENDER_PROFILE=1; writes outputs/metrics/profiles/<name>_<id>.prof.
+    """
+    if os.environ.get("RENDER_PROFILE") != "1":
+        yield
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        prof.dump_stats(str(PROFILE_DIR / f"{name}_{uuid.uuid4().hex[:8]}.prof"))
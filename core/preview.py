@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from core.cache import RENDER_VERSION, RenderCache, events_fingerprint
+from core.render import resolve_icon
+from core.sprites import ensure_card_sprite, load_font
+from core.storyboard import StoryEvent
+
+ROOT = Path(__file__).resolve().parents[1]
+PREVIEW_DIR = ROOT / "outputs" / "previews"
+# disk quota for cached thumbnails + sheets (LRU-evicted beyond this)
+PREVIEW_MAX_BYTES = 128 * 1024 ** 2
+
+SHEET_BG = (255, 255, 255)
+LABEL_RGB = (20, 20, 20)
+WARN_RGB = (200, 30, 30)
+
+
+def format_ts(t: float) -> str:
+    # same MM:SS.xx style as prompts/abc_song.txt
+    m, s = divmod(max(0.0, float(t)), 60)
+    return f"{int(m):02d}:{s:05.2f}"
+
+
+def thumb_resolution(resolution: Tuple[int, int], thumb_width: int) -> Tuple[int, int]:
+    w, h = resolution
+    tw = min(thumb_width, w)
+    return tw, max(1, int(round(h * tw / float(w))))
+
+
+def render_contact_sheet(
+    events: List[StoryEvent],
+    resolution: Tuple[int, int] = (854, 480),
+    thumb_width: int = 214,
+    columns: int = 4,
+    cache_dir: Path = PREVIEW_DIR,
+    output_path: Optional[Path] = None,
+) -> Path:
+    """
+    Tiles per-event stills into one PNG with "start–end  letter word (icon)" labels
+    (missing icons are flagged in red).
+    Stills are drawn at thumbnail size with the same proportional layout as the
+    video, so the sheet needs no video encode and no full-size rasterizing.
+    """
+    cache = RenderCache(cache_dir, max_bytes=PREVIEW_MAX_BYTES)
+    tres = thumb_resolution(resolution, thumb_width)
+
+    payload = {"v": RENDER_VERSION, "events": events_fingerprint(events), "res": list(tres), "cols": columns}
+    key = "sheet_" + hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+    hit = cache.get(key, ".png")
+    if hit is not None and output_path is None:
+        return hit
+
+    stills = [ensure_card_sprite(e, tres, cache) for e in events]
+
+    tw, th = tres
+    font = load_font(max(10, th // 10))
+    pad = max(4, tw // 30)
+    label_h = int(font.size * 2.6) if hasattr(font, "size") else 28
+    cols = max(1, min(columns, len(events) or 1))
+    rows = max(1, -(-len(events) // cols))
+    sheet = Image.new("RGB", (pad + cols * (tw + pad), pad + rows * (th + label_h + pad)), SHEET_BG)
+    d = ImageDraw.Draw(sheet)
+
+    for i, (e, p) in enumerate(zip(events, stills)):
+        x = pad + (i % cols) * (tw + pad)
+        y = pad + (i // cols) * (th + label_h + pad)
+        with Image.open(p) as im:
+            sheet.paste(im, (x, y))
+        d.text((x, y + th + 2), f"{format_ts(e.t_start)}–{format_ts(e.t_end)}", font=font, fill=LABEL_RGB)
+        missing = bool(e.icon) and resolve_icon(e.icon) is None
+        detail = f"{e.letter} {e.word}".strip() + (f" ({e.icon}{' missing' if missing else ''})" if e.icon else "")
+        d.text((x, y + th + 2 + label_h // 2), detail, font=font, fill=WARN_RGB if missing else LABEL_RGB)
+
+    out = Path(output_path) if output_path else cache.path_for(key, ".png")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(f".{out.stem}.{uuid.uuid4().hex}.tmp.png")
+    sheet.save(tmp, "PNG", compress_level=1)
+    os.replace(tmp, out)
+    cache.evict(keep=[out, *stills])
+    return out
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """
+    Named encode settings. resolution/fps are what the caller should render at;
+    video_args() are the libx264 output options every backend appends.
+    """
+
+    name: str
+    resolution: Tuple[int, int]
+    fps: int
+    preset: str = "medium"
+    crf: int = 23
+    tune: Optional[str] = None
+    gop_sec: Optional[float] = None  # keyframe interval; None = x264 default
+    audio_bitrate: str = "128k"
+
+    def video_args(self, fps: Optional[int] = None) -> List[str]:
+        args = ["-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf)]
+        if self.tune:
+            args += ["-tune", self.tune]
+        if self.gop_sec:
+            args += ["-g", str(max(1, int(round(self.gop_sec * (fps or self.fps)))))]
+        return args + ["-pix_fmt", "yuv420p"]
+
+    def audio_args(self) -> List[str]:
+        return ["-c:a", "aac", "-b:a", self.audio_bitrate]
+
+    def cache_params(self) -> Dict:
+        return {"profile": self.name, "video": self.video_args(), "audio": self.audio_args()}
+
+
+PROFILES: Dict[str, EncoderProfile] = {
+    # quick timing check: small, low fps, fastest preset
+    "preview": EncoderProfile(
+        name="preview",
+        resolution=(426, 240),
+        fps=12,
+        preset="ultrafast",
+        crf=32,
+        audio_bitrate="64k",
+    ),
+    # delivery: cards are static for seconds, so stillimage tuning + long GOP
+    "final": EncoderProfile(
+        name="final",
+        resolution=(854, 480),
+        fps=24,
+        preset="medium",
+        crf=20,
+        tune="stillimage",
+        gop_sec=4.0,
+    ),
+}
+
+
+def get_profile(name: str) -> EncoderProfile:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown encoder profile: {name!r} (choose from {', '.join(PROFILES)})") from None
+
+
+def video_codec_args(profile: Optional[EncoderProfile] = None, fps: Optional[int] = None) -> List[str]:
+    if profile is None:
+        return ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+    return profile.video_args(fps)
+
+
+def audio_codec_args(profile: Optional[EncoderProfile] = None, prepared: bool = False) -> List[str]:
+    if prepared:
+        # already encoded by core.audio_prep.prepare_audio
+        return ["-c:a", "copy"]
+    if profile is None:
+        return ["-c:a", "aac"]
+    return profile.audio_args()
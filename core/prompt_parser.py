@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import List, Dict, Optional
+from pathlib import Path
+from typing import Iterable, Iterator, List, Dict, NamedTuple, Optional, Union
 import re
 
 
@@ -36,6 +37,43 @@ def ts_to_seconds(ts: str) -> float:
 _TS_PREFIX = re.compile(r"^\s*(\d{1,2}:\d{2}(?::\d{2})?(?:\.\d+)?)\s*\|\s*(.*)$")
 
 
+class PromptRecord(NamedTuple):
+    t: Optional[float]
+    letter: str
+    word: str
+    icon: str
+
+
+def iter_prompt_records(lines: Iterable[str]) -> Iterator[PromptRecord]:
+    """
+    Streaming version of parse_prompt_lines: consumes any line iterator (e.g. an open
+    file) and yields compact records without building the whole list.
+    """
+    match = _TS_PREFIX.match
+    for raw in lines:
+        line = (raw or "").strip()
+        if not line:
+            continue
+
+        t: Optional[float] = None
+
+        # cheap pre-check: only lines starting with a digit can carry a timestamp
+        m = match(line) if line[0].isdigit() else None
+        if m:
+            t = ts_to_seconds(m.group(1))
+            parts = m.group(2).split("|", 2)
+        else:
+            parts = line.split("|", 2)
+
+        n = len(parts)
+        yield PromptRecord(
+            t,
+            parts[0].strip(),
+            parts[1].strip() if n > 1 else "",
+            parts[2].split("|", 1)[0].strip() if n > 2 else "",
+        )
+
+
 def parse_prompt_lines(lines: List[str]) -> List[Dict]:
     """
     Supported line formats:
@@ -50,28 +88,90 @@ def parse_prompt_lines(lines: List[str]) -> List[Dict]:
     Returns list of units:
       {"t": float_seconds_or_None, "letter": str, "word": str, "icon": str}
     """
-    out: List[Dict] = []
+    return [r._asdict() for r in iter_prompt_records(lines)]
+
+
+_NUMBERED = re.compile(r"^\s*(\d+)[.)]?\s+(.+?)\s*$")
+
 
+def parse_numbered_lines(lines: Iterable[str]) -> List[Dict]:
+    """
+    Counting songs:
+       1 Apple
+       2 Balls
+
+    Returns the same unit dicts as parse_prompt_lines (no timestamps, no icon).
+    """
+    out: List[Dict] = []
     for raw in lines:
         line = (raw or "").strip()
         if not line:
             continue
-
-        t: Optional[float] = None
-
-        m = _TS_PREFIX.match(line)
+        m = _NUMBERED.match(line)
         if m:
-            ts = m.group(1)
-            rest = m.group(2)
-            t = ts_to_seconds(ts)
-            parts = [p.strip() for p in rest.split("|")]
+            number, word = m.group(1), m.group(2)
         else:
-            parts = [p.strip() for p in line.split("|")]
+            number, word = "", line
+        out.append({"t": None, "letter": number, "word": word, "icon": ""})
+    return out
 
-        letter = parts[0] if len(parts) > 0 else ""
-        word = parts[1] if len(parts) > 1 else ""
-        icon = parts[2] if len(parts) > 2 else ""
 
-        out.append({"t": t, "letter": letter, "word": word, "icon": icon})
+def parse_word_lines(lines: Iterable[str]) -> List[Dict]:
+    """
+    One word per line (e.g. colours):
+       RED
+       BLUE
 
+    The initial becomes the big letter, the word is shown title-cased. No icon: these
+    formats have nowhere to name one, and the ABC pictures don't fit colours or numbers.
+    """
+    out: List[Dict] = []
+    for raw in lines:
+        line = (raw or "").strip()
+        if not line:
+            continue
+        out.append({"t": None, "letter": line[:1].upper(), "word": line.title(), "icon": ""})
     return out
+
+
+def detect_prompt_format(lines: Iterable[str]) -> str:
+    """
+    "pipe" (abc_song.txt style), "numbered" or "words". Consumes lines one at a time.
+    """
+    n = numbered = 0
+    for raw in lines:
+        line = (raw or "").strip()
+        if not line:
+            continue
+        if "|" in line:
+            return "pipe"
+        n += 1
+        if _NUMBERED.match(line):
+            numbered += 1
+    if not n:
+        return "pipe"
+    return "numbered" if numbered >= max(1, n // 2) else "words"
+
+
+PARSERS = {
+    "pipe": parse_prompt_lines,
+    "numbered": parse_numbered_lines,
+    "words": parse_word_lines,
+}
+
+
+def parse_any_prompt_lines(lines: List[str]) -> List[Dict]:
+    return PARSERS[detect_prompt_format(lines)](lines)
+
+
+def parse_prompt_file(path: Path) -> List[Union[Dict, PromptRecord]]:
+    """
+    parse_any_prompt_lines over a file without reading it into memory: one pass to
+    detect the format, one to parse. Pipe files come back as PromptRecords.
+    """
+    with open(path, encoding="utf-8") as f:
+        fmt = detect_prompt_format(f)
+        f.seek(0)
+        if fmt == "pipe":
+            return list(iter_prompt_records(f))
+        return PARSERS[fmt](f)
@@ -1,9 +1,19 @@
 from __future__ import annotations
 
+import os
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
+from core.metrics import current_trace, record_ffmpeg_run, span
+from core.profiles import EncoderProfile, audio_codec_args, video_codec_args
 from core.storyboard import StoryEvent
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -22,65 +32,77 @@ def _escape_text(s: str) -> str:
     )
 
 
-def render_video_ffmpeg_drawtext(
-    audio_path: str,
-    events: List[StoryEvent],
-    output_path: str,
-    duration_sec: int = 60,
-    resolution: Tuple[int, int] = (854, 480),
-    fps: int = 24,
-) -> str:
-    out = Path(output_path)
-    out.parent.mkdir(parents=True, exist_ok=True)
+@dataclass(frozen=True)
+class CardLayout:
+    card_x: int
+    card_y: int
+    card_w: int
+    card_h: int
+    big_fs: int
+    word_fs: int
+    big_y: int
+    word_y: int
+    icon_h: int
+    icon_y: int
 
-    w, h = resolution
 
+def card_layout(resolution: Tuple[int, int]) -> CardLayout:
+    """
+    Pixel layout of the card for a given resolution. Every backend draws from this.
+    """
+    w, h = resolution
     # ---- pixel constants (NO expressions like w*0.12 on Streamlit Cloud) ----
-    card_x = int(w * 0.12)
-    card_y = int(h * 0.14)
-    card_w = int(w * 0.76)
-    card_h = int(h * 0.72)
+    return CardLayout(
+        card_x=int(w * 0.12),
+        card_y=int(h * 0.14),
+        card_w=int(w * 0.76),
+        card_h=int(h * 0.72),
+        big_fs=int(h * 0.22),
+        word_fs=int(h * 0.10),
+        big_y=int(h * 0.22),
+        word_y=int(h * 0.50),
+        icon_h=int(h * 0.20),
+        icon_y=int(h * 0.62),
+    )
 
-    big_fs = int(h * 0.22)
-    word_fs = int(h * 0.10)
 
-    big_y = int(h * 0.22)
-    word_y = int(h * 0.50)
+def resolve_icon(icon: Optional[str]) -> Optional[Path]:
+    if not icon:
+        return None
+    p = (ICONS_DIR / icon).resolve()
+    return p if p.exists() else None
 
-    icon_h = int(h * 0.20)
-    icon_y = int(h * 0.62)
-
-    # Collect icons used
-    icon_paths: List[Path] = []
-    for e in events:
-        if e.icon:
-            p = (ICONS_DIR / e.icon).resolve()
-            if p.exists():
-                icon_paths.append(p)
 
+def unique_icon_paths(events: List[StoryEvent]) -> List[Path]:
     # unique preserve order
     seen = set()
-    icon_paths_unique: List[Path] = []
-    for p in icon_paths:
-        if str(p) not in seen:
+    out: List[Path] = []
+    for e in events:
+        p = resolve_icon(e.icon)
+        if p is not None and str(p) not in seen:
             seen.add(str(p))
-            icon_paths_unique.append(p)
+            out.append(p)
+    return out
 
-    # ffmpeg inputs (audio + icons as looped images)
-    cmd = [
-        "ffmpeg", "-y",
-        "-hide_banner", "-loglevel", "error",
-        "-stream_loop", "-1", "-i", audio_path,
-    ]
-    for p in icon_paths_unique:
-        cmd += ["-loop", "1", "-i", str(p)]
+
+def build_filter_complex(
+    events: List[StoryEvent],
+    duration_sec: float,
+    resolution: Tuple[int, int],
+    fps: int,
+    icon_input_idx: Dict[str, int],
+) -> Tuple[str, str]:
+    """
+    Builds the drawtext/overlay graph. Returns (filter_complex, output_label).
+    icon_input_idx maps resolved icon path -> ffmpeg input index.
+    """
+    w, h = resolution
+    lay = card_layout(resolution)
 
     # background
     filter_parts = [f"color=c=#E6F5FF:s={w}x{h}:r={fps}:d={duration_sec}[bg];"]
     current = "[bg]"
 
-    icon_input_idx = {str(p): i + 1 for i, p in enumerate(icon_paths_unique)}  # audio=0, icons start=1
-
     for i, e in enumerate(events):
         start = max(0.0, float(e.t_start))
         end = min(float(duration_sec), float(e.t_end))
@@ -96,42 +118,207 @@ def render_video_ffmpeg_drawtext(
         # Base card + texts
         chain = (
             f"{current}"
-            f"drawbox=x={card_x}:y={card_y}:w={card_w}:h={card_h}:color=black@0.30:t=fill:enable='{enable}',"
-            f"drawtext=fontfile='{FONT_LINUX}':fontsize={big_fs}:fontcolor=white:x=(w-text_w)/2:y={big_y}:text='{letter}':enable='{enable}',"
+            f"drawbox=x={lay.card_x}:y={lay.card_y}:w={lay.card_w}:h={lay.card_h}:color=black@0.30:t=fill:enable='{enable}',"
+            f"drawtext=fontfile='{FONT_LINUX}':fontsize={lay.big_fs}:fontcolor=white:x=(w-text_w)/2:y={lay.big_y}:text='{letter}':enable='{enable}',"
         )
 
         if word:
             chain += (
-                f"drawtext=fontfile='{FONT_LINUX}':fontsize={word_fs}:fontcolor=white:x=(w-text_w)/2:y={word_y}:text='{word}':enable='{enable}',"
+                f"drawtext=fontfile='{FONT_LINUX}':fontsize={lay.word_fs}:fontcolor=white:x=(w-text_w)/2:y={lay.word_y}:text='{word}':enable='{enable}',"
             )
 
         # Optional icon overlay
-        if e.icon:
-            p_icon = (ICONS_DIR / e.icon).resolve()
-            if p_icon.exists():
-                idx = icon_input_idx.get(str(p_icon))
-                if idx is not None:
-                    chain = chain.rstrip(",") + f"{next_label};"
-                    filter_parts.append(chain)
-
-                    ic_label = f"[ic{i}]"
-                    filter_parts.append(f"[{idx}:v]scale=-1:{icon_h}{ic_label};")
-
-                    out_label = f"[v{i}_o]"
-                    filter_parts.append(
-                        f"{next_label}{ic_label}"
-                        f"overlay=x=(w-overlay_w)/2:y=(h-overlay_h)/2:enable='{enable}'"
-                        f"{out_label};"
-                    )
-                    current = out_label
-                    continue
+        p_icon = resolve_icon(e.icon)
+        if p_icon is not None:
+            idx = icon_input_idx.get(str(p_icon))
+            if idx is not None:
+                chain = chain.rstrip(",") + f"{next_label};"
+                filter_parts.append(chain)
+
+                ic_label = f"[ic{i}]"
+                filter_parts.append(f"[{idx}:v]scale=-1:{lay.icon_h}{ic_label};")
+
+                out_label = f"[v{i}_o]"
+                filter_parts.append(
+                    f"{next_label}{ic_label}"
+                    f"overlay=x=(w-overlay_w)/2:y=(h-overlay_h)/2:enable='{enable}'"
+                    f"{out_label};"
+                )
+                current = out_label
+                continue
 
         # no icon case: just close
         chain = chain.rstrip(",") + f"{next_label};"
         filter_parts.append(chain)
         current = next_label
 
-    filter_complex = "".join(filter_parts).rstrip(";")
+    return "".join(filter_parts).rstrip(";"), current
+
+
+def mp4_movflags(fragmented: bool = False) -> List[str]:
+    """
+    faststart puts the index up front for progressive playback; fragmented MP4 can be
+    played while it is still being written/downloaded.
+    """
+    if fragmented:
+        return ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+    return ["-movflags", "+faststart"]
+
+
+def audio_input_args(audio_path: str, prepared: bool = False) -> List[str]:
+    # prepared tracks are already looped/trimmed to the target duration
+    if prepared:
+        return ["-i", audio_path]
+    return ["-stream_loop", "-1", "-i", audio_path]
+
+
+class RenderCancelled(RuntimeError):
+    pass
+
+
+# (fields) -> None, called with each `-progress` block (out_time_us, fps, speed, frame, progress, ...)
+ProgressCallback = Callable[[Dict[str, str]], None]
+
+_FFMPEG_HOOKS: ContextVar[Optional[Tuple[Optional[ProgressCallback], Optional[threading.Event]]]] = ContextVar(
+    "ffmpeg_hooks", default=None
+)
+
+
+@contextmanager
+def ffmpeg_progress(callback: Optional[ProgressCallback] = None, cancel: Optional[threading.Event] = None):
+    """
+    Every run_ffmpeg call inside this block reports `-progress` blocks to `callback`
+    and is killed (RenderCancelled) once `cancel` is set. Backends don't need to know.
+    """
+    token = _FFMPEG_HOOKS.set((callback, cancel))
+    try:
+        yield
+    finally:
+        _FFMPEG_HOOKS.reset(token)
+
+
+def current_ffmpeg_hooks() -> Tuple[Optional[ProgressCallback], Optional[threading.Event]]:
+    return _FFMPEG_HOOKS.get() or (None, None)
+
+
+def run_ffmpeg(cmd: List[str]) -> None:
+    callback, cancel = current_ffmpeg_hooks()
+    traced = current_trace() is not None
+    if callback is None and cancel is None and not traced:
+        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if p.returncode != 0:
+            raise RuntimeError(f"FFMPEG FAILED\n\nReturn code: {p.returncode}\n\nSTDERR:\n{p.stderr}\n")
+        return
+
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    with span("ffmpeg"), tempfile.TemporaryFile() as err:
+        t0 = time.perf_counter()
+        first_progress = None
+        last: Dict[str, str] = {}
+        done = threading.Event()
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err, text=True)
+        if cancel is not None:
+            # stdout can stay quiet for a while; kill from a watcher so cancel is prompt
+            threading.Thread(target=_kill_on_cancel, args=(p, cancel, done), daemon=True).start()
+        block: Dict[str, str] = {}
+        for line in p.stdout:
+            k, _, v = line.strip().partition("=")
+            if not k:
+                continue
+            block[k] = v.strip()
+            if k == "progress":
+                if first_progress is None:
+                    first_progress = time.perf_counter() - t0
+                if callback is not None:
+                    callback(block)
+                last, block = block, {}
+        rc, usage = wait_with_rusage(p)
+        done.set()
+        record_ffmpeg_run(ffmpeg_run_stats(last, time.perf_counter() - t0, first_progress, rc, usage))
+        if cancel is not None and cancel.is_set():
+            raise RenderCancelled("Render cancelled")
+        if rc != 0:
+            err.seek(0)
+            stderr = err.read().decode("utf-8", "replace")
+            raise RuntimeError(f"FFMPEG FAILED\n\nReturn code: {rc}\n\nSTDERR:\n{stderr}\n")
+
+
+def wait_with_rusage(p: subprocess.Popen):
+    """
+    Reaps ffmpeg with wait4 so its own utime/stime/maxrss come back with the exit status
+    (what `-benchmark` prints, without raising the log level to parse it).
+    """
+    try:
+        _, status, usage = os.wait4(p.pid, 0)
+    except ChildProcessError:  # already reaped (e.g. by kill() on cancel)
+        return p.wait(), None
+    p.returncode = os.waitstatus_to_exitcode(status)
+    return p.returncode, usage
+
+
+def ffmpeg_run_stats(block: Dict[str, str], wall_sec: float, first_progress_sec: Optional[float], rc: int, usage=None) -> Dict:
+    def num(key: str) -> Optional[float]:
+        v = (block.get(key) or "").rstrip("x")
+        try:
+            return float(v)
+        except ValueError:
+            return None
+
+    stats = {
+        "wall_sec": round(wall_sec, 4),
+        "first_progress_sec": round(first_progress_sec, 4) if first_progress_sec is not None else None,
+        "frames": num("frame"),
+        "fps": num("fps"),
+        "speed": num("speed"),
+        "returncode": rc,
+    }
+    if usage is not None:
+        stats["utime"] = round(usage.ru_utime, 4)
+        stats["stime"] = round(usage.ru_stime, 4)
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        stats["maxrss_bytes"] = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return stats
+
+
+def _kill_on_cancel(p: subprocess.Popen, cancel: threading.Event, done: threading.Event) -> None:
+    # not p.poll(): that could reap ffmpeg before wait_with_rusage gets its rusage
+    while not done.is_set():
+        if cancel.wait(0.25):
+            if not done.is_set():
+                p.kill()
+            return
+
+
+def drawtext_command(
+    audio_path: str,
+    events: List[StoryEvent],
+    output_path: str,
+    duration_sec: int = 60,
+    resolution: Tuple[int, int] = (854, 480),
+    fps: int = 24,
+    fragmented: bool = False,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+) -> List[str]:
+    """
+    The single ffmpeg command the drawtext backend runs (callers that manage their own
+    processes, e.g. service.py, launch it themselves).
+    """
+    out = Path(output_path)
+    icon_paths_unique = unique_icon_paths(events)
+
+    # ffmpeg inputs (audio + icons as looped images)
+    cmd = [
+        "ffmpeg", "-y",
+        "-hide_banner", "-loglevel", "error",
+        *audio_input_args(audio_path, audio_prepared),
+    ]
+    for p in icon_paths_unique:
+        cmd += ["-loop", "1", "-i", str(p)]
+
+    icon_input_idx = {str(p): i + 1 for i, p in enumerate(icon_paths_unique)}  # audio=0, icons start=1
+    with span("render.filter_graph", events=len(events)):
+        filter_complex, current = build_filter_complex(events, duration_sec, resolution, fps, icon_input_idx)
 
     cmd += [
         "-filter_complex", filter_complex,
@@ -139,15 +326,29 @@ def render_video_ffmpeg_drawtext(
         "-map", "0:a",
         "-t", str(duration_sec),
         "-r", str(fps),
-        "-c:v", "libx264",
-        "-pix_fmt", "yuv420p",
-        "-c:a", "aac",
+        *video_codec_args(profile, fps),
+        *audio_codec_args(profile, audio_prepared),
         "-shortest",
+        *mp4_movflags(fragmented),
         str(out),
     ]
+    return cmd
 
-    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if p.returncode != 0:
-        raise RuntimeError(f"FFMPEG FAILED\n\nReturn code: {p.returncode}\n\nSTDERR:\n{p.stderr}\n")
 
+def render_video_ffmpeg_drawtext(
+    audio_path: str,
+    events: List[StoryEvent],
+    output_path: str,
+    duration_sec: int = 60,
+    resolution: Tuple[int, int] = (854, 480),
+    fps: int = 24,
+    fragmented: bool = False,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+) -> str:
+    out = Path(output_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    run_ffmpeg(drawtext_command(
+        audio_path, events, str(out), duration_sec, resolution, fps, fragmented, profile, audio_prepared
+    ))
     return str(out)
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import sys
+
+from core.cache import clear_icon_hashes
+from core.ffmpeg_caps import clear_ffmpeg_caps
+from core.songs import get_registry
+
+
+def clear_resource_caches() -> None:
+    """
+    Drops the process-wide caches that survive Streamlit reruns: compiled templates,
+    icon hashes, ffmpeg capability probes, and (if loaded) fonts and scaled icons.
+    Use after editing prompts/icons/fonts or swapping the ffmpeg binary in place.
+    """
+    get_registry().invalidate()
+    clear_icon_hashes()
+    clear_ffmpeg_caps()
+    # only touch Pillow-backed caches if something already imported them
+    sprites = sys.modules.get("core.sprites")
+    if sprites is not None:
+        sprites.load_font.cache_clear()
+        sprites._scaled_icon.cache_clear()
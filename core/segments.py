@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.cache import RENDER_VERSION, RenderCache, icon_sha256
+from core.render import (
+    RenderCancelled,
+    audio_input_args,
+    build_filter_complex,
+    current_ffmpeg_hooks,
+    ffmpeg_progress,
+    mp4_movflags,
+    run_ffmpeg,
+    unique_icon_paths,
+)
+from core.profiles import EncoderProfile, audio_codec_args, video_codec_args
+from core.storyboard import EventStore, IntervalIndex, StoryEvent
+
+ROOT = Path(__file__).resolve().parents[1]
+SEGMENTS_DIR = ROOT / "outputs" / "segments"
+
+# segment encodes running at once across all renders in this process (each is -threads 1),
+# so N parallel segmented jobs still start at most this many ffmpeg processes
+SEGMENT_WORKERS = int(os.environ.get("SEGMENT_WORKERS") or os.cpu_count() or 1)
+_SEGMENT_SLOTS = threading.BoundedSemaphore(SEGMENT_WORKERS)
+
+
+@dataclass(frozen=True)
+class Segment:
+    start_frame: int
+    n_frames: int
+    event: Optional[StoryEvent]  # None = background only
+
+
+def plan_segments(
+    events: List[StoryEvent],
+    duration_sec: float,
+    fps: int,
+    chunk_sec: Optional[float] = None,
+) -> List[Segment]:
+    """
+    Cuts the timeline into disjoint frame ranges: one per event plus background gaps.
+    Boundaries snap to the frame grid so the joined segments line up exactly. Where
+    events overlap, the one that started first keeps the screen until it ends.
+    With chunk_sec, long ranges are split further (identical chunks share a cache entry).
+    """
+    total = int(round(float(duration_sec) * fps))
+    ordered = sorted(events, key=lambda e: float(e.t_start))
+    # index on the frame grid: at(f) is what's on screen in frame f, earliest start first
+    store = EventStore()
+    for e in ordered:
+        store.append(max(0, int(round(float(e.t_start) * fps))), min(total, int(round(float(e.t_end) * fps))), e.letter, e.word, e.icon)
+    index = IntervalIndex(store)
+
+    # what's on screen only changes where some event starts or ends
+    cuts = sorted({0, total, *(int(t) for t in store.starts if t < total), *(int(t) for t in store.ends if 0 < t)})
+    spans: List[Tuple[int, int, Optional[int]]] = []
+    for a, b in zip(cuts, cuts[1:]):
+        hits = index.at(a)
+        i = hits[0] if hits else None
+        if spans and spans[-1][2] == i:
+            spans[-1] = (spans[-1][0], b, i)
+        else:
+            spans.append((a, b, i))
+
+    step = int(round(chunk_sec * fps)) if chunk_sec else 0
+    out: List[Segment] = []
+    for a, b, i in spans:
+        e = None if i is None else ordered[i]
+        if step <= 0:
+            out.append(Segment(a, b - a, e))
+            continue
+        for s in range(a, b, step):
+            out.append(Segment(s, min(step, b - s), e))
+    return out
+
+
+def segment_key(seg: Segment, resolution: Tuple[int, int], fps: int, profile: Optional[EncoderProfile] = None) -> str:
+    e = seg.event
+    payload = {
+        "v": RENDER_VERSION,
+        "n": seg.n_frames,
+        "res": list(resolution),
+        "fps": fps,
+        "codec": video_codec_args(profile, fps),
+        "card": None if e is None else [e.letter, e.word, e.icon or "", icon_sha256(e.icon)],
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def render_span(
+    events: List[StoryEvent],
+    start_frame: int,
+    n_frames: int,
+    resolution: Tuple[int, int],
+    fps: int,
+    out_path: str,
+    profile: Optional[EncoderProfile] = None,
+    threads: Optional[int] = None,
+) -> str:
+    """
+    Encodes frames [start_frame, start_frame + n_frames) of the timeline (video only),
+    starting on a keyframe so the result can be joined with concat stream copy.
+    """
+    t0 = start_frame / float(fps)
+    dur = n_frames / float(fps)
+    local = [
+        StoryEvent(t_start=float(e.t_start) - t0, t_end=float(e.t_end) - t0, letter=e.letter, word=e.word, icon=e.icon)
+        for e in events
+        if float(e.t_end) > t0 and float(e.t_start) < t0 + dur
+    ]
+    icon_paths = unique_icon_paths(local)
+
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"]
+    for p in icon_paths:
+        cmd += ["-loop", "1", "-i", str(p)]
+    icon_input_idx = {str(p): i for i, p in enumerate(icon_paths)}
+    filter_complex, current = build_filter_complex(local, dur, resolution, fps, icon_input_idx)
+
+    cmd += [
+        "-filter_complex", filter_complex,
+        "-map", current,
+        "-frames:v", str(n_frames),
+        "-r", str(fps),
+        "-force_key_frames", "expr:eq(n,0)",
+        *(["-threads", str(threads)] if threads else []),
+        *video_codec_args(profile, fps),
+        "-an",
+        "-f", "mp4",
+        out_path,
+    ]
+    run_ffmpeg(cmd)
+    return out_path
+
+
+def _render_segment(
+    seg: Segment,
+    resolution: Tuple[int, int],
+    fps: int,
+    out_path: str,
+    profile: Optional[EncoderProfile] = None,
+) -> str:
+    """
+    Encodes one segment (video only) with the card visible for its whole length.
+    """
+    dur = seg.n_frames / float(fps)
+    events = [] if seg.event is None else [
+        StoryEvent(t_start=0.0, t_end=dur, letter=seg.event.letter, word=seg.event.word, icon=seg.event.icon)
+    ]
+    return render_span(events, 0, seg.n_frames, resolution, fps, out_path, profile, threads=1)
+
+
+def ffconcat_stills(stills: Sequence[Tuple[Path, int]], fps: int) -> str:
+    """
+    ffconcat list showing each (image, n_frames) for its run of frames, for the concat
+    demuxer with -safe 0.
+    """
+    lines = ["ffconcat version 1.0\n"]
+    for path, n_frames in stills:
+        lines.append(f"file '{Path(path).resolve()}'\nduration {n_frames / float(fps):.6f}\n")
+    if stills:
+        # concat demuxer ignores the last duration unless the file is repeated
+        lines.append(f"file '{Path(stills[-1][0]).resolve()}'\n")
+    return "".join(lines)
+
+
+def concat_segments(
+    segment_paths: List[Path],
+    output_path: Path,
+    audio_path: Optional[str],
+    duration_sec: float,
+    work_dir: Path,
+    fragmented: bool = False,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+    audio_offset_sec: float = 0.0,
+    audio_duration_sec: Optional[float] = None,
+) -> None:
+    """
+    Joins encoded segments with the concat demuxer (stream copy) and muxes the audio once,
+    optionally starting `audio_offset_sec` in (e.g. after an intro) and cut to
+    `audio_duration_sec` (e.g. before an outro).
+    """
+    list_path = work_dir / f".concat_{uuid.uuid4().hex}.txt"
+    list_path.write_text("".join(f"file '{p.resolve()}'\n" for p in segment_paths), encoding="utf-8")
+    try:
+        cmd = [
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", str(list_path),
+        ]
+        if audio_path:
+            if audio_offset_sec:
+                cmd += ["-itsoffset", f"{audio_offset_sec:.6f}"]
+            if audio_duration_sec is not None:
+                cmd += ["-t", f"{audio_duration_sec:.6f}"]
+            cmd += [
+                *audio_input_args(audio_path, audio_prepared),
+                "-map", "0:v", "-map", "1:a",
+                *audio_codec_args(profile, audio_prepared),
+            ]
+        cmd += [
+            "-c:v", "copy",
+            "-t", str(duration_sec),
+            *mp4_movflags(fragmented),
+            str(output_path),
+        ]
+        run_ffmpeg(cmd)
+    finally:
+        list_path.unlink(missing_ok=True)
+
+
+def encode_segments(
+    missing: Dict[str, Segment],
+    cache: RenderCache,
+    resolution: Tuple[int, int],
+    fps: int,
+    duration_sec: float,
+    profile: Optional[EncoderProfile] = None,
+    workers: Optional[int] = None,
+) -> None:
+    """
+    Encodes segments into the cache from a thread pool. Each ffmpeg takes a process-wide
+    slot (SEGMENT_WORKERS) and runs under the caller's ffmpeg_progress hooks: progress is
+    reported as the share of missing frames done, scaled to duration_sec, and cancel
+    kills every encode.
+    """
+    callback, cancel = current_ffmpeg_hooks()
+    total_frames = sum(s.n_frames for s in missing.values()) or 1
+    lock = threading.Lock()
+    done_frames = {k: 0 for k in missing}
+    tmp_paths = {k: cache.path_for(k).with_name(f".{k}.{uuid.uuid4().hex}.tmp.mp4") for k in missing}
+
+    def report(k: str, block: Dict[str, str]) -> None:
+        try:
+            frame = int(block.get("frame") or 0)
+        except ValueError:
+            return
+        with lock:
+            done_frames[k] = min(frame, missing[k].n_frames)
+            done = sum(done_frames.values())
+        if callback is not None:
+            callback({**block, "out_time_us": str(int(done / total_frames * duration_sec * 1_000_000))})
+
+    def encode(k: str, seg: Segment) -> None:
+        with _SEGMENT_SLOTS:
+            if cancel is not None and cancel.is_set():
+                raise RenderCancelled("Render cancelled")
+            hook = (lambda block: report(k, block)) if callback is not None else None
+            with ffmpeg_progress(hook, cancel):
+                _render_segment(seg, resolution, fps, str(tmp_paths[k]), profile)
+        os.replace(tmp_paths[k], cache.path_for(k))
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(len(missing), workers or SEGMENT_WORKERS)) as pool:
+            # each task gets its own copy of the caller's context (trace, hooks)
+            futures = [pool.submit(contextvars.copy_context().run, encode, k, s) for k, s in missing.items()]
+            try:
+                for f in futures:
+                    f.result()
+            except BaseException:
+                for f in futures:
+                    f.cancel()
+                raise
+    finally:
+        for p in tmp_paths.values():
+            p.unlink(missing_ok=True)
+
+
+def render_video_segmented(
+    audio_path: str,
+    events: List[StoryEvent],
+    output_path: str,
+    duration_sec: int = 60,
+    resolution: Tuple[int, int] = (854, 480),
+    fps: int = 24,
+    chunk_sec: Optional[float] = None,
+    workers: Optional[int] = None,
+    cache_dir: Path = SEGMENTS_DIR,
+    cache_max_bytes: int = 1024 ** 3,
+    fragmented: bool = False,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+) -> str:
+    """
+    Same output as render_video_ffmpeg_drawtext, but each event/gap is encoded on its own
+    in parallel and cached by content hash, so only changed segments re-encode.
+    """
+    out = Path(output_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    cache = RenderCache(cache_dir, max_bytes=cache_max_bytes)
+
+    segments = plan_segments(events, duration_sec, fps, chunk_sec=chunk_sec)
+    keys = [segment_key(s, resolution, fps, profile) for s in segments]
+
+    paths = [cache.path_for(k) for k in keys]
+    missing: Dict[str, Segment] = {}
+    for k, s in zip(keys, segments):
+        if k not in missing and cache.get(k) is None:
+            missing[k] = s
+
+    while missing:
+        encode_segments(missing, cache, resolution, fps, duration_sec, profile, workers)
+        # mark every segment in use before the concat; any that another render evicted
+        # since the lookup is encoded again
+        lost = set(cache.touch(paths))
+        missing = {k: s for k, s, p in zip(keys, segments, paths) if p in lost}
+
+    concat_segments(
+        paths, out, audio_path, duration_sec, cache.cache_dir,
+        fragmented=fragmented, profile=profile, audio_prepared=audio_prepared,
+    )
+    cache.evict(keep=paths)
+    return str(out)
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import ipaddress
+import mimetypes
+import os
+import re
+import secrets
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+CHUNK = 256 * 1024
+
+# only finished videos are served; the render cache directory also holds uploaded audio
+SERVED_SUFFIXES = (".mp4",)
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single byte range -> inclusive (start, end). None = whole file.
+    Raises ValueError for unsatisfiable ranges.
+    """
+    if not header:
+        return None
+    m = _RANGE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if not m.group(1):
+        # suffix range: last N bytes
+        n = int(m.group(2))
+        if n == 0:
+            raise ValueError(header)
+        return max(0, size - n), size - 1
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def file_token(secret: bytes, name: str) -> str:
+    """
+    Unguessable URL component for one file: HMAC of its name under the server secret.
+    """
+    return hmac.new(secret, name.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def resolve_served(root: Path, secret: bytes, token: str, name: str) -> Optional[Path]:
+    """
+    The file a /<token>/<name> URL refers to: a video directly in `root` whose token
+    matches. None for anything else (other suffixes, dotfiles, subpaths, wrong token).
+    """
+    if not name or "/" in name or "\\" in name or name.startswith(".") or not name.endswith(SERVED_SUFFIXES):
+        return None
+    if not hmac.compare_digest(token, file_token(secret, name)):
+        return None
+    p = Path(root) / name
+    if not p.is_file():
+        return None
+    return p
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """
+    Read-only handler for the videos directly in `root`, with HTTP range support so
+    browsers can seek and start playback without the app holding video bytes in
+    memory. URLs are /<token>/<name>; the token is file_token(secret, name), so only
+    links the app handed out resolve. `?download=1` adds Content-Disposition: attachment.
+    """
+
+    root: Path = Path(".")
+    secret: bytes = b""
+
+    def log_message(self, format, *args):  # keep Streamlit logs clean
+        pass
+
+    def do_HEAD(self):
+        self._serve(head_only=True)
+
+    def do_GET(self):
+        self._serve(head_only=False)
+
+    def _resolve(self) -> Optional[Path]:
+        token, _, name = unquote(urlsplit(self.path).path).lstrip("/").partition("/")
+        return resolve_served(self.root, self.secret, token, name)
+
+    def _serve(self, head_only: bool) -> None:
+        p = self._resolve()
+        if p is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        size = p.stat().st_size
+        try:
+            rng = parse_range(self.headers.get("Range"), size)
+        except ValueError:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.end_headers()
+            return
+
+        start, end = rng if rng else (0, size - 1)
+        length = end - start + 1 if size else 0
+
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if rng else HTTPStatus.OK)
+        self.send_header("Content-Type", mimetypes.guess_type(p.name)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", "public, max-age=3600")
+        if rng:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        if parse_qs(urlsplit(self.path).query).get("download"):
+            self.send_header("Content-Disposition", f'attachment; filename="{p.name}"')
+        self.end_headers()
+        if head_only or not length:
+            return
+
+        with open(p, "rb") as f:
+            f.seek(start)
+            remaining = length
+            try:
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+
+class MediaServer:
+    """
+    Background HTTP server for the rendered videos in one directory. Memory use is one
+    chunk per active request, regardless of video size.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        host: str = "127.0.0.1",
+        port: int = 8502,
+        base_url: Optional[str] = None,
+        secret: Optional[bytes] = None,
+    ):
+        self.root = Path(root).resolve()
+        self.secret = secret or secrets.token_bytes(32)
+        handler = type("BoundMediaRequestHandler", (MediaRequestHandler,), {"root": self.root, "secret": self.secret})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        # without a configured base URL, links are http://localhost:<port>: they only
+        # work for a viewer on this machine
+        self.local_only = base_url is None
+        self.base_url = (base_url or f"http://localhost:{self.httpd.server_address[1]}").rstrip("/")
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="media-server", daemon=True)
+        self._thread.start()
+
+    def reachable_from(self, app_host: str) -> bool:
+        """
+        Whether a viewer who reached the app at `app_host` (its Host header) can open
+        this server's URLs.
+        """
+        if not self.local_only:
+            return True
+        return is_loopback(urlsplit(f"//{app_host}").hostname or "")
+
+    def url_for(self, path: Path, download: bool = False) -> str:
+        p = Path(path).resolve()
+        if p.parent != self.root:
+            raise ValueError(f"{p} is not served from {self.root}")
+        url = f"{self.base_url}/{file_token(self.secret, p.name)}/{quote(p.name)}"
+        return url + "?download=1" if download else url
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_media_server(root: Path) -> MediaServer:
+    """
+    Configured from MEDIA_HOST (default 127.0.0.1) / MEDIA_PORT / MEDIA_BASE_URL (the
+    public URL when proxied) / MEDIA_SECRET (shared by processes behind one proxy;
+    random per process otherwise). Binding a non-loopback host requires MEDIA_BASE_URL,
+    since the localhost default would point remote viewers at their own machine.
+    """
+    host = os.environ.get("MEDIA_HOST", "127.0.0.1")
+    base_url = os.environ.get("MEDIA_BASE_URL") or None
+    if not is_loopback(host) and base_url is None:
+        raise ValueError(f"MEDIA_HOST={host} needs MEDIA_BASE_URL (the URL viewers reach this server at)")
+    secret = os.environ.get("MEDIA_SECRET")
+    return MediaServer(
+        root,
+        host=host,
+        port=int(os.environ.get("MEDIA_PORT", "8502")),
+        base_url=base_url,
+        secret=secret.encode("utf-8") if secret else None,
+    )
@@ -1,37 +1,125 @@
 from __future__ import annotations
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
-from core.prompt_parser import parse_prompt_lines
+from core.cache import sha256_file
+from core.prompt_parser import PromptRecord, parse_prompt_file
 
 ROOT = Path(__file__).resolve().parents[1]
 PROMPTS_DIR = ROOT / "prompts"
 
+PROMPT_SUFFIX = ".txt"
+
+# Display titles for known templates; others are derived from the file name.
+TITLES: Dict[str, str] = {
+    "abc": "ABC Song (Timestamped)",
+}
+
 
 @dataclass(frozen=True)
 class SongTemplate:
     key: str
     title: str
-    units: List[dict]
+    units: List[Union[dict, PromptRecord]]
 
 
-def _load_prompt_lines(filename: str) -> List[str]:
-    path = PROMPTS_DIR / filename
-    if not path.exists():
-        raise FileNotFoundError(f"Missing prompt file: {path}")
-    return [l.strip() for l in path.read_text(encoding="utf-8").splitlines() if l.strip()]
+@dataclass(frozen=True)
+class TemplateInfo:
+    key: str
+    title: str
+    path: Path
 
 
-def get_template_by_key(key: str) -> SongTemplate:
-    if key != "abc":
-        key = "abc"
+def template_key_for(path: Path) -> str:
+    # abc_song.txt -> "abc"
+    stem = path.stem
+    return stem[: -len("_song")] if stem.endswith("_song") else stem
+
+
+def _title_for(key: str) -> str:
+    return TITLES.get(key) or f"{key.replace('_', ' ').title()} Song"
+
+
+class TemplateRegistry:
+    """
+    Process-wide cache of compiled SongTemplates for every prompt file in a directory.
+    Templates are parsed lazily on first use and re-parsed only when the file's
+    (mtime, size) changes and its content hash differs. Listing only stats the directory.
+    """
+
+    def __init__(self, prompts_dir: Path = PROMPTS_DIR):
+        self.prompts_dir = Path(prompts_dir)
+        self._lock = threading.Lock()
+        self._listing: Optional[Tuple[int, Dict[str, TemplateInfo]]] = None  # (dir mtime_ns, infos)
+        # key -> (mtime_ns, size, sha256, template)
+        self._compiled: Dict[str, Tuple[int, int, str, SongTemplate]] = {}
+
+    def _infos(self) -> Dict[str, TemplateInfo]:
+        try:
+            dir_mtime = self.prompts_dir.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            if self._listing and self._listing[0] == dir_mtime:
+                return self._listing[1]
+        infos: Dict[str, TemplateInfo] = {}
+        for p in sorted(self.prompts_dir.glob(f"*{PROMPT_SUFFIX}")):
+            key = template_key_for(p)
+            infos[key] = TemplateInfo(key=key, title=_title_for(key), path=p)
+        with self._lock:
+            self._listing = (dir_mtime, infos)
+        return infos
+
+    def list_templates(self) -> List[TemplateInfo]:
+        return list(self._infos().values())
 
-    abc_lines = _load_prompt_lines("abc_song.txt")
-    abc_units = parse_prompt_lines(abc_lines)
+    def get(self, key: str) -> SongTemplate:
+        info = self._infos().get(key)
+        if info is None:
+            raise KeyError(f"Unknown template {key!r} (available: {', '.join(self._infos()) or 'none'})")
 
-    return SongTemplate(
-        key="abc",
-        title="ABC Song (Timestamped)",
-        units=abc_units,
-    )
+        try:
+            st = info.path.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Missing prompt file: {info.path}") from None
+
+        with self._lock:
+            cached = self._compiled.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[3]
+
+        digest = sha256_file(info.path)
+        if cached and cached[2] == digest:
+            # touched but unchanged
+            template = cached[3]
+        else:
+            template = SongTemplate(key=key, title=info.title, units=parse_prompt_file(info.path))
+
+        with self._lock:
+            self._compiled[key] = (st.st_mtime_ns, st.st_size, digest, template)
+        return template
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._compiled.clear()
+                self._listing = None
+            else:
+                self._compiled.pop(key, None)
+
+
+_REGISTRY = TemplateRegistry()
+
+
+def get_registry() -> TemplateRegistry:
+    return _REGISTRY
+
+
+def list_templates() -> List[TemplateInfo]:
+    return _REGISTRY.list_templates()
+
+
+def get_template_by_key(key: str) -> SongTemplate:
+    return _REGISTRY.get(key)
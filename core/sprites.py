@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from core.cache import RENDER_VERSION, RenderCache, icon_sha256
+from core.render import FONT_LINUX, audio_input_args, card_layout, mp4_movflags, resolve_icon, run_ffmpeg
+from core.profiles import EncoderProfile, audio_codec_args, video_codec_args
+from core.segments import ffconcat_stills, plan_segments
+from core.storyboard import StoryEvent
+
+ROOT = Path(__file__).resolve().parents[1]
+SPRITES_DIR = ROOT / "outputs" / "sprites"
+
+BG_RGB = (0xE6, 0xF5, 0xFF)
+BOX_RGBA = (0, 0, 0, int(255 * 0.30))
+TEXT_RGBA = (255, 255, 255, 255)
+
+
+@lru_cache(maxsize=32)
+def load_font(size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.truetype(FONT_LINUX, size)
+    except Exception:
+        try:
+            return ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+        except Exception:
+            return ImageFont.load_default()
+
+
+@lru_cache(maxsize=128)
+def _scaled_icon(path: str, mtime_ns: int, height: int) -> Image.Image:
+    # same as ffmpeg scale=-1:H (keeps aspect, width rounded)
+    img = Image.open(path).convert("RGBA")
+    w = max(1, int(round(img.width * height / float(img.height))))
+    return img.resize((w, height), Image.LANCZOS)
+
+
+def scaled_icon(icon: Optional[str], height: int) -> Optional[Image.Image]:
+    p = resolve_icon(icon)
+    if p is None:
+        return None
+    return _scaled_icon(str(p), p.stat().st_mtime_ns, height)
+
+
+def draw_card(event: Optional[StoryEvent], resolution: Tuple[int, int]) -> Image.Image:
+    """
+    One full frame (RGB) for a card, using the same layout as the drawtext renderer.
+    event=None gives the plain background.
+    """
+    w, h = resolution
+    frame = Image.new("RGBA", (w, h), BG_RGB + (255,))
+    if event is None:
+        return frame.convert("RGB")
+
+    lay = card_layout(resolution)
+    overlay = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    d = ImageDraw.Draw(overlay)
+    d.rectangle([lay.card_x, lay.card_y, lay.card_x + lay.card_w - 1, lay.card_y + lay.card_h - 1], fill=BOX_RGBA)
+    frame = Image.alpha_composite(frame, overlay)
+
+    d = ImageDraw.Draw(frame)
+    if event.letter:
+        d.text((w / 2, lay.big_y), event.letter, font=load_font(lay.big_fs), fill=TEXT_RGBA, anchor="mt")
+    if event.word:
+        d.text((w / 2, lay.word_y), event.word, font=load_font(lay.word_fs), fill=TEXT_RGBA, anchor="mt")
+
+    icon = scaled_icon(event.icon, lay.icon_h)
+    if icon is not None:
+        frame.alpha_composite(icon, ((w - icon.width) // 2, (h - icon.height) // 2))
+
+    return frame.convert("RGB")
+
+
+def card_sprite_key(event: Optional[StoryEvent], resolution: Tuple[int, int]) -> str:
+    payload = {
+        "v": RENDER_VERSION,
+        "res": list(resolution),
+        "card": None if event is None else [event.letter, event.word, event.icon or "", icon_sha256(event.icon)],
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def ensure_card_sprite(event: Optional[StoryEvent], resolution: Tuple[int, int], cache: RenderCache) -> Path:
+    """
+    Rasterizes a card once per unique (content, resolution); later calls return the cached PNG.
+    """
+    key = card_sprite_key(event, resolution)
+    hit = cache.get(key, ".png")
+    if hit is not None:
+        return hit
+    path = cache.path_for(key, ".png")
+    tmp = path.with_name(f".{key}.{uuid.uuid4().hex}.tmp.png")
+    draw_card(event, resolution).save(tmp, "PNG", compress_level=1)
+    os.replace(tmp, path)
+    return path
+
+
+def render_video_sprites(
+    audio_path: str,
+    events: List[StoryEvent],
+    output_path: str,
+    duration_sec: int = 60,
+    resolution: Tuple[int, int] = (854, 480),
+    fps: int = 24,
+    cache_dir: Path = SPRITES_DIR,
+    cache_max_bytes: int = 256 * 1024 ** 2,
+    fragmented: bool = False,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+) -> str:
+    """
+    Renders each unique card once with Pillow and feeds ffmpeg a concat list of stills
+    with durations, so the per-frame filter cost doesn't grow with the number of events.
+    """
+    out = Path(output_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    cache = RenderCache(cache_dir, max_bytes=cache_max_bytes)
+
+    segments = plan_segments(events, duration_sec, fps)
+    stills = [ensure_card_sprite(s.event, resolution, cache) for s in segments]
+
+    list_path = cache.cache_dir / f".concat_{uuid.uuid4().hex}.txt"
+    list_path.write_text(ffconcat_stills([(p, s.n_frames) for s, p in zip(segments, stills)], fps), encoding="utf-8")
+
+    try:
+        cmd = [
+            "ffmpeg", "-y",
+            "-hide_banner", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", str(list_path),
+            *audio_input_args(audio_path, audio_prepared),
+            "-map", "0:v",
+            "-map", "1:a",
+            "-vf", f"fps={fps},format=yuv420p",
+            "-t", str(duration_sec),
+            *video_codec_args(profile, fps),
+            *audio_codec_args(profile, audio_prepared),
+            "-shortest",
+            *mp4_movflags(fragmented),
+            str(out),
+        ]
+        run_ffmpeg(cmd)
+    finally:
+        list_path.unlink(missing_ok=True)
+
+    cache.evict(keep=stills)
+    return str(out)
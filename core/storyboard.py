@@ -1,9 +1,15 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List, Optional
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from core.metrics import span
+from core.prompt_parser import PromptRecord
 
-@dataclass
+Unit = Union[dict, PromptRecord]
+
+
+@dataclass(slots=True)
 class StoryEvent:
     t_start: float
     t_end: float
@@ -12,58 +18,235 @@ class StoryEvent:
     icon: Optional[str] = None
 
 
-def build_storyboard_for_template(units: List[dict], duration_sec: int = 60) -> List[StoryEvent]:
+@dataclass
+class StoryboardReport:
+    gaps: List[Tuple[float, float]] = field(default_factory=list)  # uncovered [start, end)
+    overlaps: List[Tuple[int, int]] = field(default_factory=list)  # (earlier, later) event indices
+    dropped: int = 0  # empty or out-of-range units
+
+    def summary(self) -> str:
+        """
+        One line for the UI and batch results; "" when there is nothing to report.
+        """
+        parts = []
+        if self.overlaps:
+            parts.append(f"{len(self.overlaps)} overlapping event(s) cut short")
+        if self.gaps:
+            parts.append(f"{sum(b - a for a, b in self.gaps):.1f}s without a card in {len(self.gaps)} gap(s)")
+        if self.dropped:
+            parts.append(f"{self.dropped} unit(s) dropped")
+        return ", ".join(parts)
+
+
+class EventStore:
     """
-    If units have timestamps -> align events to timestamps (end = next timestamp).
-    If timestamps missing -> evenly space them.
+    Array-backed event list: times in array('d'), strings interned into one pool and
+    referenced by index. Materializes StoryEvent objects only when iterated/indexed.
     """
-    if not units:
-        return []
 
-    # If at least half units have timestamps, treat as timestamped
-    ts_count = sum(1 for u in units if u.get("t") is not None)
-    use_ts = ts_count >= max(1, len(units) // 2)
+    __slots__ = ("starts", "ends", "_letters", "_words", "_icons", "_pool", "_pool_idx")
+
+    def __init__(self) -> None:
+        self.starts = array("d")
+        self.ends = array("d")
+        self._letters = array("I")
+        self._words = array("I")
+        self._icons = array("I")
+        self._pool: List[str] = [""]
+        self._pool_idx: Dict[str, int] = {"": 0}
+
+    def _intern(self, s: Optional[str]) -> int:
+        s = s or ""
+        i = self._pool_idx.get(s)
+        if i is None:
+            i = self._pool_idx[s] = len(self._pool)
+            self._pool.append(s)
+        return i
+
+    def append(self, t_start: float, t_end: float, letter: str, word: str, icon: Optional[str]) -> int:
+        self.starts.append(t_start)
+        self.ends.append(t_end)
+        self._letters.append(self._intern(letter))
+        self._words.append(self._intern(word))
+        self._icons.append(self._intern(icon))
+        return len(self.starts) - 1
+
+    @classmethod
+    def from_events(cls, events: Iterable[StoryEvent]) -> "EventStore":
+        store = cls()
+        for e in events:
+            store.append(float(e.t_start), float(e.t_end), e.letter, e.word, e.icon)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> StoryEvent:
+        return StoryEvent(
+            t_start=self.starts[i],
+            t_end=self.ends[i],
+            letter=self._pool[self._letters[i]],
+            word=self._pool[self._words[i]],
+            icon=self._pool[self._icons[i]] or None,
+        )
+
+    def __iter__(self) -> Iterator[StoryEvent]:
+        for i in range(len(self.starts)):
+            yield self[i]
+
+    def to_events(self) -> List[StoryEvent]:
+        return list(self)
+
+
+class IntervalIndex:
+    """
+    Augmented interval tree, stored implicitly over the events sorted by start: the
+    node for [lo, hi) is its midpoint, and _max_end[mid] is the latest end in that
+    range. at(t) / overlapping(a, b) visit O(log n) nodes per hit (k hits), pruning any
+    subtree that ends by `a` or starts at/after `b`, so one long event doesn't make
+    every later query walk the whole timeline.
+    """
+
+    def __init__(self, store: EventStore):
+        self.store = store
+        order = sorted(range(len(store)), key=store.starts.__getitem__)
+        self._order = array("L", order)
+        self._starts = array("d", (store.starts[i] for i in order))
+        self._ends = array("d", (store.ends[i] for i in order))
+        self._max_end = array("d", self._ends)
+        self._build(0, len(order))
+
+    def _build(self, lo: int, hi: int) -> float:
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        m = max(self._ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        self._max_end[mid] = m
+        return m
+
+    def _query(self, a: float, b: float, inclusive: bool) -> List[int]:
+        # events with start < b (start <= b if inclusive) and end > a, in start order
+        starts, ends, max_end = self._starts, self._ends, self._max_end
+        hits = []
+        stack = [(0, len(starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if max_end[mid] <= a:
+                continue
+            stack.append((lo, mid))
+            if starts[mid] < b or (inclusive and starts[mid] == b):
+                if ends[mid] > a:
+                    hits.append(mid)
+                stack.append((mid + 1, hi))
+        hits.sort()
+        return [self._order[j] for j in hits]
 
-    events: List[StoryEvent] = []
+    def at(self, t: float) -> List[int]:
+        """
+        Indices (into the store) of events on screen at time t (start <= t < end).
+        """
+        return self._query(t, t, inclusive=True)
+
+    def overlapping(self, a: float, b: float) -> List[int]:
+        """
+        Indices of events intersecting [a, b).
+        """
+        if b <= a:
+            return []
+        return self._query(a, b, inclusive=False)
+
+
+def unit_fields(u: Unit) -> Tuple[Optional[float], str, str, Optional[str]]:
+    if isinstance(u, PromptRecord):
+        return u.t, u.letter, u.word, u.icon or None
+    return u.get("t"), str(u.get("letter", "")), str(u.get("word", "")), (u.get("icon") or None)
+
+
+def build_event_store(units: Iterable[Unit], duration_sec: float = 60) -> Tuple[EventStore, StoryboardReport]:
+    """
+    Same timing rules as build_storyboard_for_template, into a compact EventStore.
+    Also reports gaps (time with nothing on screen), overlaps and dropped units.
+    """
+    store = EventStore()
+    report = StoryboardReport()
+    rows = [unit_fields(u) for u in units]
+    if not rows:
+        return store, report
+
+    duration = float(duration_sec)
+
+    # If at least half units have timestamps, treat as timestamped
+    ts_count = sum(1 for r in rows if r[0] is not None)
+    use_ts = ts_count >= max(1, len(rows) // 2)
 
     if use_ts:
         # filter only timestamped lines and sort
-        timed = [u for u in units if u.get("t") is not None]
-        timed.sort(key=lambda x: float(x["t"]))
-
-        for i, u in enumerate(timed):
-            start = float(u["t"])
-            end = float(timed[i + 1]["t"]) if i + 1 < len(timed) else float(duration_sec)
+        timed = sorted((r for r in rows if r[0] is not None), key=lambda r: float(r[0]))
+        report.dropped += len(rows) - len(timed)
+        for i, (t, letter, word, icon) in enumerate(timed):
+            start = float(t)
+            end = float(timed[i + 1][0]) if i + 1 < len(timed) else duration
             # clamp
-            start = max(0.0, min(start, float(duration_sec)))
-            end = max(0.0, min(end, float(duration_sec)))
+            start = max(0.0, min(start, duration))
+            end = max(0.0, min(end, duration))
             if end <= start:
+                report.dropped += 1
                 continue
+            store.append(start, end, letter, word, icon)
+    else:
+        # fallback: evenly spaced
+        n = len(rows)
+        step = duration / float(n)
+        for i, (_, letter, word, icon) in enumerate(rows):
+            store.append(i * step, (i + 1) * step, letter, word, icon)
 
-            events.append(
-                StoryEvent(
-                    t_start=start,
-                    t_end=end,
-                    letter=str(u.get("letter", "")),
-                    word=str(u.get("word", "")),
-                    icon=(u.get("icon") or None),
-                )
-            )
-        return events
-
-    # fallback: evenly spaced
-    n = len(units)
-    step = duration_sec / float(n)
-    for i, u in enumerate(units):
-        start = i * step
-        end = (i + 1) * step
-        events.append(
-            StoryEvent(
-                t_start=start,
-                t_end=end,
-                letter=str(u.get("letter", "")),
-                word=str(u.get("word", "")),
-                icon=(u.get("icon") or None),
-            )
-        )
-    return events
+    _scan_coverage(store, duration, report)
+    return store, report
+
+
+def _scan_coverage(store: EventStore, duration: float, report: StoryboardReport) -> None:
+    order = sorted(range(len(store)), key=store.starts.__getitem__)
+    cursor = 0.0
+    last = -1
+    for i in order:
+        s, e = store.starts[i], store.ends[i]
+        if s > cursor + 1e-9:
+            report.gaps.append((cursor, s))
+        elif last >= 0 and s < store.ends[last] - 1e-9:
+            report.overlaps.append((last, i))
+        if last < 0 or e >= store.ends[last]:
+            last = i
+        cursor = max(cursor, e)
+    if cursor < duration - 1e-9:
+        report.gaps.append((cursor, duration))
+
+
+def coverage_report(events: Iterable[StoryEvent], duration_sec: float) -> StoryboardReport:
+    """
+    Gaps and overlaps of an already-timed event list (e.g. from auto alignment).
+    """
+    report = StoryboardReport()
+    _scan_coverage(EventStore.from_events(events), float(duration_sec), report)
+    return report
+
+
+def build_storyboard_with_report(units: List[Unit], duration_sec: int = 60) -> Tuple[List[StoryEvent], StoryboardReport]:
+    """
+    build_storyboard_for_template plus the StoryboardReport for what it built.
+    """
+    if not units:
+        return [], StoryboardReport()
+    with span("storyboard.build", units=len(units)):
+        store, report = build_event_store(units, duration_sec=duration_sec)
+        return store.to_events(), report
+
+
+def build_storyboard_for_template(units: List[Unit], duration_sec: int = 60) -> List[StoryEvent]:
+    """
+    If units have timestamps -> align events to timestamps (end = next timestamp).
+    If timestamps missing -> evenly space them.
+    """
+    return build_storyboard_with_report(units, duration_sec=duration_sec)[0]
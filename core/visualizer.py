@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from core.audio import ANALYSIS_DIR
+from core.cache import sha256_file
+from core.compositor import render_video_numpy
+from core.metrics import span
+from core.profiles import EncoderProfile
+from core.render import audio_input_args, card_layout
+from core.storyboard import StoryEvent
+
+# audio is decoded at fps * SAMPLES_PER_FRAME, so every video frame is exactly one row
+# of the PCM file (11.5 kHz at 24 fps; plenty for a level meter)
+SAMPLES_PER_FRAME = 480
+# frames reduced per vectorized step; bounds memory to ~BLOCK_FRAMES * SAMPLES_PER_FRAME floats
+BLOCK_FRAMES = 4096
+# levels are stored as uint8 over [FLOOR_DB, 0] dBFS
+FLOOR_DB = -60.0
+
+# number of bars in the strip; each is one frame of level history, newest on the right
+BARS = 48
+BAR_RGB = (0x4A, 0x7F, 0xA8)
+PEAK_RGB = (0x1F, 0x4E, 0x79)
+
+# Bump when the track format or level scale changes so stale cache entries are not reused.
+VISUALIZER_VERSION = "1"
+
+
+def decode_pcm(audio_path: str, pcm_path: Path, sr: int, loop_to_sec: Optional[float] = None) -> int:
+    """
+    Decodes to a headerless mono s16le file at `sr`; ffmpeg streams it to disk, so
+    nothing is held in memory. With loop_to_sec the input is looped and trimmed the
+    way renderers loop unprepared audio. Returns the number of samples.
+    """
+    looped = loop_to_sec is not None
+    cmd = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        *audio_input_args(str(audio_path), prepared=not looped),
+        "-map", "0:a:0", "-ac", "1", "-ar", str(sr),
+        *(["-t", str(loop_to_sec)] if looped else []),
+        "-f", "s16le", str(pcm_path),
+    ]
+    p = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"FFMPEG FAILED\n\nReturn code: {p.returncode}\n\nSTDERR:\n{p.stderr}\n")
+    return pcm_path.stat().st_size // 2
+
+
+def _to_level(amplitude: np.ndarray) -> np.ndarray:
+    # linear amplitude (0..1) -> uint8 over [FLOOR_DB, 0] dBFS
+    db = 20.0 * np.log10(np.maximum(amplitude, 1e-6))
+    return np.round(np.clip(1.0 - db / FLOOR_DB, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+
+def frame_levels(pcm: np.ndarray, samples_per_frame: int = SAMPLES_PER_FRAME, block_frames: int = BLOCK_FRAMES) -> np.ndarray:
+    """
+    int16 samples (e.g. a memmap) -> (frames, 2) uint8 of [rms, peak] per frame. Frames
+    are non-overlapping windows of `samples_per_frame`, viewed as rows of a reshape, so
+    each block is reduced in a few NumPy calls and only the block is paged in.
+    """
+    n_frames = -(-len(pcm) // samples_per_frame)
+    out = np.zeros((n_frames, 2), dtype=np.uint8)
+    for a in range(0, n_frames, block_frames):
+        b = min(n_frames, a + block_frames)
+        x = np.zeros((b - a) * samples_per_frame, dtype=np.float32)
+        chunk = pcm[a * samples_per_frame: b * samples_per_frame]
+        x[: len(chunk)] = chunk
+        x *= 1.0 / 32768.0
+        x = x.reshape(b - a, samples_per_frame)
+        out[a:b, 1] = _to_level(np.abs(x).max(axis=1))
+        np.square(x, out=x)
+        out[a:b, 0] = _to_level(np.sqrt(x.mean(axis=1)))
+    return out
+
+
+def _track_cache_path(audio_sha: str, fps: int, loop_to_sec: Optional[float], cache_dir: Path) -> Path:
+    loop = f"_loop{loop_to_sec:g}" if loop_to_sec is not None else ""
+    return cache_dir / f"levels_{audio_sha[:32]}_{fps}fps{loop}_{SAMPLES_PER_FRAME}_v{VISUALIZER_VERSION}.npy"
+
+
+def level_track(
+    audio_path: str,
+    fps: int,
+    audio_sha: Optional[str] = None,
+    cache_dir: Path = ANALYSIS_DIR,
+    loop_to_sec: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Per-frame [rms, peak] levels (uint8, 2 bytes per frame) for the whole file at `fps`
+    (or for the file looped to `loop_to_sec`), cached on disk by audio content hash.
+    The audio is decoded once to a temporary raw PCM file and memory-mapped, so peak
+    memory does not grow with track length.
+    """
+    audio_sha = audio_sha or sha256_file(Path(audio_path))
+    cache_path = _track_cache_path(audio_sha, fps, loop_to_sec, cache_dir)
+    if cache_path.exists():
+        try:
+            return np.load(cache_path)
+        except (OSError, ValueError):
+            pass
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    pcm_path = cache_dir / f".{cache_path.stem}.{uuid.uuid4().hex}.pcm"
+    try:
+        with span("visualizer.levels", fps=fps):
+            n = decode_pcm(audio_path, pcm_path, fps * SAMPLES_PER_FRAME, loop_to_sec)
+            if n:
+                pcm = np.memmap(pcm_path, dtype="<i2", mode="r", shape=(n,))
+                track = frame_levels(pcm)
+                del pcm
+            else:
+                track = np.zeros((0, 2), dtype=np.uint8)
+    finally:
+        pcm_path.unlink(missing_ok=True)
+
+    tmp = cache_path.with_name(f".{cache_path.stem}.{uuid.uuid4().hex}.tmp.npy")
+    np.save(tmp, track)
+    os.replace(tmp, cache_path)
+    return track
+
+
+class LevelBars:
+    """
+    Frame overlay for the numpy compositor: a strip of level bars under the card, the
+    last BARS frames of RMS with a peak tick on each. Geometry is laid out once; each
+    frame is one slice of the track and a mask over the strip, so the cost per frame is
+    small and constant (independent of track length and event count).
+    """
+
+    def __init__(self, track: np.ndarray, resolution: Tuple[int, int], bars: int = BARS):
+        w, h = resolution
+        lay = card_layout(resolution)
+        bar_w = max(2, lay.card_w // bars)
+        strip_w = bar_w * bars
+        x0 = lay.card_x + (lay.card_w - strip_w) // 2
+        y0 = lay.card_y + lay.card_h + max(1, int(h * 0.02))
+        y1 = min(h, y0 + max(4, int(h * 0.08)))
+        self.region = (y0, y1, x0, x0 + strip_w)
+        self.bars = bars
+        self.strip_h = y1 - y0
+
+        # history is read with one slice: bars - 1 silent frames in front of the track
+        self.track = np.concatenate([np.zeros((bars - 1, 2), dtype=np.uint8), np.asarray(track, dtype=np.uint8)])
+        # pixel rows counted from the bottom of the strip, and each column's bar
+        self._rows = np.arange(self.strip_h - 1, -1, -1)[:, None]
+        self._bar_of_col = np.repeat(np.arange(bars), bar_w)
+        self._gap = (np.arange(strip_w) % bar_w) == bar_w - 1
+        self._bar_rgb = np.array(BAR_RGB, dtype=np.uint8)
+        self._peak_rgb = np.array(PEAK_RGB, dtype=np.uint8)
+
+    def heights(self, frame_index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (rms, peak) bar heights in pixels for the bars shown at this frame.
+        """
+        window = self.track[frame_index: frame_index + self.bars]
+        if len(window) < self.bars:
+            window = np.concatenate([window, np.zeros((self.bars - len(window), 2), dtype=np.uint8)])
+        px = (window.astype(np.int32) * self.strip_h + 127) // 255
+        return px[:, 0], px[:, 1]
+
+    def __call__(self, frame: np.ndarray, frame_index: int) -> None:
+        rms, peak = self.heights(frame_index)
+        y0, y1, x0, x1 = self.region
+        strip = frame[y0:y1, x0:x1]
+        cols_rms = rms[self._bar_of_col]
+        cols_peak = peak[self._bar_of_col]
+        strip[(self._rows < cols_rms) & ~self._gap] = self._bar_rgb
+        strip[(self._rows == cols_peak - 1) & (cols_peak > 0) & ~self._gap] = self._peak_rgb
+
+
+def render_video_visualizer(
+    audio_path: str,
+    events: List[StoryEvent],
+    output_path: str,
+    duration_sec: int = 60,
+    resolution: Tuple[int, int] = (854, 480),
+    fps: int = 24,
+    cache_dir: Path = ANALYSIS_DIR,
+    fragmented: bool = False,
+    profile: Optional[EncoderProfile] = None,
+    audio_prepared: bool = False,
+) -> str:
+    """
+    numpy compositor backend with an audio-reactive level strip under the card. Levels
+    come from the cached per-frame track, so each frame only adds the strip draw.
+    Unprepared audio is looped to the duration by the encoder, so its track is too.
+    """
+    track = level_track(audio_path, fps, cache_dir=cache_dir, loop_to_sec=None if audio_prepared else float(duration_sec))
+    return render_video_numpy(
+        audio_path,
+        events,
+        output_path,
+        duration_sec=duration_sec,
+        resolution=resolution,
+        fps=fps,
+        overlay=LevelBars(track, resolution),
+        fragmented=fragmented,
+        profile=profile,
+        audio_prepared=audio_prepared,
+    )
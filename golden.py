@@ -0,0 +1,313 @@
+"""
+Golden-frame regression harness: proves a faster render path still draws the same video.
+
+    python golden.py --update --backends sprites               # record goldens with sprites
+    python golden.py --backends sprites,numpy,ass              # compare against them; exit 1 on a mismatch
+    python golden.py --backends numpy --resolutions 480p,1080p -o golden_run.json
+
+The committed goldens are recorded with GOLDEN_BACKEND (sprites), which needs no ffmpeg
+text filters; drawtext, segmented and library need an ffmpeg with drawtext to compare.
+Each golden stores the backend it was recorded with, and a compare fails outright if that
+is not --reference, so goldens re-recorded with another backend don't pass as noise.
+
+Each reference storyboard is rendered and decoded only at the frames that matter: every
+event's first and last frame, its midpoint, and the frames just outside it. A frame passes
+if its framemd5 matches the golden exactly, or if every tile of a small area-downscaled
+thumbnail is within --tolerance (mean absolute difference, 0-255) of the golden's. Encoder
+and anti-aliasing noise stays well under it; a wrong letter, a late card or a misdrawn
+glyph does not.
+Render time is recorded with every run and with the golden it is compared against.
+"""
+import argparse
+import json
+import math
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.backends import RENDERERS, backend_missing_filters, get_renderer
+from core.harness import RESOLUTIONS, environment, make_audio
+from core.prompt_parser import parse_prompt_lines
+from core.storyboard import StoryEvent, build_storyboard_for_template
+
+GOLDENS_DIR = ROOT / "goldens"
+# backend the committed goldens were recorded with
+GOLDEN_BACKEND = "sprites"
+
+THUMB_W, THUMB_H = 96, 54
+TILE = 6  # thumbnail pixels per tile side (~53 px at 480p)
+# renderer noise measures <= 4 (libass vs Pillow text), a changed letter >= 35
+TOLERANCE = 8.0
+
+# name -> (duration_sec, abc_song.txt-style lines); keep these stable, goldens depend on them
+CASES: Dict[str, Tuple[float, List[str]]] = {
+    # cards with background-only gaps between them
+    "sparse": (8.0, [
+        "00:00.50|A|Apple|a.png",
+        "00:03.00|B|Ball|b.png",
+        "00:05.25|C|Cat|c.png",
+    ]),
+    # back-to-back changes every 0.4 s, off the frame grid
+    "dense": (11.0, [
+        f"00:{0.4 * i + 0.13:05.2f}|{chr(ord('A') + i)}|{chr(ord('A') + i)}{chr(ord('a') + i) * 3}|{chr(ord('a') + i)}.png"
+        for i in range(26)
+    ]),
+    # escaping, long words and cards without icons
+    "text": (6.0, [
+        "00:00.00|Q|Don't: stop\\now|",
+        "00:02.00|W|Watermelon-Wednesday|w.png",
+        "00:04.00|Z|Zz|",
+    ]),
+}
+
+
+def case_events(name: str) -> Tuple[float, List[StoryEvent]]:
+    duration, lines = CASES[name]
+    return duration, build_storyboard_for_template(parse_prompt_lines(lines), duration_sec=duration)
+
+
+def sample_frames(events: List[StoryEvent], duration_sec: float, fps: int) -> List[int]:
+    """
+    Per event: first and last frame it is visible, its midpoint, and the frames just
+    before and after, where an off-by-one in timing shows up.
+    """
+    total = int(round(duration_sec * fps))
+    frames = set()
+    for e in events:
+        a = max(0, math.ceil(float(e.t_start) * fps - 1e-6))
+        b = min(total, math.ceil(float(e.t_end) * fps - 1e-6)) - 1
+        if b < a:
+            continue
+        frames.update((a - 1, a, (a + b) // 2, b, b + 1))
+    return sorted(f for f in frames if 0 <= f < total)
+
+
+def extract_frames(video: Path, frames: List[int], fps: int, work_dir: Path) -> Tuple[List[str], np.ndarray]:
+    """
+    One decode pass: framemd5 of the selected full-size frames (rgb24) and their
+    area-downscaled thumbnails. Returns (md5s, thumbs[n, THUMB_H, THUMB_W, 3]).
+    Frames are numbered on a constant `fps` grid, so variable-frame-rate outputs
+    (e.g. the numpy backend's one frame per change) line up with constant-rate ones; the
+    last decoded frame is held to the end, as a player would.
+    """
+    select = "+".join(f"eq(n,{n})" for n in frames)
+    end = frames[-1] + 1 if frames else 0
+    md5_path = work_dir / f"{video.stem}.framemd5"
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", str(video),
+        "-filter_complex",
+        f"[0:v]fps={fps},tpad=stop_mode=clone:stop_duration={end / float(fps):.3f},trim=end_frame={end},"
+        f"select='{select}',format=rgb24,split[full][small];"
+        f"[small]scale={THUMB_W}:{THUMB_H}:flags=area[thumb]",
+        "-map", "[full]", "-vsync", "passthrough", "-f", "framemd5", "-y", str(md5_path),
+        "-map", "[thumb]", "-vsync", "passthrough", "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1",
+    ]
+    p = subprocess.run(cmd, capture_output=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"FFMPEG FAILED\n\nReturn code: {p.returncode}\n\nSTDERR:\n{p.stderr.decode('utf-8', 'replace')}\n")
+    md5s = [
+        line.rsplit(",", 1)[1].strip()
+        for line in md5_path.read_text(encoding="utf-8").splitlines()
+        if line and not line.startswith("#")
+    ]
+    md5_path.unlink(missing_ok=True)
+    thumbs = np.frombuffer(p.stdout, dtype=np.uint8).reshape(-1, THUMB_H, THUMB_W, 3)
+    if len(md5s) != len(frames) or len(thumbs) != len(frames):
+        raise RuntimeError(f"expected {len(frames)} frames from {video.name}, got {len(md5s)} hashes / {len(thumbs)} thumbnails")
+    return md5s, thumbs
+
+
+def golden_path(goldens_dir: Path, case: str, res_name: str, fps: int) -> Path:
+    return goldens_dir / f"{case}_{res_name}_{fps}fps.npz"
+
+
+def save_golden(path: Path, frames: List[int], md5s: List[str], thumbs: np.ndarray, meta: Dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, frames=np.asarray(frames, dtype=np.int32), md5=np.asarray(md5s), thumbs=thumbs, meta=json.dumps(meta))
+
+
+def load_golden(path: Path) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    with np.load(path) as z:
+        return {
+            "frames": z["frames"].tolist(),
+            "md5": z["md5"].tolist(),
+            "thumbs": z["thumbs"],
+            "meta": json.loads(str(z["meta"])),
+        }
+
+
+def tile_difference(a: np.ndarray, b: np.ndarray, tile: int = TILE) -> np.ndarray:
+    """
+    Per frame: the largest mean absolute difference over any tile x tile block, so a
+    changed letter or icon stands out instead of averaging away over the whole frame.
+    """
+    d = np.abs(a.astype(np.int16) - b.astype(np.int16)).mean(axis=3)
+    n, h, w = d.shape
+    d = d[:, : h // tile * tile, : w // tile * tile]
+    return d.reshape(n, h // tile, tile, w // tile, tile).mean(axis=(2, 4)).max(axis=(1, 2))
+
+
+def compare_frames(md5s: List[str], thumbs: np.ndarray, golden: Dict, tolerance: float) -> List[Dict]:
+    mad = tile_difference(thumbs, golden["thumbs"])
+    out = []
+    for i, n in enumerate(golden["frames"]):
+        if md5s[i] == golden["md5"][i]:
+            verdict = "exact"
+        elif mad[i] <= tolerance:
+            verdict = "close"
+        else:
+            verdict = "diff"
+        out.append({"frame": n, "verdict": verdict, "mad": round(float(mad[i]), 3)})
+    return out
+
+
+def run_case(
+    case: str,
+    backend: str,
+    res_name: str,
+    fps: int,
+    audio: Path,
+    work_dir: Path,
+    goldens_dir: Path,
+    update: bool,
+    tolerance: float,
+    reference: str = GOLDEN_BACKEND,
+) -> Dict:
+    duration, events = case_events(case)
+    resolution = RESOLUTIONS[res_name]
+    result = {"case": case, "backend": backend, "resolution": res_name, "fps": fps, "status": "fail"}
+
+    missing = backend_missing_filters(backend)
+    if missing:
+        result["error"] = f"ffmpeg lacks {', '.join(missing)}, which the {backend} backend needs"
+        return result
+    path = golden_path(goldens_dir, case, res_name, fps)
+    golden = None
+    if not update:
+        golden = load_golden(path)
+        if golden is None:
+            result["error"] = f"no golden at {path} (run with --update)"
+            return result
+        recorded = golden["meta"].get("backend")
+        if recorded != reference:
+            result["error"] = f"golden was recorded with {recorded}, not {reference} (re-record, or pass --reference {recorded})"
+            return result
+
+    video = work_dir / f"{case}_{backend}_{res_name}.mp4"
+    t = time.perf_counter()
+    try:
+        get_renderer(backend)(
+            audio_path=str(audio),
+            events=events,
+            output_path=str(video),
+            duration_sec=duration,
+            resolution=resolution,
+            fps=fps,
+        )
+    except Exception as e:
+        result["error"] = str(e)[-2000:]
+        return result
+    result["render_sec"] = round(time.perf_counter() - t, 3)
+
+    frames = sample_frames(events, duration, fps)
+    try:
+        md5s, thumbs = extract_frames(video, frames, fps, work_dir)
+    except RuntimeError as e:
+        result["error"] = str(e)[-2000:]
+        return result
+    finally:
+        video.unlink(missing_ok=True)
+    result["frames"] = len(frames)
+
+    if update:
+        save_golden(path, frames, md5s, thumbs, {
+            "backend": backend,
+            "render_sec": result["render_sec"],
+            "environment": environment(),
+        })
+        result["status"] = "recorded"
+        result["golden"] = str(path.relative_to(ROOT) if path.is_relative_to(ROOT) else path)
+        return result
+
+    if golden["frames"] != frames:
+        result["error"] = "golden was recorded for a different storyboard (re-record with --update)"
+        return result
+
+    checks = compare_frames(md5s, thumbs, golden, tolerance)
+    diffs = [c for c in checks if c["verdict"] == "diff"]
+    result.update({
+        "golden_backend": golden["meta"].get("backend"),
+        "golden_render_sec": golden["meta"].get("render_sec"),
+        "exact": sum(c["verdict"] == "exact" for c in checks),
+        "close": sum(c["verdict"] == "close" for c in checks),
+        "diff": len(diffs),
+        "worst_mad": max((c["mad"] for c in checks), default=0.0),
+        "diff_frames": [{**c, "t": round(c["frame"] / float(fps), 3)} for c in diffs],
+        "status": "fail" if diffs else "pass",
+    })
+    return result
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Render reference storyboards and compare sampled frames against goldens.")
+    ap.add_argument("--cases", default=",".join(CASES), help=",".join(CASES))
+    ap.add_argument("--backends", default="drawtext", help=",".join(RENDERERS))
+    ap.add_argument("--resolutions", default="480p", help=",".join(RESOLUTIONS))
+    ap.add_argument("--fps", type=int, default=24)
+    ap.add_argument("--goldens", type=Path, default=GOLDENS_DIR)
+    ap.add_argument("--update", action="store_true", help="record goldens from the given backend instead of comparing")
+    ap.add_argument("--reference", default=GOLDEN_BACKEND, help="backend the goldens must have been recorded with")
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE, help="max mean abs difference of any thumbnail tile (0-255)")
+    ap.add_argument("-o", "--output", type=Path, default=None, help="write results JSON here")
+    args = ap.parse_args(argv)
+
+    backends = args.backends.split(",")
+    if args.update and len(backends) != 1:
+        ap.error("--update records goldens from exactly one backend")
+
+    results = []
+    with tempfile.TemporaryDirectory() as work:
+        work_dir = Path(work)
+        audio = work_dir / "golden_audio.wav"
+        make_audio(audio, 30)
+        for case in args.cases.split(","):
+            for res_name in args.resolutions.split(","):
+                for backend in backends:
+                    r = run_case(
+                        case, backend, res_name, args.fps, audio, work_dir, args.goldens, args.update, args.tolerance,
+                        args.reference,
+                    )
+                    results.append(r)
+                    line = f"[{r['status']:>8}] {case} {res_name} {backend}"
+                    if "render_sec" in r:
+                        line += f" {r['render_sec']:.2f}s"
+                    if "exact" in r:
+                        line += (
+                            f" (golden {r['golden_backend']} {r['golden_render_sec']:.2f}s)"
+                            f" exact={r['exact']} close={r['close']} diff={r['diff']} worst_mad={r['worst_mad']}"
+                        )
+                    if r.get("error"):
+                        line += f" {r['error'].strip().splitlines()[-1]}"
+                    print(line)
+                    for d in r.get("diff_frames", [])[:5]:
+                        print(f"           frame {d['frame']} (t={d['t']}s) mad={d['mad']}")
+
+    if args.output:
+        args.output.write_text(json.dumps({"environment": environment(), "results": results}, indent=2), encoding="utf-8")
+    return 0 if all(r["status"] in ("pass", "recorded") for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,603 @@
+"""
+Asyncio render service (stdlib only) for putting the renderer behind another frontend.
+
+    python service.py --host 127.0.0.1 --port 8600
+
+    POST   /renders?template=abc&profile=final&duration=60&name=song.mp3   body: audio bytes
+           -> text/event-stream: `queued`, `progress`..., then `done` (with the file URL),
+              `failed` or `cancelled`. Closing the connection cancels the render and kills
+              ffmpeg, unless another client is watching the same render.
+    GET    /renders/<key>           status as JSON
+    GET    /renders/<key>/events    attach to a render (same event stream)
+    DELETE /renders/<key>           cancel
+    GET    /files/<token>/<key>.mp4 finished video, streamed in chunks (Range supported); the
+                                    URL comes from `done` or the status, token included
+    GET    /healthz, /metrics
+
+ffmpeg runs as asyncio subprocesses, so one process supervises many renders without a
+thread per job. Identical requests (same audio bytes, storyboard and settings) share one
+render and the same content-addressed cache as app.py.
+
+Limits: SERVICE_WORKERS concurrent renders (default: CPU count), SERVICE_PER_HOST open
+renders per client address (429 beyond), SERVICE_MAX_PENDING queued renders (503 beyond),
+SERVICE_MAX_UPLOAD_MB, SERVICE_RENDER_TIMEOUT_SEC per ffmpeg run, SERVICE_IO_TIMEOUT_SEC
+for slow clients. File URLs carry the same HMAC token as core.serve (MEDIA_SECRET, or
+random per process), so the shared render directory is not browsable.
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import subprocess
+import sys
+import time
+import uuid
+from http import HTTPStatus
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+ROOT = Path(__file__).resolve().parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.songs import get_template_by_key
+from core.storyboard import StoryEvent, build_storyboard_for_template
+from core.backends import backend_missing_filters
+from core.cache import RenderCache, render_cache_key
+from core.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, RenderJob, apply_progress
+from core.profiles import EncoderProfile, get_profile
+from core.assets import with_card_icons
+from core.audio_prep import AUDIO_DIR, prepare_audio_command, prepared_audio_key
+from core.ingest import IngestedAudio
+from core.render import drawtext_command, ffmpeg_run_stats
+from core.serve import file_token, parse_range, resolve_served
+from core.metrics import METRICS, Trace, record_ffmpeg_run, span
+
+OUTPUTS_DIR = ROOT / "outputs"
+RENDERS_DIR = OUTPUTS_DIR / "renders"  # shared with app.py
+
+WORKERS = int(os.environ.get("SERVICE_WORKERS", "0")) or os.cpu_count() or 1
+PER_HOST = int(os.environ.get("SERVICE_PER_HOST", "4"))
+MAX_PENDING = int(os.environ.get("SERVICE_MAX_PENDING", "64"))
+MAX_UPLOAD_MB = int(os.environ.get("SERVICE_MAX_UPLOAD_MB", "64"))
+RENDER_TIMEOUT_SEC = float(os.environ.get("SERVICE_RENDER_TIMEOUT_SEC", "600"))
+IO_TIMEOUT_SEC = float(os.environ.get("SERVICE_IO_TIMEOUT_SEC", "30"))
+RENDER_CACHE_MAX_MB = int(os.environ.get("RENDER_CACHE_MAX_MB", "2048"))
+
+MAX_DURATION_SEC = 30 * 60
+KEEPALIVE_SEC = 15.0
+KEEP_FINISHED = 200
+CHUNK = 256 * 1024
+
+# backends that render in a single ffmpeg command the service can launch itself
+COMMANDS: Dict[str, Callable[..., List[str]]] = {
+    "drawtext": drawtext_command,
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str = "", headers: Optional[Dict[str, str]] = None):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.message = message or status.phrase
+        self.headers = headers or {}
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: Dict[str, str], host: str):
+        url = urlsplit(target)
+        self.method = method
+        self.path = unquote(url.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.headers = headers
+        self.host = host
+
+
+async def _io(awaitable, timeout: float = IO_TIMEOUT_SEC):
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise HTTPError(HTTPStatus.REQUEST_TIMEOUT) from None
+
+
+async def read_request(reader: asyncio.StreamReader, host: str) -> Optional[Request]:
+    try:
+        line = await _io(reader.readline())
+        if not line:
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers: Dict[str, str] = {}
+        while True:
+            h = await _io(reader.readline())
+            if h in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = h.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+            if len(headers) > 100:
+                raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+    except (ValueError, asyncio.LimitOverrunError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST) from None
+    return Request(method.upper(), target, headers, host)
+
+
+async def read_body(reader: asyncio.StreamReader, length: int) -> bytearray:
+    buf = bytearray()
+    while len(buf) < length:
+        chunk = await _io(reader.read(min(CHUNK, length - len(buf))))
+        if not chunk:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Upload truncated")
+        buf += chunk
+    return buf
+
+
+def response_head(status: HTTPStatus, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}", *(f"{k}: {v}" for k, v in headers.items()), "Connection: close", "", ""]
+    return "\r\n".join(lines).encode("latin-1")
+
+
+def json_response(status: HTTPStatus, body, headers: Optional[Dict[str, str]] = None) -> bytes:
+    data = json.dumps(body).encode("utf-8")
+    return response_head(status, {"Content-Type": "application/json", "Content-Length": str(len(data)), **(headers or {})}) + data
+
+
+def sse(event: str, data: Dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+async def run_ffmpeg_async(
+    cmd: List[str],
+    on_progress: Optional[Callable[[Dict[str, str]], None]] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """
+    asyncio counterpart of core.render.run_ffmpeg: parses `-progress` blocks and records
+    the same metrics. ffmpeg is killed if the awaiting task is cancelled (client gone)
+    or `timeout` passes (asyncio.TimeoutError).
+    """
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    t0 = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    stderr = asyncio.ensure_future(proc.stderr.read())
+    first_progress: Optional[float] = None
+    last: Dict[str, str] = {}
+
+    async def pump() -> int:
+        nonlocal first_progress, last
+        block: Dict[str, str] = {}
+        async for raw in proc.stdout:
+            k, _, v = raw.decode("utf-8", "replace").strip().partition("=")
+            if not k:
+                continue
+            block[k] = v.strip()
+            if k == "progress":
+                if first_progress is None:
+                    first_progress = time.perf_counter() - t0
+                if on_progress is not None:
+                    on_progress(block)
+                last, block = block, {}
+        return await proc.wait()
+
+    try:
+        rc = await asyncio.wait_for(pump(), timeout)
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+        stderr.cancel()
+        record_ffmpeg_run(ffmpeg_run_stats(last, time.perf_counter() - t0, first_progress, proc.returncode))
+        raise
+
+    err = (await stderr).decode("utf-8", "replace")
+    record_ffmpeg_run(ffmpeg_run_stats(last, time.perf_counter() - t0, first_progress, rc))
+    if rc != 0:
+        raise RuntimeError(f"FFMPEG FAILED\n\nReturn code: {rc}\n\nSTDERR:\n{err}\n")
+
+
+async def render_into_cache(
+    cache: RenderCache,
+    key: str,
+    build: Callable[[Path], List[str]],
+    suffix: str = ".mp4",
+    on_progress: Optional[Callable[[Dict[str, str]], None]] = None,
+    timeout: Optional[float] = None,
+) -> Path:
+    """
+    RenderCache.get_or_render for an async ffmpeg command: temp file, atomic move, evict.
+    """
+    hit = cache.get(key, suffix)
+    if hit is not None:
+        return hit
+    final = cache.path_for(key, suffix)
+    tmp = final.with_name(f".{key}.{uuid.uuid4().hex}.tmp{suffix}")
+    try:
+        await run_ffmpeg_async(build(tmp), on_progress, timeout)
+        os.replace(tmp, final)
+    finally:
+        tmp.unlink(missing_ok=True)
+    cache.evict(keep=[final])
+    return final
+
+
+class Flight:
+    """
+    One render, shared by every client that asked for the same content key. Watchers
+    wait for the next state change and send a snapshot, so a slow client skips
+    intermediate progress instead of buffering it.
+    """
+
+    def __init__(self, key: str, job: RenderJob):
+        self.key = key
+        self.job = job
+        self.watchers = 0
+        self.version = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self.version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_changed(self, version: int) -> None:
+        if self.version == version:
+            await self._changed.wait()
+
+
+class RenderService:
+    def __init__(
+        self,
+        backend: str = "drawtext",
+        workers: int = WORKERS,
+        per_host: int = PER_HOST,
+        max_pending: int = MAX_PENDING,
+        render_timeout: float = RENDER_TIMEOUT_SEC,
+        cache_dir: Path = RENDERS_DIR,
+    ):
+        # create inside the running loop (asyncio primitives)
+        self.backend = backend
+        self.build_command = COMMANDS[backend]
+        self.workers = workers
+        self.per_host = per_host
+        self.max_pending = max_pending
+        self.render_timeout = render_timeout
+        self.renders = RenderCache(cache_dir, max_bytes=RENDER_CACHE_MAX_MB * 1024 * 1024)
+        self.audio = RenderCache(AUDIO_DIR, max_bytes=512 * 1024 ** 2)
+        media_secret = os.environ.get("MEDIA_SECRET")
+        self.secret = media_secret.encode("utf-8") if media_secret else secrets.token_bytes(32)
+        self.ffmpeg_slots = asyncio.Semaphore(workers)
+        self.host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.flights: Dict[str, Flight] = {}
+
+    # ---- connection handling ----
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        host = peer[0] if peer else "unknown"
+        try:
+            req = await read_request(reader, host)
+            if req is not None:
+                await self.dispatch(req, reader, writer)
+        except HTTPError as e:
+            writer.write(json_response(e.status, {"error": e.message}, e.headers))
+            try:
+                await asyncio.wait_for(writer.drain(), IO_TIMEOUT_SEC)
+            except (asyncio.TimeoutError, ConnectionError):
+                pass
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, req: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        parts = [p for p in req.path.split("/") if p]
+        if parts == ["renders"]:
+            if req.method != "POST":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            await self.submit(req, reader, writer)
+        elif len(parts) == 2 and parts[0] == "renders":
+            if req.method == "GET":
+                writer.write(json_response(HTTPStatus.OK, self.status(parts[1])))
+            elif req.method == "DELETE":
+                writer.write(json_response(HTTPStatus.OK, {"cancelled": self.cancel(parts[1])}))
+            else:
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+        elif len(parts) == 3 and parts[0] == "renders" and parts[2] == "events" and req.method == "GET":
+            flight = self.flights.get(parts[1])
+            if flight is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND)
+            await self.stream_events(flight, reader, writer)
+        elif len(parts) == 3 and parts[0] == "files" and req.method in ("GET", "HEAD"):
+            await self.send_file(parts[1], parts[2], req, writer)
+        elif parts == ["healthz"] and req.method == "GET":
+            writer.write(json_response(HTTPStatus.OK, self.health()))
+        elif parts == ["metrics"] and req.method == "GET":
+            body = METRICS.to_prometheus().encode("utf-8")
+            writer.write(response_head(HTTPStatus.OK, {"Content-Type": "text/plain; version=0.0.4", "Content-Length": str(len(body))}) + body)
+        else:
+            raise HTTPError(HTTPStatus.NOT_FOUND)
+        await asyncio.wait_for(writer.drain(), IO_TIMEOUT_SEC)
+
+    # ---- renders ----
+
+    async def submit(self, req: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        slots = self.host_slots.setdefault(req.host, asyncio.Semaphore(self.per_host))
+        if slots.locked():
+            raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS, f"At most {self.per_host} open renders per client", {"Retry-After": "5"})
+
+        async with slots:
+            try:
+                length = int(req.headers["content-length"])
+            except (KeyError, ValueError):
+                raise HTTPError(HTTPStatus.LENGTH_REQUIRED) from None
+            if length <= 0:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Empty upload")
+            if length > MAX_UPLOAD_MB * 1024 * 1024:
+                raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Uploads are limited to {MAX_UPLOAD_MB} MB")
+            try:
+                template = get_template_by_key(req.query.get("template", "abc"))
+                profile = get_profile(req.query.get("profile", "final"))
+                duration = int(req.query.get("duration", "60"))
+            except (KeyError, ValueError) as e:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, str(e)) from None
+            if not 0 < duration <= MAX_DURATION_SEC:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"duration must be 1..{MAX_DURATION_SEC}")
+            if self.pending_count() >= self.max_pending:
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Render queue is full", {"Retry-After": "30"})
+
+            if req.headers.get("expect", "").lower() == "100-continue":
+                # checks passed; only now let the client send the upload
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await _io(writer.drain())
+            data = await read_body(reader, length)
+            source = IngestedAudio(data, suffix=Path(req.query.get("name", "")).suffix)
+            del data
+
+            events = with_card_icons(build_storyboard_for_template(template.units, duration_sec=duration), profile.resolution)
+            params = {
+                "backend": self.backend,
+                "duration_sec": duration,
+                "resolution": profile.resolution,
+                "fps": profile.fps,
+                "fragmented": False,
+                **profile.cache_params(),
+            }
+            key = render_cache_key(source.sha256, events, params)
+
+            flight = self.flights.get(key)
+            if flight is None or flight.job.finished:
+                flight = Flight(key, RenderJob(id=key[:12], label=f"{template.key}_{profile.name}", duration_sec=duration))
+                if self.renders.get(key) is not None:
+                    source.close()
+                    flight.job.status = DONE
+                    flight.job.progress = 1.0
+                    flight.job.result = self.renders.path_for(key)
+                    flight.job.finished_at = time.time()
+                else:
+                    flight.task = asyncio.create_task(self._run(flight, source, events, duration, profile))
+                self.flights[key] = flight
+                self._prune()
+            else:
+                source.close()
+            await self.stream_events(flight, reader, writer)
+
+    async def _run(self, flight: Flight, source: IngestedAudio, events: List[StoryEvent], duration: int, profile: EncoderProfile) -> None:
+        job = flight.job
+        trace = Trace("service_render", profile=profile.name, backend=self.backend, events=len(events), key=flight.key)
+
+        def on_progress(block: Dict[str, str]) -> None:
+            apply_progress(job, block)
+            flight.notify()
+
+        try:
+            with trace.activate(), source:
+                async with self.ffmpeg_slots:
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                    flight.notify()
+                    with span("audio.prepare"):
+                        audio = await render_into_cache(
+                            self.audio,
+                            prepared_audio_key(source.sha256, duration, profile),
+                            lambda tmp: prepare_audio_command(source.path, duration, tmp, profile),
+                            suffix=".m4a",
+                            timeout=self.render_timeout,
+                        )
+                    with span("render.backend", backend=self.backend):
+                        job.result = await render_into_cache(
+                            self.renders,
+                            flight.key,
+                            lambda tmp: self.build_command(
+                                audio_path=str(audio),
+                                audio_prepared=True,
+                                events=events,
+                                output_path=str(tmp),
+                                duration_sec=duration,
+                                resolution=profile.resolution,
+                                fps=profile.fps,
+                                profile=profile,
+                            ),
+                            on_progress=on_progress,
+                            timeout=self.render_timeout,
+                        )
+            job.progress = 1.0
+            job.status = DONE
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+        except asyncio.TimeoutError:
+            job.error = f"Render timed out after {self.render_timeout:.0f}s"
+            job.status = FAILED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            trace.finish(job.status)
+            flight.notify()
+
+    def cancel(self, key: str) -> bool:
+        flight = self.flights.get(key)
+        if flight is None or flight.job.finished or flight.task is None:
+            return False
+        flight.task.cancel()
+        return True
+
+    def pending_count(self) -> int:
+        return sum(1 for f in self.flights.values() if not f.job.finished)
+
+    def queue_position(self, flight: Flight) -> int:
+        return sum(
+            1 for f in self.flights.values()
+            if f.job.status == QUEUED and f.job.created_at <= flight.job.created_at
+        )
+
+    def status(self, key: str) -> Dict:
+        flight = self.flights.get(key)
+        if flight is None:
+            if self.renders.get(key) is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND)
+            return {"key": key, "status": DONE, "url": self.file_url(key)}
+        return {"key": key, **self._snapshot(flight)[1]}
+
+    def file_url(self, key: str) -> str:
+        name = f"{key}.mp4"
+        return f"/files/{file_token(self.secret, name)}/{name}"
+
+    def health(self) -> Dict:
+        jobs = [f.job for f in self.flights.values()]
+        return {
+            "backend": self.backend,
+            "workers": self.workers,
+            "running": sum(1 for j in jobs if j.status == RUNNING),
+            "queued": sum(1 for j in jobs if j.status == QUEUED),
+            "watchers": sum(f.watchers for f in self.flights.values()),
+        }
+
+    def _snapshot(self, flight: Flight) -> Tuple[str, Dict]:
+        job = flight.job
+        data: Dict = {"id": job.id, "status": job.status}
+        if job.status == QUEUED:
+            return "queued", {**data, "position": self.queue_position(flight)}
+        if job.status == RUNNING:
+            return "progress", {**data, "progress": round(job.progress, 4), "fps": job.fps, "speed": job.speed}
+        if job.status == DONE:
+            took = (job.finished_at - job.started_at) if job.started_at else 0.0
+            return "done", {**data, "url": self.file_url(flight.key), "cached": job.started_at is None, "render_sec": round(took, 3)}
+        if job.status == FAILED:
+            return "failed", {**data, "error": job.error}
+        return "cancelled", data
+
+    async def stream_events(self, flight: Flight, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        SSE until the render finishes. The client sends nothing after its request, so
+        EOF on the socket means it went away; the last watcher leaving cancels the render.
+        """
+        flight.watchers += 1
+        gone = asyncio.ensure_future(reader.read(1))
+        try:
+            writer.write(response_head(HTTPStatus.OK, {
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            }))
+            version = -1
+            while True:
+                if flight.version != version:
+                    version = flight.version
+                    writer.write(sse(*self._snapshot(flight)))
+                else:
+                    writer.write(b": keepalive\n\n")
+                # a client that stops reading stalls here and is dropped after the timeout
+                await asyncio.wait_for(writer.drain(), IO_TIMEOUT_SEC)
+                if flight.job.finished:
+                    return
+                changed = asyncio.ensure_future(flight.wait_changed(version))
+                done, _ = await asyncio.wait({changed, gone}, timeout=KEEPALIVE_SEC, return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+                if gone in done:
+                    return
+        finally:
+            gone.cancel()
+            flight.watchers -= 1
+            if flight.watchers == 0 and flight.task is not None and not flight.job.finished:
+                flight.task.cancel()
+
+    async def send_file(self, token: str, name: str, req: Request, writer: asyncio.StreamWriter) -> None:
+        p = resolve_served(self.renders.cache_dir, self.secret, token, name)
+        if p is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND)
+
+        with open(p, "rb") as f:  # an open fd keeps the bytes even if the cache evicts the file
+            size = os.fstat(f.fileno()).st_size
+            try:
+                rng = parse_range(req.headers.get("range"), size)
+            except ValueError:
+                raise HTTPError(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, headers={"Content-Range": f"bytes */{size}"}) from None
+            start, end = rng if rng else (0, size - 1)
+            length = end - start + 1 if size else 0
+
+            headers = {
+                "Content-Type": "video/mp4",
+                "Content-Length": str(length),
+                "Accept-Ranges": "bytes",
+                "Cache-Control": "public, max-age=3600",
+            }
+            if rng:
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            if req.query.get("download"):
+                headers["Content-Disposition"] = f'attachment; filename="{name}"'
+            writer.write(response_head(HTTPStatus.PARTIAL_CONTENT if rng else HTTPStatus.OK, headers))
+            if req.method == "HEAD":
+                return
+
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(CHUNK, remaining))
+                if not chunk:
+                    break
+                writer.write(chunk)
+                remaining -= len(chunk)
+                await asyncio.wait_for(writer.drain(), IO_TIMEOUT_SEC)
+
+    def _prune(self) -> None:
+        finished = sorted((f for f in self.flights.values() if f.job.finished), key=lambda f: f.job.finished_at or 0)
+        for f in finished[: max(0, len(finished) - KEEP_FINISHED)]:
+            self.flights.pop(f.key, None)
+
+
+async def serve(host: str, port: int, backend: str, workers: int) -> None:
+    service = RenderService(backend=backend, workers=workers)
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"render service on http://{host}:{port} (backend {backend}, {workers} concurrent renders)")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Serve renders over HTTP with server-sent progress events.")
+    ap.add_argument("--host", default=os.environ.get("SERVICE_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.environ.get("SERVICE_PORT", "8600")))
+    ap.add_argument("--backend", choices=sorted(COMMANDS), default="drawtext")
+    ap.add_argument("--workers", type=int, default=WORKERS, help="concurrent ffmpeg renders")
+    args = ap.parse_args(argv)
+
+    missing = backend_missing_filters(args.backend)
+    if missing:
+        print(f"warning: ffmpeg lacks {', '.join(missing)} needed by the {args.backend!r} backend; renders will fail.")
+    try:
+        asyncio.run(serve(args.host, args.port, args.backend, max(1, args.workers)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())